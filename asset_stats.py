@@ -0,0 +1,69 @@
+import datetime
+import threading
+from collections import Counter
+import database
+
+# Счётчики выдачи камер, проектов и паков. Обработчики только увеличивают
+# счётчик в памяти; в таблицу asset_stats накопленное пишется одной пачкой
+# UPSERT раз в FLUSH_INTERVAL секунд (и при остановке бота).
+
+FLUSH_INTERVAL = 60
+REPORT_DAYS = 30
+
+# (вид, ассет, день) -> количество
+_pending = Counter()
+_lock = threading.Lock()
+
+def record(kind, asset, amount=1):
+    """Учитывает выдачу ассета: kind — 'camera', 'project' или 'pack'"""
+    key = (kind, str(asset), datetime.date.today().isoformat())
+    with _lock:
+        _pending[key] += amount
+
+def flush():
+    """Записывает накопленные счётчики в базу (блокирующая, для потоков); возвращает число строк"""
+    global _pending
+    with _lock:
+        batch, _pending = _pending, Counter()
+    if not batch:
+        return 0
+    try:
+        database.add_asset_stats([(kind, asset, day, count) for (kind, asset, day), count in batch.items()])
+    except Exception:
+        # Не теряем счётчики: вернём их к новым и попробуем при следующей записи
+        with _lock:
+            _pending.update(batch)
+        raise
+    return len(batch)
+
+def pending():
+    """Сколько выдач ещё не записано в базу"""
+    with _lock:
+        return sum(_pending.values())
+
+def report(top=10, unused=20):
+    """Текст отчёта: самые востребованные ассеты за REPORT_DAYS дней и ни разу не выданные"""
+    since = (datetime.date.today() - datetime.timedelta(days=REPORT_DAYS - 1)).isoformat()
+    start = database.get_asset_stats_start()
+    if start is None:
+        return "📭 Выдач ещё не было — статистика появится после первых запросов."
+
+    sections = [("camera", "📸 Камеры"), ("project", "📁 Проекты"), ("pack", "📦 Паки")]
+    text = f"📈 Выдача за {REPORT_DAYS} дней (учёт ведётся с {start}):\n"
+    for kind, title in sections:
+        rows = database.get_top_assets(kind, since, top)
+        text += f"\n{title}:\n"
+        if not rows:
+            text += "— нет выдач\n"
+        for i, (asset, name, total) in enumerate(rows, 1):
+            label = f"{asset} — {name}" if kind == 'camera' else name
+            text += f"{i}. {label}: {total}\n"
+
+    text += "\n💤 Ни разу не выдавались:\n"
+    for kind, title in sections:
+        count, rows = database.get_unused_assets(kind, unused)
+        text += f"{title}: {count}\n"
+        if rows:
+            names = [asset if kind == 'camera' else name for asset, name in rows]
+            text += "  " + ", ".join(names) + (" …" if count > len(rows) else "") + "\n"
+    return text
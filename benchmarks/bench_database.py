@@ -0,0 +1,312 @@
+"""Микробенчмарки database.py на данных продакшен-масштаба.
+
+Генерирует во временном каталоге синтетическую базу (при --scale 1: 1M
+пользователей, 200k камер, 10k паков, 50k банов, 100k рассылок) и замеряет
+публичные функции database.py: один «холодный» вызов и несколько «тёплых».
+
+Холодный вызов идёт после сброса страниц файла базы из кэша ОС
+(posix_fadvise DONTNEED; где его нет, холодный замер — просто первый вызов).
+SQLite открывает соединение на каждый вызов, поэтому его собственный кэш
+страниц всегда пуст и «тёплый» означает только кэш ОС.
+
+    python benchmarks/bench_database.py --scale 0.1 --save base.json
+    python benchmarks/bench_database.py --scale 0.1 --baseline base.json
+
+С --baseline запуск завершается с кодом 1, если медиана тёплых вызовов
+какой-либо функции стала медленнее базовой больше чем на --tolerance.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# database создаёт базу при импорте — рабочий каталог переключаем заранее
+START_DIR = os.getcwd()
+WORK_DIR = tempfile.mkdtemp(prefix='bench-database-')
+os.chdir(WORK_DIR)
+
+import database  # noqa: E402
+
+ADMINS = 50
+CATEGORIES = ['PTZ', 'Динамики', 'Для слива', 'Улица', 'Подъезды', 'Парковки']
+# Объёмы при --scale 1
+USERS = 1000000
+CAMERAS = 200000
+PACKS = 10000
+PROJECTS = 500
+BANS = 50000
+BROADCASTS = 100000
+
+WORDS = ['камера', 'вход', 'двор', 'парковка', 'офис', 'склад', 'магазин', 'подъезд', 'улица', 'холл']
+
+def _code(rng):
+    return ''.join(rng.choices(string.ascii_uppercase + string.digits, k=8))
+
+def generate(scale, seed):
+    """Заполняет базу напрямую через sqlite3 одной транзакцией на таблицу; возвращает выборки ключей"""
+    rng = random.Random(seed)
+    count = lambda n: max(1, int(n * scale))
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute('PRAGMA synchronous = OFF')
+    cursor = conn.cursor()
+
+    admins = ['bench_master'] + [f'bench_admin_{i}' for i in range(1, ADMINS)]
+    cursor.executemany(
+        'INSERT INTO admins (username, password, is_master, display_name) VALUES (?, ?, ?, ?)',
+        [(name, 'password', i == 0, name) for i, name in enumerate(admins)])
+    cursor.executemany('INSERT OR IGNORE INTO categories (name) VALUES (?)', [(c,) for c in CATEGORIES])
+
+    users = count(USERS)
+    cursor.executemany(
+        'INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)',
+        ((1000 + i, f'user{i}', 'Имя', None) for i in range(users)))
+    banned = rng.sample(range(1000, 1000 + users), min(users, count(BANS)))
+    cursor.executemany('INSERT INTO banned_users (user_id) VALUES (?)', [(user_id,) for user_id in banned])
+
+    codes = set()
+    while len(codes) < count(CAMERAS):
+        codes.add(_code(rng))
+    codes = list(codes)
+    cursor.executemany(
+        '''INSERT INTO cameras (code, category, image_path, caption, custom_name, admin_id, file_id, phash)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+        ((code, rng.choice(CATEGORIES), f'blobs/x/{code}.jpg',
+          ' '.join(rng.choices(WORDS, k=4)), None if i % 3 else f'Камера {i}',
+          rng.randint(1, ADMINS), f'file-{code}',
+          rng.randrange(-2 ** 63, 2 ** 63) if i % 2 else None)
+         for i, code in enumerate(codes)))
+
+    cursor.executemany(
+        'INSERT INTO projects (file_path, caption, display_name) VALUES (?, ?, ?)',
+        ((f'projects/{i}.zip', f'Проект {i}', f'Проект {i}') for i in range(count(PROJECTS))))
+    cursor.executemany(
+        'INSERT INTO packs (file_path, caption, display_name, admin_username) VALUES (?, ?, ?, ?)',
+        ((f'packs/{i}.zip', f'Пак {i}', f'Пак {i}', rng.choice(admins)) for i in range(count(PACKS))))
+    cursor.executemany(
+        "INSERT INTO broadcasts (admin_username, message_text, timestamp) VALUES (?, ?, datetime('now', ?))",
+        ((rng.choice(admins), ' '.join(rng.choices(WORDS, k=20)), f'-{i} minutes')
+         for i in range(count(BROADCASTS))))
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+    return {
+        'admins': admins,
+        'codes': codes,
+        'users': range(1000, 1000 + users),
+        'banned': banned,
+        'projects': count(PROJECTS),
+        'packs': count(PACKS),
+    }
+
+def drop_os_cache():
+    """Выкидывает страницы файлов базы из кэша ОС; False, если платформа не умеет"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for suffix in ('', '-wal', '-journal'):
+        path = database.DB_PATH + suffix
+        if not os.path.exists(path):
+            continue
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+def benchmarks(data, rng):
+    """[(имя, функция без аргументов)] в порядке запуска: записи идут после чтений"""
+    codes, users, admins = data['codes'], data['users'], data['admins']
+    new_ids = itertools.count(10 ** 9)
+    added_codes = []
+    added_admins = []
+    # add_project и add_pack не возвращают id — автоинкремент идёт подряд
+    project_ids = itertools.count(data['projects'] + 1)
+    pack_ids = itertools.count(data['packs'] + 1)
+    added_projects = []
+    added_packs = []
+
+    def add_camera():
+        added_codes.append(database.add_camera(
+            rng.choice(admins), rng.choice(CATEGORIES), 'blobs/x/new.jpg', 'новая камера'))
+
+    def add_admin():
+        name = f'bench_new_{next(new_ids)}'
+        database.add_admin(name, 'password', display_name=name)
+        added_admins.append(name)
+
+    def add_project():
+        database.add_project('projects/new.zip', 'Проект', 'Проект')
+        added_projects.append(next(project_ids))
+
+    def add_pack():
+        database.add_pack('packs/new.zip', 'Пак', 'Пак', rng.choice(admins))
+        added_packs.append(next(pack_ids))
+
+    def pop_or(items, fallback):
+        return items.pop() if items else fallback()
+
+    return [
+        ('get_camera', lambda: database.get_camera(rng.choice(codes))),
+        ('get_cameras', lambda: database.get_cameras(rng.sample(codes, 10))),
+        ('search_cameras', lambda: database.search_cameras(rng.choice(WORDS))),
+        ('is_banned', lambda: database.is_banned(rng.choice(users))),
+        ('admin_exists', lambda: database.admin_exists(rng.choice(admins))),
+        ('verify_admin', lambda: database.verify_admin(rng.choice(admins), 'password')),
+        ('is_master_admin', lambda: database.is_master_admin(rng.choice(admins))),
+        ('get_all_admins', database.get_all_admins),
+        ('get_all_categories', database.get_all_categories),
+        ('get_camera_stats', database.get_camera_stats),
+        ('get_admin_totals', database.get_admin_totals),
+        ('count_active_users', database.count_active_users),
+        ('get_cameras_with_admin', database.get_cameras_with_admin),
+        ('get_cameras_by_admin', lambda: database.get_cameras_by_admin(rng.choice(admins))),
+        ('get_cameras_page', lambda: database.get_cameras_page(after=rng.randint(0, len(codes)))),
+        ('get_cameras_page_admin', lambda: database.get_cameras_page(admin_username=rng.choice(admins))),
+        ('get_cameras_without_phash', lambda: database.get_cameras_without_phash(rng.randint(0, len(codes)))),
+        ('count_cameras_without_category', database.count_cameras_without_category),
+        ('get_banned_users', database.get_banned_users),
+        ('get_all_users', database.get_all_users),
+        ('get_users_page', lambda: database.get_users_page(after=rng.choice(users))),
+        ('get_active_users', database.get_active_users),
+        ('get_all_projects', database.get_all_projects),
+        ('get_project', lambda: database.get_project(rng.randint(1, data['projects']))),
+        ('get_all_packs', database.get_all_packs),
+        ('get_packs_by_admin', lambda: database.get_packs_by_admin(rng.choice(admins))),
+        ('get_pack', lambda: database.get_pack(rng.randint(1, data['packs']))),
+        ('get_broadcast_history', database.get_broadcast_history),
+        ('get_broadcasts_page', lambda: database.get_broadcasts_page()),
+        ('get_blob_refcounts', lambda: database.get_blob_refcounts(['0' * 64])),
+        ('get_dead_blobs', database.get_dead_blobs),
+        ('get_migration_state', lambda: database.get_migration_state('bench')),
+        ('load_camera_index', database.load_camera_index),
+        ('load_dedup_index', database.load_dedup_index),
+        ('iter_users', lambda: consume(database.iter_users())),
+        ('iter_cameras', lambda: consume(database.iter_cameras())),
+        ('iter_broadcasts', lambda: consume(database.iter_broadcasts())),
+        ('iter_file_rows', lambda: consume(database.iter_file_rows('cameras'))),
+        # Записи
+        ('add_user', lambda: database.add_user(next(new_ids), 'new', 'Новый', None)),
+        ('ban_user', lambda: database.ban_user(rng.choice(users))),
+        ('unban_user', lambda: database.unban_user(rng.choice(data['banned']))),
+        ('add_camera', add_camera),
+        ('set_camera_file_id', lambda: database.set_camera_file_id(rng.choice(codes), 'file-new')),
+        ('set_camera_phashes', lambda: database.set_camera_phashes([(rng.choice(codes), rng.getrandbits(64))])),
+        ('delete_camera', lambda: database.delete_camera(pop_or(added_codes, lambda: rng.choice(codes)))),
+        ('add_admin', add_admin),
+        ('set_admin_password', lambda: database.set_admin_password(rng.choice(admins), 'password')),
+        ('delete_admin', lambda: database.delete_admin(pop_or(added_admins, lambda: 'bench_missing'))),
+        ('add_project', add_project),
+        ('delete_project', lambda: database.delete_project(pop_or(added_projects, lambda: 0))),
+        ('add_pack', add_pack),
+        ('delete_pack', lambda: database.delete_pack(pop_or(added_packs, lambda: 0))),
+        ('add_category', lambda: database.add_category(f'Категория {next(new_ids)}')),
+        ('add_broadcast_record', lambda: database.add_broadcast_record(rng.choice(admins), 'Новая рассылка')),
+        ('set_migration_state', lambda: database.set_migration_state('bench', rng.randint(0, 100))),
+        ('reassign_orphan_cameras', database.reassign_orphan_cameras),
+        ('reconcile_blob_refcounts', database.reconcile_blob_refcounts),
+    ]
+
+def measure(func, repeat, budget):
+    """(холодный вызов, [тёплые вызовы]) в секундах"""
+    drop_os_cache()
+    started = time.perf_counter()
+    func()
+    cold = time.perf_counter() - started
+    # Долгие функции повторяем реже, чтобы прогон укладывался в бюджет
+    runs = max(1, min(repeat, int(budget / max(cold, 1e-9))))
+    warm = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        warm.append(time.perf_counter() - started)
+    return cold, warm
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Имена функций, у которых тёплая медиана выросла сверх допуска"""
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        delta = row['warm_ms'] - base['warm_ms']
+        row['change'] = delta / base['warm_ms'] if base['warm_ms'] else 0
+        if delta > min_delta_ms and row['change'] > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='доля от продакшен-объёмов')
+    parser.add_argument('--repeat', type=int, default=5, help='тёплых вызовов на функцию')
+    parser.add_argument('--budget', type=float, default=10.0, help='секунд на тёплые вызовы одной функции')
+    parser.add_argument('--only', help='регулярное выражение для имён функций')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='JSON прошлого запуска для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление, доля')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='замедления меньше не считаются')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    started = time.perf_counter()
+    data = generate(args.scale, args.seed)
+    print(f"Данные сгенерированы за {time.perf_counter() - started:.1f} с "
+          f"({os.path.getsize(database.DB_PATH) / 1024 / 1024:.0f} МБ), кэш ОС сбрасывается: {drop_os_cache()}")
+
+    rng = random.Random(args.seed)
+    results = {}
+    print(f"{'функция':<32} {'холодный':>10} {'тёплый':>10} {'мин':>10}")
+    for name, func in benchmarks(data, rng):
+        if args.only and not re.search(args.only, name):
+            continue
+        cold, warm = measure(func, args.repeat, args.budget)
+        results[name] = {
+            'cold_ms': cold * 1000,
+            'warm_ms': statistics.median(warm) * 1000,
+            'min_ms': min(warm) * 1000,
+            'runs': len(warm),
+        }
+        row = results[name]
+        print(f"{name:<32} {row['cold_ms']:>10.2f} {row['warm_ms']:>10.2f} {row['min_ms']:>10.2f}")
+
+    regressions = []
+    if args.baseline:
+        with open(os.path.join(START_DIR, args.baseline)) as file:
+            baseline = json.load(file)
+        if baseline.get('scale') != args.scale:
+            print(f"⚠️ Базовый запуск сделан с --scale {baseline.get('scale')}, сравнение неточное")
+        regressions = compare(results, baseline['results'], args.tolerance, args.min_delta_ms)
+        print(f"\nСравнение с {args.baseline} (допуск {args.tolerance:.0%}):")
+        for name, row in results.items():
+            if 'change' in row:
+                mark = '  ❌' if name in regressions else ''
+                print(f"{name:<32} {row['change']:>+8.0%}{mark}")
+
+    if args.save:
+        with open(os.path.join(START_DIR, args.save), 'w') as file:
+            json.dump({'scale': args.scale, 'results': results}, file, ensure_ascii=False, indent=2)
+
+    if regressions:
+        print(f"\nЗамедлились: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
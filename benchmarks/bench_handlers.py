@@ -0,0 +1,253 @@
+"""Пропускная способность обработчиков bot.py на поддельном Bot API.
+
+Собирает Application через bot.build_application() с транспортом FakeRequest,
+заполняет временную базу синтетическими данными и прогоняет потоки обновлений
+от множества пользователей одновременно: поиск камер по коду, навигация по
+меню, ссылки на проекты, паки и камеры, загрузка скриншота админом и
+рассылка. Печатает обновления в секунду, p50/p99 задержки обработки и число
+вызовов Bot API на обновление. Если какой-то обработчик выбросил
+исключение, код выхода — 1.
+
+    python benchmarks/bench_handlers.py --lookup-users 200 --latency 0.02
+
+Ограничение скорости сообщений (6 в секунду на пользователя) по умолчанию
+сбрасывается перед каждым обновлением, иначе бенчмарк мерил бы ответы
+«подождите 10 секунд»; --rate-limit оставляет его включённым.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# database создаёт базу при импорте — рабочий каталог переключаем заранее
+START_DIR = os.getcwd()
+WORK_DIR = tempfile.mkdtemp(prefix='bench-handlers-')
+os.chdir(WORK_DIR)
+
+from telegram import Update  # noqa: E402
+import bot  # noqa: E402
+import database  # noqa: E402
+import imaging  # noqa: E402
+from fake_bot import FakeRequest, scenario  # noqa: E402
+
+TOKEN = '123456:BENCHMARK'
+ADMIN_PASSWORD = 'bench-password'
+MASTER_ADMIN = 'bench_master'
+CATEGORY = 'PTZ'
+# Идентификаторы синтетических пользователей не пересекаются с получателями рассылки
+USER_ID_BASE = 10 ** 9
+
+def jpeg_payload():
+    """Содержимое «скачанного» скриншота: настоящий JPEG, если есть Pillow"""
+    if not imaging.available():
+        return b'\xff\xd8' + random.randbytes(4096)
+    color = tuple(random.randrange(256) for _ in range(3))
+    buffer = io.BytesIO()
+    imaging.Image.new('RGB', (64, 64), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def seed(args):
+    """Синтетические данные: камеры с file_id, проекты, паки, получатели рассылки"""
+    database.add_admin(MASTER_ADMIN, ADMIN_PASSWORD, is_master=True, display_name=MASTER_ADMIN)
+    for i in range(args.upload_users):
+        database.add_admin(f'bench_admin_{i}', ADMIN_PASSWORD, display_name=f'bench_admin_{i}')
+
+    rows = [
+        (CATEGORY, f'cameras/{CATEGORY}/seed_{i}.jpg', f'Камера {i}', None, f'seed-file-{i}', None)
+        for i in range(args.cameras)
+    ]
+    codes = database.add_cameras_bulk(MASTER_ADMIN, rows)
+    os.makedirs('projects', exist_ok=True)
+    os.makedirs('packs', exist_ok=True)
+    for i in range(args.projects):
+        for path in (f'projects/seed_{i}.zip', f'packs/seed_{i}.zip'):
+            with open(path, 'wb') as file:
+                file.write(b'PK\x05\x06' + bytes(18))
+        database.add_project(f'projects/seed_{i}.zip', f'Проект {i}', f'Проект {i}')
+        database.add_pack(f'packs/seed_{i}.zip', f'Пак {i}', f'Пак {i}', MASTER_ADMIN)
+    for user_id in range(1, args.recipients + 1):
+        database.add_user(user_id, f'recipient{user_id}', 'Recipient', None)
+    database.load_camera_index()
+    return codes
+
+def make_update(application, user_id, update_id, text=None, photo=None):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': f'user{user_id}'},
+    }
+    if text is not None:
+        message['text'] = text
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    if photo is not None:
+        message['photo'] = [{'file_id': photo, 'file_unique_id': photo, 'width': 1280, 'height': 720,
+                             'file_size': 4096}]
+    return Update.de_json({'update_id': update_id, 'message': message}, application.bot)
+
+def lookup_script(codes, rng):
+    picks = [rng.choice(codes) for _ in range(5)]
+    return ['/start', picks[0], picks[1], picks[2], ' '.join(picks[2:]), 'НЕТ_ТАКОГО_КОДА']
+
+def deeplink_script(codes, rng):
+    # Ссылки t.me/<bot>?start=...: проект, пак и камера
+    project_id = rng.choice(database.get_all_projects())[0]
+    pack_id = rng.choice(database.get_all_packs())[0]
+    return [f'/start project_{project_id}', f'/start pack_{pack_id}', f'/start {rng.choice(codes)}']
+
+def menu_script():
+    return ['/start', '📁 Проекты', '🔙 Назад', '📦 Паки камер', '🔙 Назад', '📢 Наш канал']
+
+def upload_script(admin, photo_id):
+    return [
+        '/start', '🔐 Вход для админа', admin, ADMIN_PASSWORD, '📤 Загрузить скриншот', CATEGORY,
+        ('photo', photo_id), 'Скриншот из бенчмарка', 'нет', '🚪 Выйти',
+    ]
+
+def broadcast_script():
+    return ['/start', '🔐 Вход для админа', MASTER_ADMIN, ADMIN_PASSWORD, '✉️ Рассылка', 'Сообщение бенчмарка']
+
+class Runner:
+    def __init__(self, application, keep_rate_limit):
+        self.application = application
+        self.keep_rate_limit = keep_rate_limit
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.update_id = 0
+
+    async def run_user(self, name, user_id, script):
+        scenario.set(name)
+        for step in script:
+            self.update_id += 1
+            if isinstance(step, tuple):
+                update = make_update(self.application, user_id, self.update_id, photo=step[1])
+            else:
+                update = make_update(self.application, user_id, self.update_id, text=step)
+            if not self.keep_rate_limit:
+                bot.message_counters.pop(user_id, None)
+            started = time.perf_counter()
+            await self.application.process_update(update)
+            self.latencies[name].append(time.perf_counter() - started)
+
+    async def count_error(self, update, context):
+        # Исключения обработчиков не выходят из process_update, а попадают сюда
+        self.errors[scenario.get()] += 1
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summarize(runner, request, elapsed):
+    results = {}
+    for name, values in runner.latencies.items():
+        results[name] = {
+            'updates': len(values),
+            'p50_ms': percentile(values, 0.5) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'api_calls_per_update': request.calls_by_scenario[name] / len(values),
+            'errors': runner.errors[name],
+        }
+    total = sum(len(values) for name, values in runner.latencies.items() if name != 'broadcast')
+    results['total'] = {
+        'updates': total,
+        'seconds': elapsed,
+        'updates_per_second': total / elapsed if elapsed else 0,
+        'api_calls_per_update': (
+            (sum(request.calls.values()) - request.calls_by_scenario['broadcast']) / total if total else 0),
+        'retry_after': request.retry_afters,
+        'api_calls': dict(request.calls.most_common()),
+    }
+    return results
+
+def print_results(results):
+    print(f"{'сценарий':<10} {'обновл.':>8} {'p50 мс':>9} {'p99 мс':>9} {'API/обн.':>9} {'ошибки':>7}")
+    for name, row in results.items():
+        if name == 'total':
+            continue
+        print(f"{name:<10} {row['updates']:>8} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['api_calls_per_update']:>9.2f} {row['errors']:>7}")
+    total = results['total']
+    print(f"\nБез рассылки: {total['updates']} обновлений за {total['seconds']:.2f} с: "
+          f"{total['updates_per_second']:.0f} обн/с, {total['api_calls_per_update']:.2f} вызовов API на обновление, "
+          f"429: {total['retry_after']}")
+    print("Вызовы API:", ", ".join(f"{method} {count}" for method, count in total['api_calls'].items()))
+
+async def run(args):
+    codes = seed(args)
+    request = FakeRequest(latency=args.latency, retry_after_rate=args.retry_after_rate,
+                          file_payload=jpeg_payload, seed=args.seed)
+    application = bot.build_application(request=request, token=TOKEN)
+    rng = random.Random(args.seed)
+
+    async with application:
+        request.reset()
+        runner = Runner(application, args.rate_limit)
+        application.add_error_handler(runner.count_error)
+        users = []
+        user_id = USER_ID_BASE
+        for _ in range(args.lookup_users):
+            user_id += 1
+            users.append(('lookup', user_id, lookup_script(codes, rng)))
+        for _ in range(args.menu_users):
+            user_id += 1
+            users.append(('menu', user_id, menu_script()))
+        for _ in range(args.deeplink_users):
+            user_id += 1
+            users.append(('deeplink', user_id, deeplink_script(codes, rng)))
+        for i in range(args.upload_users):
+            user_id += 1
+            users.append(('upload', user_id, upload_script(f'bench_admin_{i}', f'upload-{i}')))
+        # Рассылка идёт параллельно, но в пропускную способность не входит:
+        # она сама ждёт 0.1 с на получателя
+        broadcast = None
+        if args.broadcast:
+            user_id += 1
+            broadcast = asyncio.create_task(runner.run_user('broadcast', user_id, broadcast_script()))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(runner.run_user(*user) for user in users))
+        elapsed = time.perf_counter() - started
+        if broadcast:
+            await broadcast
+    return summarize(runner, request, elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cameras', type=int, default=5000)
+    parser.add_argument('--projects', type=int, default=20, help='проектов и паков')
+    parser.add_argument('--recipients', type=int, default=50, help='получателей рассылки')
+    parser.add_argument('--lookup-users', type=int, default=200)
+    parser.add_argument('--menu-users', type=int, default=100)
+    parser.add_argument('--deeplink-users', type=int, default=50)
+    parser.add_argument('--upload-users', type=int, default=20)
+    parser.add_argument('--no-broadcast', dest='broadcast', action='store_false')
+    parser.add_argument('--latency', type=float, default=0.0, help='средняя задержка Bot API, с')
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help='доля ответов 429 на send*')
+    parser.add_argument('--rate-limit', action='store_true', help='не сбрасывать ограничение скорости')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.json:
+        with open(os.path.join(START_DIR, args.json), 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    # Исключение в любом обработчике — ошибка прогона (удобно для проверки в CI)
+    if any(row.get('errors') for row in results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import json
+import random
+import time
+from collections import Counter
+from telegram.request import BaseRequest
+
+# Поддельный транспорт Bot API для бенчмарков: отвечает на вызовы методов из
+# памяти, имитирует задержку сети и ответы 429 (RetryAfter) и считает вызовы.
+# Подключается через build_application(request=FakeRequest(...)).
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+# Метка сценария текущей задачи — вызовы API считаются по сценариям
+scenario = contextvars.ContextVar('scenario', default='-')
+
+# Методы, которые отвечают сообщением
+MESSAGE_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendAnimation',
+    'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup',
+    'copyMessage', 'forwardMessage',
+}
+
+def _chat_id(parameters):
+    try:
+        return int(parameters.get('chat_id', 0))
+    except (TypeError, ValueError):
+        return 0
+
+class FakeRequest(BaseRequest):
+    """BaseRequest, который не ходит в сеть.
+
+    latency — средняя задержка ответа в секундах (±50%), retry_after_rate —
+    доля вызовов send*, на которые приходит 429 с retry_after секунд.
+    file_payload() возвращает содержимое скачиваемых файлов.
+    """
+
+    def __init__(self, latency=0.0, retry_after_rate=0.0, retry_after=1, file_payload=None, seed=0):
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.file_payload = file_payload or (lambda: b'\xff\xd8' + random.randbytes(4096))
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.calls_by_scenario = Counter()
+        self.retry_afters = 0
+        self._message_id = 0
+        self._file_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def reset(self):
+        self.calls.clear()
+        self.calls_by_scenario.clear()
+        self.retry_afters = 0
+
+    def _message(self, method, parameters):
+        self._message_id += 1
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': _chat_id(parameters), 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if method == 'sendPhoto':
+            file_id = parameters['photo'] if isinstance(parameters.get('photo'), str) else None
+            if not file_id or file_id.startswith('attach://'):
+                self._file_id += 1
+                file_id = f'fake-photo-{self._file_id}'
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 720}]
+        elif method == 'sendDocument':
+            self._file_id += 1
+            message['document'] = {'file_id': f'fake-doc-{self._file_id}', 'file_unique_id': f'd{self._file_id}'}
+        else:
+            message['text'] = str(parameters.get('text', ''))
+        return message
+
+    def _result(self, method, parameters):
+        if method == 'getMe':
+            return BOT_USER
+        if method in MESSAGE_METHODS:
+            return self._message(method, parameters)
+        if method == 'sendMediaGroup':
+            media = parameters.get('media') or []
+            return [self._message('sendPhoto', {'chat_id': parameters.get('chat_id')}) for _ in media]
+        if method == 'getChatMember':
+            user = {'id': int(parameters.get('user_id', 0)), 'is_bot': False, 'first_name': 'User'}
+            return {'status': 'member', 'user': user}
+        if method == 'getFile':
+            file_id = parameters.get('file_id', '')
+            return {'file_id': file_id, 'file_unique_id': file_id, 'file_size': 4096,
+                    'file_path': f'photos/{file_id}.jpg'}
+        if method == 'getUpdates':
+            return []
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+
+        if '/file/bot' in url:
+            self.calls['downloadFile'] += 1
+            self.calls_by_scenario[scenario.get()] += 1
+            return 200, self.file_payload()
+
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        self.calls_by_scenario[scenario.get()] += 1
+        parameters = request_data.parameters if request_data else {}
+
+        if api_method.startswith('send') and self.random.random() < self.retry_after_rate:
+            self.retry_afters += 1
+            body = {
+                'ok': False, 'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }
+            return 429, json.dumps(body).encode('utf-8')
+
+        body = {'ok': True, 'result': self._result(api_method, parameters)}
+        return 200, json.dumps(body).encode('utf-8')
@@ -0,0 +1,526 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов без сети.
+
+Поддерживает getUpdates (long polling), setWebhook/deleteWebhook, sendMessage,
+sendPhoto, sendDocument, sendMediaGroup, getChatMember, getFile и скачивание
+файлов, а также задержку ответов, флуд-лимиты (на чат и общий) и
+искусственные сбои. С --local-dir ведёт себя как telegram-bot-api --local:
+getFile отдаёт абсолютные пути к файлам в этом каталоге, а файлы,
+отправленные ботом как file://, читает с диска. Только стандартная
+библиотека.
+
+Бот подключается через config.py:
+
+    BOT_API_BASE_URL = "http://127.0.0.1:8081/bot"
+    BOT_API_BASE_FILE_URL = "http://127.0.0.1:8081/file/bot"
+
+    python benchmarks/fake_bot_api.py --port 8081 --latency 0.05 --fail-rate 0.01
+
+Сообщения «от пользователей» приходят через управляющий API (им пользуется
+load_generator.py):
+
+    POST /control/send     {"message": {...}, "timeout": 10} — кладёт сообщение
+                           в очередь обновлений и ждёт первого ответа бота в этот чат
+    POST /control/updates  {"updates": [{...}, ...]} — только поставить в очередь
+    GET  /control/stats    счётчики вызовов, флуд-лимитов и сбоев
+    POST /control/reset    обнулить счётчики
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+logger = logging.getLogger('fake_bot_api')
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+# Методы, на которые распространяются флуд-лимиты и которые отвечают пользователю
+SEND_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendAnimation', 'sendMediaGroup',
+    'copyMessage', 'forwardMessage',
+}
+EDIT_METHODS = {'editMessageText', 'editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup'}
+MAX_UPDATES = 100
+FILE_SIZE = 50 * 1024
+
+class TokenBucket:
+    """rate событий в секунду с запасом burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """0, если событие разрешено, иначе сколько секунд ждать"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Возвращает токен события, которое всё-таки не состоялось"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+# ====== HTTP ======
+
+async def read_request(reader):
+    """(метод, путь, заголовки, тело) или None, если соединение закрыто"""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, target, headers, body
+
+def write_response(writer, status, payload, content_type='application/json'):
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests', 502: 'Bad Gateway'}
+    writer.write(
+        f"HTTP/1.1 {status} {reason.get(status, 'Error')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode('latin-1') + payload
+    )
+
+def parse_multipart(body, content_type):
+    """{поле: str} и {поле: (имя файла, bytes)} из multipart/form-data"""
+    boundary = content_type.split('boundary=', 1)[1].strip('"').encode('latin-1')
+    fields, files = {}, {}
+    for part in body.split(b'--' + boundary)[1:]:
+        if part.startswith(b'--'):
+            break
+        head, _, content = part.lstrip(b'\r\n').partition(b'\r\n\r\n')
+        content = content[:-2] if content.endswith(b'\r\n') else content
+        disposition = {}
+        for line in head.decode('utf-8').split('\r\n'):
+            if line.lower().startswith('content-disposition:'):
+                for item in line.split(';')[1:]:
+                    key, _, value = item.strip().partition('=')
+                    disposition[key] = value.strip('"')
+        if 'filename' in disposition:
+            files[disposition['name']] = (disposition['filename'], content)
+        else:
+            fields[disposition.get('name')] = content.decode('utf-8')
+    return fields, files
+
+def parse_parameters(headers, body, query):
+    content_type = headers.get('content-type', '')
+    parameters = dict(parse_qsl(query))
+    files = {}
+    if content_type.startswith('application/json') and body:
+        parameters.update(json.loads(body))
+    elif content_type.startswith('multipart/form-data'):
+        fields, files = parse_multipart(body, content_type)
+        parameters.update(fields)
+    elif body:
+        parameters.update(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+    return parameters, files
+
+def _json_value(value):
+    # Вложенные объекты в форме приходят строками JSON
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+def _chat_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+async def post_json(url, payload, secret_token=None):
+    """POST JSON по http:// без сторонних библиотек; возвращает код ответа"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    body = json.dumps(payload).encode('utf-8')
+    headers = f"POST {parts.path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+    headers += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+    if secret_token:
+        headers += f"X-Telegram-Bot-Api-Secret-Token: {secret_token}\r\n"
+    writer.write((headers + "\r\n").encode('latin-1') + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+# ====== ПОДДЕЛЬНЫЙ BOT API ======
+
+class FakeBotApi:
+    def __init__(self, latency=0.0, per_chat_rate=1.0, per_chat_burst=3, global_rate=30.0,
+                 fail_rate=0.0, drop_rate=0.0, member_status='member', seed=0, local_dir=None):
+        self.latency = latency
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets = {}
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.member_status = member_status
+        self.local_dir = local_dir
+        self.random = random.Random(seed)
+
+        self.updates = []
+        self.next_update_id = 1
+        self.updates_changed = asyncio.Condition()
+        self.webhook = None
+        self.files = {}
+        self.next_message_id = 1
+        self.next_file_id = 1
+        # chat_id -> ожидающие первого ответа бота (из /control/send)
+        self.waiters = defaultdict(list)
+
+        self.calls = Counter()
+        self.flood_limited = Counter()
+        self.failures = Counter()
+        self.sent_by_chat = Counter()
+        self.webhook_errors = 0
+        self.local_reads = 0
+
+    def reset(self):
+        for counter in (self.calls, self.flood_limited, self.failures, self.sent_by_chat):
+            counter.clear()
+        self.webhook_errors = 0
+        self.local_reads = 0
+
+    def stats(self):
+        return {
+            'calls': dict(self.calls.most_common()),
+            'flood_limited': dict(self.flood_limited),
+            'failures': dict(self.failures),
+            'chats': len(self.sent_by_chat),
+            'messages_sent': sum(self.sent_by_chat.values()),
+            'pending_updates': len(self.updates),
+            'webhook': self.webhook[0] if self.webhook else None,
+            'webhook_errors': self.webhook_errors,
+            'local_reads': self.local_reads,
+        }
+
+    # --- обновления ---
+
+    async def enqueue(self, message):
+        update = {'update_id': self.next_update_id, 'message': message}
+        self.next_update_id += 1
+        if self.webhook:
+            asyncio.get_running_loop().create_task(self.deliver(update))
+            return update
+        async with self.updates_changed:
+            self.updates.append(update)
+            self.updates_changed.notify_all()
+        return update
+
+    async def deliver(self, update):
+        url, secret_token = self.webhook
+        try:
+            status = await post_json(url, update, secret_token)
+            if status >= 300:
+                raise ConnectionError(f"HTTP {status}")
+        except (OSError, ValueError, IndexError) as e:
+            self.webhook_errors += 1
+            logger.warning(f"Не удалось доставить обновление {update['update_id']} на webhook: {e}")
+
+    async def get_updates(self, parameters):
+        offset = int(parameters.get('offset') or 0)
+        limit = min(int(parameters.get('limit') or MAX_UPDATES), MAX_UPDATES)
+        timeout = float(parameters.get('timeout') or 0)
+        async with self.updates_changed:
+            if offset:
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self.updates_changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self.updates[:limit]
+
+    # --- сообщения и файлы ---
+
+    def _store_file(self, content, prefix):
+        file_id = f'{prefix}-{self.next_file_id}'
+        self.next_file_id += 1
+        self.files[file_id] = content
+        return file_id
+
+    def _file_object(self, value, files, field, prefix):
+        if isinstance(value, str) and value.startswith('attach://'):
+            field = value[len('attach://'):]
+            value = None
+        if field in files:
+            file_id = self._store_file(files[field][1], prefix)
+        elif isinstance(value, str) and value.startswith('file://'):
+            # Локальный режим: бот передал путь, файл читает сам сервер
+            with open(unquote(urlsplit(value).path), 'rb') as source:
+                file_id = self._store_file(source.read(), prefix)
+            self.local_reads += 1
+        else:
+            file_id = str(value)
+        return {'file_id': file_id, 'file_unique_id': file_id, 'file_size': len(self.files.get(file_id, b''))}
+
+    def _message(self, chat_id, extra):
+        message = {
+            'message_id': self.next_message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if isinstance(chat_id, int) and chat_id > 0 else 'channel'},
+            'from': BOT_USER,
+        }
+        self.next_message_id += 1
+        message.update(extra)
+        return message
+
+    def _reply(self, chat_id, message):
+        self.sent_by_chat[chat_id] += 1
+        for future in self.waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(message)
+
+    def _send(self, method, parameters, files):
+        chat_id = _chat_id(parameters.get('chat_id'))
+        if method == 'sendMediaGroup':
+            messages = []
+            for item in _json_value(parameters.get('media')) or []:
+                photo = self._file_object(item.get('media'), files, None, 'photo')
+                photo.update(width=1280, height=720)
+                messages.append(self._message(chat_id, {'photo': [photo], 'caption': item.get('caption')}))
+            if messages:
+                self._reply(chat_id, messages[0])
+            return messages
+        if method == 'sendPhoto':
+            photo = self._file_object(parameters.get('photo'), files, 'photo', 'photo')
+            photo.update(width=1280, height=720)
+            extra = {'photo': [photo], 'caption': parameters.get('caption')}
+        elif method == 'sendDocument':
+            document = self._file_object(parameters.get('document'), files, 'document', 'document')
+            document['file_name'] = files['document'][0] if 'document' in files else 'file'
+            extra = {'document': document, 'caption': parameters.get('caption')}
+        else:
+            extra = {'text': parameters.get('text', '')}
+        message = self._message(chat_id, extra)
+        self._reply(chat_id, message)
+        return message
+
+    def _flood_wait(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        # Отклонённое чатом сообщение не должно тратить общий лимит, а
+        # отклонённое общим лимитом — лимит чата
+        wait = bucket.take()
+        if wait:
+            return wait
+        wait = self.global_bucket.take()
+        if wait:
+            bucket.refund()
+        return wait
+
+    async def call(self, method, parameters, files):
+        """(HTTP-код, ответ) для метода Bot API; None — оборвать соединение"""
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self.get_updates(parameters)}
+
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        roll = self.random.random()
+        if roll < self.drop_rate:
+            self.failures['dropped'] += 1
+            return None
+        if roll < self.drop_rate + self.fail_rate:
+            self.failures['502'] += 1
+            return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+
+        if method in SEND_METHODS:
+            chat_id = _chat_id(parameters.get('chat_id'))
+            wait = self._flood_wait(chat_id)
+            if wait:
+                self.flood_limited[method] += 1
+                retry_after = max(1, round(wait))
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f'Too Many Requests: retry after {retry_after}',
+                             'parameters': {'retry_after': retry_after}}
+            return 200, {'ok': True, 'result': self._send(method, parameters, files)}
+
+        if method in EDIT_METHODS:
+            chat_id = _chat_id(parameters.get('chat_id'))
+            return 200, {'ok': True, 'result': self._message(chat_id, {'text': parameters.get('text', '')})}
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getChatMember':
+            user = {'id': int(parameters.get('user_id', 0)), 'is_bot': False, 'first_name': 'User'}
+            result = {'status': self.member_status, 'user': user}
+        elif method == 'getFile':
+            file_id = parameters.get('file_id', '')
+            # Фото, «присланные пользователями» через /control, появляются при первом запросе
+            content = self.files.setdefault(file_id, self.random.randbytes(FILE_SIZE))
+            result = {'file_id': file_id, 'file_unique_id': file_id, 'file_size': len(content),
+                      'file_path': self._file_path(file_id, content)}
+        elif method == 'setWebhook':
+            self.webhook = (parameters['url'], parameters.get('secret_token'))
+            result = True
+        elif method == 'deleteWebhook':
+            self.webhook = None
+            if str(parameters.get('drop_pending_updates', '')).lower() in ('true', '1'):
+                self.updates.clear()
+            result = True
+        elif method == 'getWebhookInfo':
+            result = {'url': self.webhook[0] if self.webhook else '', 'has_custom_certificate': False,
+                      'pending_update_count': len(self.updates)}
+        else:
+            result = True
+        return 200, {'ok': True, 'result': result}
+
+    def _file_path(self, file_id, content):
+        if not self.local_dir:
+            return f'files/{file_id}'
+        # Как telegram-bot-api --local: файл уже лежит на диске сервера
+        path = os.path.abspath(os.path.join(self.local_dir, file_id))
+        if not os.path.exists(path):
+            os.makedirs(self.local_dir, exist_ok=True)
+            with open(path, 'wb') as target:
+                target.write(content)
+        return path
+
+    # --- управляющий API ---
+
+    def _user_message(self, message):
+        user = message.setdefault('from', {'id': 1000, 'is_bot': False, 'first_name': 'User'})
+        message.setdefault('chat', {'id': user['id'], 'type': 'private'})
+        message.setdefault('message_id', self.next_message_id)
+        message.setdefault('date', int(time.time()))
+        self.next_message_id += 1
+        text = message.get('text', '')
+        if text.startswith('/') and 'entities' not in message:
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return message
+
+    async def control(self, method, path, body):
+        if path == '/control/stats':
+            return 200, self.stats()
+        if method != 'POST':
+            return 404, {'ok': False}
+        request = json.loads(body or b'{}')
+        if path == '/control/reset':
+            self.reset()
+            return 200, {'ok': True}
+        if path == '/control/updates':
+            for message in request.get('updates', []):
+                await self.enqueue(self._user_message(message))
+            return 200, {'ok': True}
+        if path == '/control/send':
+            message = self._user_message(request['message'])
+            future = asyncio.get_running_loop().create_future()
+            self.waiters[message['chat']['id']].append(future)
+            started = time.perf_counter()
+            await self.enqueue(message)
+            try:
+                reply = await asyncio.wait_for(future, request.get('timeout', 10))
+            except asyncio.TimeoutError:
+                return 200, {'ok': False, 'timeout': True}
+            return 200, {'ok': True, 'latency': time.perf_counter() - started, 'reply': reply}
+        return 404, {'ok': False}
+
+    async def dispatch(self, method, target, headers, body):
+        path, _, query = target.partition('?')
+        if path.startswith('/control/'):
+            status, payload = await self.control(method, path, body)
+            return status, json.dumps(payload).encode('utf-8'), 'application/json'
+
+        if path.startswith('/file/bot'):
+            file_id = path.rsplit('/', 1)[-1]
+            self.calls['downloadFile'] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+            if file_id not in self.files:
+                return 404, b'not found', 'text/plain'
+            return 200, self.files[file_id], 'application/octet-stream'
+
+        if path.startswith('/bot') and path.count('/') == 2:
+            api_method = path.rsplit('/', 1)[-1]
+            parameters, files = parse_parameters(headers, body, query)
+            result = await self.call(api_method, parameters, files)
+            if result is None:
+                return None
+            status, payload = result
+            return status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json'
+
+        return 404, b'not found', 'text/plain'
+
+    async def handle(self, reader, writer):
+        # Соединения keep-alive: PTB (httpx) переиспользует их между запросами
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                response = await self.dispatch(*request)
+                if response is None:
+                    break
+                status, payload, content_type = response
+                write_response(writer, status, payload, content_type)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(api, host, port):
+    server = await asyncio.start_server(api.handle, host, port, backlog=4096)
+    logger.info(f"Поддельный Bot API слушает http://{host}:{port}")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='средняя задержка ответа, с')
+    parser.add_argument('--per-chat-rate', type=float, default=1.0, help='сообщений в секунду в один чат')
+    parser.add_argument('--per-chat-burst', type=int, default=3)
+    parser.add_argument('--global-rate', type=float, default=30.0, help='сообщений в секунду всего')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='доля ответов 502')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='доля оборванных соединений')
+    parser.add_argument('--member-status', default='member', help='ответ getChatMember')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--local-dir', help='каталог файлов, как у telegram-bot-api --local')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    async def run():
+        api = FakeBotApi(args.latency, args.per_chat_rate, args.per_chat_burst, args.global_rate,
+                         args.fail_rate, args.drop_rate, args.member_status, args.seed, args.local_dir)
+        server = await serve(api, args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Нагрузочный тест бота через поддельный Bot API (fake_bot_api.py).
+
+Тысячи одновременных «пользователей» пишут боту через управляющий API
+поддельного сервера и ждут ответа, как в Telegram: /start, поиск камер по
+коду и кнопки меню с паузами между сообщениями. В конце печатает задержку
+ответа (p50/p95/p99), число сообщений в секунду, таймауты и счётчики
+сервера (вызовы методов, флуд-лимиты, сбои).
+
+    python benchmarks/fake_bot_api.py --port 8081 &
+    python bot.py   # с BOT_API_BASE_URL на http://127.0.0.1:8081/bot
+    python benchmarks/load_generator.py --users 2000 --messages 5
+
+Коды камер берутся из --codes-file (по одному в строке); без него
+генерируются случайные, и бот отвечает «код не найден».
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+
+import httpx
+
+USER_ID_BASE = 2 * 10 ** 9
+MENU_BUTTONS = ['📁 Проекты', '🔙 Назад', '📦 Паки камер', '🔙 Назад', '📢 Наш канал']
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class LoadGenerator:
+    def __init__(self, client, codes, args):
+        self.client = client
+        self.codes = codes
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.latencies = []
+        self.sent = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def next_text(self, step):
+        if self.random.random() < self.args.menu_share:
+            return MENU_BUTTONS[step % len(MENU_BUTTONS)]
+        if self.codes:
+            return self.random.choice(self.codes)
+        return ''.join(self.random.choices(string.ascii_uppercase + string.digits, k=8))
+
+    async def send(self, user_id, text):
+        message = {
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f'load{user_id}'},
+            'text': text,
+        }
+        self.sent += 1
+        try:
+            response = await self.client.post(
+                '/control/send', json={'message': message, 'timeout': self.args.timeout},
+                timeout=self.args.timeout + 5)
+            result = response.json()
+        except httpx.HTTPError:
+            self.errors += 1
+            return
+        if result.get('ok'):
+            self.latencies.append(result['latency'])
+        else:
+            self.timeouts += 1
+
+    async def user(self, index):
+        # Пользователи подключаются постепенно в течение --ramp секунд
+        await asyncio.sleep(self.args.ramp * index / self.args.users)
+        user_id = USER_ID_BASE + index
+        await self.send(user_id, '/start')
+        for step in range(self.args.messages):
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.args.think)
+            await self.send(user_id, self.next_text(step))
+
+async def run(args):
+    codes = []
+    if args.codes_file:
+        with open(args.codes_file, encoding='utf-8') as file:
+            codes = [line.strip() for line in file if line.strip()]
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits) as client:
+        await client.post('/control/reset')
+        generator = LoadGenerator(client, codes, args)
+        started = time.perf_counter()
+        await asyncio.gather(*(generator.user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        stats = (await client.get('/control/stats')).json()
+
+    print(f"Пользователей: {args.users}, сообщений: {generator.sent} за {elapsed:.1f} с "
+          f"({generator.sent / elapsed:.0f} в секунду)")
+    if generator.latencies:
+        print(f"Ответ бота: p50 {percentile(generator.latencies, 0.5) * 1000:.0f} мс, "
+              f"p95 {percentile(generator.latencies, 0.95) * 1000:.0f} мс, "
+              f"p99 {percentile(generator.latencies, 0.99) * 1000:.0f} мс, "
+              f"макс {max(generator.latencies) * 1000:.0f} мс")
+    print(f"Без ответа за {args.timeout} с: {generator.timeouts}, ошибок соединения: {generator.errors}")
+    print(f"Сервер: отправлено {stats['messages_sent']} сообщений в {stats['chats']} чатов, "
+          f"флуд-лимиты: {stats['flood_limited'] or 0}, сбои: {stats['failures'] or 0}")
+    print("Вызовы API:", ", ".join(f"{method} {count}" for method, count in stats['calls'].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8081', help='адрес fake_bot_api.py')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=5, help='сообщений после /start на пользователя')
+    parser.add_argument('--think', type=float, default=1.0, help='средняя пауза между сообщениями, с')
+    parser.add_argument('--ramp', type=float, default=10.0, help='за сколько секунд подключаются все')
+    parser.add_argument('--menu-share', type=float, default=0.3, help='доля нажатий кнопок меню')
+    parser.add_argument('--codes-file', help='файл с кодами камер')
+    parser.add_argument('--timeout', type=float, default=30.0, help='сколько ждать ответа бота, с')
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
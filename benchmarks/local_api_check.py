@@ -0,0 +1,159 @@
+"""Интеграционная проверка работы с локальным сервером Bot API.
+
+Поднимает fake_bot_api.py в локальном режиме (как telegram-bot-api --local)
+на свободном порту и собирает бота через bot.build_application() с
+BOT_API_BASE_URL на него и настоящим HTTP-транспортом. Проверяет:
+
+- пак, присланный админом, копируется в хранилище с диска сервера, без
+  скачивания по HTTP;
+- по ссылке на пак бот передаёт файл путём file://, сервер читает его сам;
+- файл без локального пути скачивается по HTTP, если он не больше 20 МБ,
+  а больший отклоняется до скачивания.
+
+    python benchmarks/local_api_check.py
+
+Код выхода 0 — все проверки прошли.
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# database создаёт базу при импорте, а ingest читает режим сервера — всё до импорта бота
+WORK_DIR = tempfile.mkdtemp(prefix='local-api-check-')
+os.chdir(WORK_DIR)
+import config  # noqa: E402
+config.BOT_API_LOCAL_MODE = True
+
+from telegram import Update  # noqa: E402
+import bot  # noqa: E402
+import database  # noqa: E402
+from fake_bot_api import FakeBotApi, serve  # noqa: E402
+
+TOKEN = '123456:LOCAL'
+ADMIN = 'local_admin'
+ADMIN_PASSWORD = 'local-password'
+ADMIN_ID = 1001
+USER_ID = 2002
+
+class RecordingApi(FakeBotApi):
+    """FakeBotApi, который запоминает тексты ответов бота по чатам"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.replies = []
+
+    def _reply(self, chat_id, message):
+        self.replies.append((chat_id, message.get('text') or message.get('caption') or ''))
+        super()._reply(chat_id, message)
+
+class Check:
+    def __init__(self, application, api):
+        self.application = application
+        self.api = api
+        self.update_id = 0
+        self.failures = 0
+
+    async def send(self, user_id, text=None, document=None):
+        self.update_id += 1
+        message = {
+            'message_id': self.update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': f'user{user_id}'},
+        }
+        if text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if document is not None:
+            file_id, size = document
+            message['document'] = {'file_id': file_id, 'file_unique_id': file_id,
+                                   'file_name': 'pack.zip', 'file_size': size}
+        bot.message_counters.pop(user_id, None)
+        await self.application.process_update(Update.de_json(
+            {'update_id': self.update_id, 'message': message}, self.application.bot))
+
+    async def upload_pack(self, file_id, name):
+        await self.send(ADMIN_ID, '📦 Управление паками')
+        await self.send(ADMIN_ID, '📤 Загрузить пак')
+        await self.send(ADMIN_ID, document=(file_id, len(self.api.files[file_id])))
+        await self.send(ADMIN_ID, f'Описание {name}')
+        await self.send(ADMIN_ID, name)
+
+    def expect(self, condition, title):
+        print(f"{'✅' if condition else '❌'} {title}")
+        if not condition:
+            self.failures += 1
+
+def stored_content(name):
+    """Содержимое файла пака из хранилища по его названию"""
+    for pack_id, display_name, caption, file_path, admin_username in database.get_all_packs():
+        if display_name == name:
+            with open(file_path, 'rb') as file:
+                return pack_id, file.read()
+    return None, None
+
+async def run():
+    api = RecordingApi(per_chat_rate=1000, per_chat_burst=1000, global_rate=1000,
+                       local_dir=os.path.join(WORK_DIR, 'bot-api-files'))
+    server = await serve(api, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    config.BOT_API_BASE_URL = f'http://127.0.0.1:{port}/bot'
+    config.BOT_API_BASE_FILE_URL = f'http://127.0.0.1:{port}/file/bot'
+
+    database.add_admin(ADMIN, ADMIN_PASSWORD, is_master=True, display_name=ADMIN)
+    rng = random.Random(1)
+    api.files['pack-local'] = rng.randbytes(256 * 1024)
+    api.files['pack-remote'] = rng.randbytes(64 * 1024)
+    api.files['pack-big'] = bytes(21 * 1024 * 1024)
+
+    application = bot.build_application(token=TOKEN)
+    async with server, application:
+        check = Check(application, api)
+        for text in ('/start', '🔐 Вход для админа', ADMIN, ADMIN_PASSWORD):
+            await check.send(ADMIN_ID, text)
+
+        # Локальный путь: файл копируется с диска сервера
+        await check.upload_pack('pack-local', 'Локальный пак')
+        pack_id, content = stored_content('Локальный пак')
+        check.expect(content == api.files['pack-local'], "пак с диска сервера сохранён в хранилище")
+        check.expect(api.calls['downloadFile'] == 0, "файл с локальным путём не скачивался по HTTP")
+
+        # Выдача по ссылке: бот передаёт путь, сервер читает файл сам
+        await check.send(USER_ID, f'/start pack_{pack_id}')
+        sent = [file_id for file_id, data in api.files.items()
+                if file_id.startswith('document-') and data == api.files['pack-local']]
+        check.expect(api.local_reads == 1 and len(sent) == 1, "пак отправлен пользователю путём file://")
+
+        # Сервер без доступа к файлам: небольшой файл качается по HTTP, большой отклоняется
+        api.local_dir = None
+        await check.upload_pack('pack-remote', 'Пак по HTTP')
+        pack_id, content = stored_content('Пак по HTTP')
+        check.expect(content == api.files['pack-remote'], "файл без локального пути скачан по HTTP")
+        check.expect(api.calls['downloadFile'] == 1, "скачивание по HTTP ровно одно")
+
+        downloads = api.calls['downloadFile']
+        await check.send(ADMIN_ID, '📦 Управление паками')
+        await check.send(ADMIN_ID, '📤 Загрузить пак')
+        await check.send(ADMIN_ID, document=('pack-big', len(api.files['pack-big'])))
+        rejected = any(chat_id == ADMIN_ID and 'локальный сервер Bot API' in text
+                       for chat_id, text in api.replies[-2:])
+        check.expect(rejected, "файл больше 20 МБ без локального пути отклонён")
+        check.expect(api.calls['downloadFile'] == downloads, "отклонённый файл не скачивался")
+    return check.failures
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    failures = asyncio.run(run())
+    print(f"\nПроверок не прошло: {failures}" if failures else "\nВсе проверки прошли")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
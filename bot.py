@@ -1,24 +1,42 @@
 import logging
 import asyncio
-from telegram import Update, ReplyKeyboardRemove, ReplyKeyboardMarkup
+from telegram import Update, ReplyKeyboardRemove, ReplyKeyboardMarkup, InlineQueryResultCachedPhoto, InputMediaPhoto
 from telegram.ext import (
     Application,
     CommandHandler,
+    CallbackQueryHandler,
+    InlineQueryHandler,
     ContextTypes,
     MessageHandler,
     filters,
     ConversationHandler
 )
 import database
+import asset_stats
+import camera_index
+import dedup
+import bot_api
+import exports
+import files
+import imaging
+import importer
+import ingest
+import janitor
+import storage
 import keyboards
+import loop_watchdog
+import metrics
+import paginator
+import profiler
 import utils
 import config
 import os
-import sqlite3
-from telegram.error import TimedOut, NetworkError
+from telegram.error import TimedOut, NetworkError, TelegramError, BadRequest, RetryAfter
 import time
 from collections import defaultdict
 import datetime
+import functools
+import itertools
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -43,30 +61,77 @@ logger = logging.getLogger(__name__)
     DELETE_PROJECT,
     PACKS_MENU, UPLOAD_PACK_FILE, UPLOAD_PACK_CAPTION, 
     UPLOAD_PACK_NAME, PACK_MANAGEMENT, DELETE_PACK,
-    BROADCAST_MESSAGE, BROADCAST_HISTORY
-) = range(40)
+    BROADCAST_MESSAGE, BROADCAST_HISTORY,
+    SEARCH_CAMERAS,
+    BULK_CATEGORY, BULK_CAPTION, BULK_PHOTOS,
+    ZIP_CATEGORY, ZIP_FILE
+) = range(46)
+
+SEARCH_PAGE_SIZE = 10
+INLINE_RESULTS_LIMIT = 20
+INLINE_CACHE_TIME = 30
+# Сколько секунд inline-режим доверяет проверке подписки (отказ — меньше,
+# чтобы только что подписавшийся не ждал)
+SUBSCRIPTION_CACHE_TIME = 300
+SUBSCRIPTION_REJECT_CACHE_TIME = 15
+MEDIA_GROUP_SIZE = 10
+MAX_CODES_PER_MESSAGE = 50
+# Сколько раз отправка повторяется, если Telegram просит подождать (флуд-контроль)
+FLOOD_WAIT_ATTEMPTS = 3
+ALBUM_COLLECT_DELAY = 1.5
+IMPORT_PROGRESS_INTERVAL = 3
+PHASH_BACKFILL_BATCH = 200
+REPORT_TEXT_LIMIT = 4000
+STORAGE_GC_INTERVAL = 24 * 3600
+
+HANDLER_SECONDS = metrics.Histogram('bot_handler_seconds', 'Время работы обработчиков', ('handler',))
+HANDLER_ERRORS = metrics.Counter('bot_handler_errors_total', 'Исключения в обработчиках', ('handler',))
+RATE_LIMITED = metrics.Counter('bot_rate_limited_total', 'Сообщения, отклонённые ограничением скорости')
+UPDATE_QUEUE_DEPTH = metrics.Gauge('bot_update_queue_depth', 'Обновления, ожидающие обработки')
+INGEST_WAITING = metrics.Gauge('bot_ingest_waiting', 'Загрузки в очереди планировщика', ingest.waiting)
+INGEST_ACTIVE = metrics.Gauge('bot_ingest_active', 'Загрузки в работе и в очереди', ingest.active)
+SESSIONS = metrics.Gauge('bot_admin_sessions', 'Активные сессии админов', lambda: len(sessions))
+ASSET_STATS_PENDING = metrics.Gauge(
+    'bot_asset_stats_pending', 'Выдачи ассетов, ещё не записанные в базу', asset_stats.pending)
 
 sessions = {}
+# Фото альбомов, ожидающие сохранения: (chat_id, media_group_id) -> данные альбома
+album_buffers = {}
+# Миграция и сборка мусора хранилища не должны идти одновременно
+storage_maintenance_lock = asyncio.Lock()
+# Одновременно идёт не больше одного профилирования
+profiling_lock = asyncio.Lock()
+# user_id -> (подписан, действительно до) для inline-запросов
+subscription_cache = {}
+# HTTP-сервер /metrics, закрывается в post_shutdown
+metrics_server = None
 message_counters = defaultdict(lambda: {'count': 0, 'last_reset': time.time(), 'blocked_until': 0})
 
-async def send_photo_with_retry(update, photo_path, caption, max_retries=3):
+async def send_photo_with_retry(update, photo_path, caption, max_retries=3, file_id=None):
     for attempt in range(max_retries):
         try:
-            with open(photo_path, 'rb') as photo:
-                await update.message.reply_photo(
-                    photo=photo,
+            # Фото, уже загруженное в Telegram, отправляем по file_id без чтения с диска
+            metrics.CACHE_REQUESTS.inc('file_id', 'hit' if file_id else 'miss')
+            if file_id:
+                return await update.message.reply_photo(
+                    photo=file_id,
                     caption=caption,
                     parse_mode='HTML'
                 )
-                return True
+            photo = await files.telegram_input(photo_path)
+            return await update.message.reply_photo(
+                photo=photo,
+                caption=caption,
+                parse_mode='HTML'
+            )
         except (TimedOut, NetworkError) as e:
             logger.warning(f"Ошибка при отправке фото (попытка {attempt+1}/{max_retries}): {e}")
             if attempt < max_retries - 1:
                 await asyncio.sleep(2)
             else:
                 logger.error(f"Не удалось отправить фото после {max_retries} попыток")
-                return False
-    return False
+                return None
+    return None
 
 async def is_subscribed(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Проверяет подписку пользователя на канал"""
@@ -80,6 +145,20 @@ async def is_subscribed(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> boo
         logger.error(f"Ошибка проверки подписки: {e}")
         return False
 
+async def is_subscribed_cached(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Проверка подписки с кэшем: inline-запросы приходят на каждую набранную букву"""
+    now = time.time()
+    cached = subscription_cache.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    subscribed = await is_subscribed(user_id, context)
+    if len(subscription_cache) > 10000:
+        for key in [key for key, (_, expires) in subscription_cache.items() if expires <= now]:
+            del subscription_cache[key]
+    ttl = SUBSCRIPTION_CACHE_TIME if subscribed else SUBSCRIPTION_REJECT_CACHE_TIME
+    subscription_cache[user_id] = (subscribed, now + ttl)
+    return subscribed
+
 def check_rate_limit(user_id: int) -> bool:
     """Проверяет ограничение скорости (6 сообщений/секунду)"""
     current_time = time.time()
@@ -92,6 +171,7 @@ def check_rate_limit(user_id: int) -> bool:
     
     # Проверка блокировки
     if counter['blocked_until'] > current_time:
+        RATE_LIMITED.inc()
         return False
     
     # Увеличиваем счетчик
@@ -100,19 +180,96 @@ def check_rate_limit(user_id: int) -> bool:
     # Если превышен лимит - блокируем на 10 секунд
     if counter['count'] > 6:
         counter['blocked_until'] = current_time + 10
+        RATE_LIMITED.inc()
         return False
     
     return True
 
+async def send_camera(update: Update, code):
+    """Отправляет камеру по коду, возвращает False если код не найден"""
+    camera = database.get_camera(code)
+    
+    if camera:
+        image_path, caption, custom_name, file_id = camera
+        try:
+            formatted_caption = utils.format_caption(caption, custom_name)
+            caption_text = f"📸 Камера: {code}\n\n{formatted_caption}"
+            
+            sent = await send_photo_with_retry(update, image_path, caption_text, file_id=file_id)
+            
+            if not sent:
+                await update.message.reply_text(
+                    "⚠️ Не удалось отправить фото. Попробуйте позже или обратитесь к администратору."
+                )
+            else:
+                asset_stats.record('camera', code)
+                if not file_id:
+                    # Запоминаем file_id, чтобы следующие отправки и inline-режим не читали файл
+                    database.set_camera_file_id(code, sent.photo[-1].file_id)
+                
+        except FileNotFoundError:
+            await update.message.reply_text("❌ Изображение не найдено. Обратитесь к администратору.")
+        return True
+    
+    await update.message.reply_text("❌ Код не найден. Попробуйте еще раз.")
+    return False
+
+async def deliver_start_payload(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Выдаёт камеру, проект или пак по параметру ссылки t.me/<bot>?start=<payload>"""
+    if payload.startswith(utils.PROJECT_LINK_PREFIX):
+        project_id = payload[len(utils.PROJECT_LINK_PREFIX):]
+        project = database.get_project(int(project_id)) if project_id.isdigit() else None
+        if not project:
+            await update.message.reply_text("❌ Проект по ссылке не найден.")
+            return
+        project_id, file_path, caption, display_name, timestamp = project
+        if await send_file_document(update, file_path, caption, "проекта", display_name):
+            asset_stats.record('project', project_id)
+    elif payload.startswith(utils.PACK_LINK_PREFIX):
+        pack_id = payload[len(utils.PACK_LINK_PREFIX):]
+        pack = database.get_pack(int(pack_id)) if pack_id.isdigit() else None
+        if not pack:
+            await update.message.reply_text("❌ Пак по ссылке не найден.")
+            return
+        pack_id, display_name, caption, file_path, admin_username = pack
+        if await send_file_document(update, file_path, caption, "пака", display_name):
+            asset_stats.record('pack', pack_id)
+    else:
+        await send_camera(update, payload.upper())
+
+async def send_file_document(update: Update, file_path, caption, kind, display_name=None):
+    """Отправляет файл проекта или пака документом"""
+    try:
+        # Файл читается в файловом пуле, отсутствие файла не блокирует цикл событий
+        try:
+            data = await files.telegram_input(file_path)
+        except FileNotFoundError:
+            logger.error(f"Файл {kind} не найден: {file_path}")
+            await update.message.reply_text(f"❌ Файл {kind} не найден. Обратитесь к администратору.")
+            return False
+        
+        await update.message.reply_document(
+            document=data,
+            caption=caption,
+            filename=utils.document_filename(file_path, display_name)
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка отправки {kind}: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Не удалось отправить файл {kind}. Обратитесь к администратору.")
+        return False
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Очищаем данные текущей сессии
     chat_id = update.effective_chat.id
     if chat_id in sessions:
         del sessions[chat_id]
+    await abandon_pending_uploads(context)
     context.user_data.clear()
     
     user = update.effective_user
     user_id = user.id
+    payload = context.args[0] if context.args else None
     
     # Проверка ограничения скорости
     if not check_rate_limit(user_id):
@@ -132,6 +289,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Проверка подписки
     if not await is_subscribed(user_id, context):
+        if payload:
+            # Выдадим содержимое ссылки сразу после подтверждения подписки
+            context.user_data['start_payload'] = payload
         await update.message.reply_text(
             "📢 Для использования бота необходимо подписаться на наш канал!\n"
             f"Ссылка: {config.CHANNEL_LINK}\n\n"
@@ -145,6 +305,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "👋 Добро пожаловать в систему слива и выдачи камер!",
         reply_markup=keyboards.main_menu()
     )
+    if payload:
+        await deliver_start_payload(update, context, payload)
     return PARTICIPANT_CODE
 
 async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -161,6 +323,9 @@ async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "✅ Отлично! Теперь вам доступны все функции бота!",
             reply_markup=keyboards.main_menu()
         )
+        payload = context.user_data.pop('start_payload', None)
+        if payload:
+            await deliver_start_payload(update, context, payload)
         return PARTICIPANT_CODE
     else:
         await update.message.reply_text(
@@ -247,29 +412,217 @@ async def participant_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if text == "📦 Паки камер":
         return await packs_menu(update, context)
     
-    code = text.strip().upper()
-    camera = database.get_camera(code)
-    
-    if camera:
-        image_path, caption, custom_name = camera
+    codes = utils.parse_codes(text)
+    if len(codes) > 1 and utils.looks_like_codes(codes):
+        await send_cameras_batch(update, codes[:MAX_CODES_PER_MESSAGE], codes[MAX_CODES_PER_MESSAGE:])
+    else:
+        await send_camera(update, text.strip().upper())
+    return PARTICIPANT_CODE
+
+async def send_with_flood_wait(send, **kwargs):
+    """Вызывает метод отправки, выжидая паузы, которые просит Telegram"""
+    for attempt in range(FLOOD_WAIT_ATTEMPTS - 1):
         try:
+            return await send(**kwargs)
+        except RetryAfter as e:
+            logger.warning(f"Флуд-контроль Telegram, ждём {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+    return await send(**kwargs)
+
+async def send_cameras_batch(update: Update, codes, skipped=()):
+    """Отправляет несколько камер альбомами по 10 фото и одну сводку"""
+    cameras = {row[0]: row[1:] for row in database.get_cameras(codes)}
+    missing = [code for code in codes if code not in cameras]
+    found = [code for code in codes if code in cameras]
+    failed = []
+    
+    for i in range(0, len(found), MEDIA_GROUP_SIZE):
+        chunk = found[i:i + MEDIA_GROUP_SIZE]
+        # Фото без file_id читаются с диска параллельно в файловом пуле
+        from_disk = [code for code in chunk if not cameras[code][3]]
+        metrics.CACHE_REQUESTS.inc('file_id', 'hit', amount=len(chunk) - len(from_disk))
+        metrics.CACHE_REQUESTS.inc('file_id', 'miss', amount=len(from_disk))
+        contents = await asyncio.gather(
+            *(files.telegram_input(cameras[code][0]) for code in from_disk),
+            return_exceptions=True
+        )
+        photos = dict(zip(from_disk, contents))
+        
+        items = []
+        for code in chunk:
+            image_path, caption, custom_name, file_id = cameras[code]
+            photo = file_id or photos[code]
+            if isinstance(photo, Exception):
+                failed.append(code)
+                continue
             formatted_caption = utils.format_caption(caption, custom_name)
-            caption_text = f"📸 Камера: {code}\n\n{formatted_caption}"
-            
-            success = await send_photo_with_retry(update, image_path, caption_text)
-            
-            if not success:
-                await update.message.reply_text(
-                    "⚠️ Не удалось отправить фото. Попробуйте позже или обратитесь к администратору."
-                )
-                
-        except FileNotFoundError:
-            await update.message.reply_text("❌ Изображение не найдено. Обратитесь к администратору.")
-    else:
-        await update.message.reply_text("❌ Код не найден. Попробуйте еще раз.")
+            items.append((code, photo, f"📸 Камера: {code}\n\n{formatted_caption}"))
+        
+        if not items:
+            continue
+        sent = []
+        if len(items) > 1:
+            try:
+                messages = await send_with_flood_wait(update.message.reply_media_group, media=[
+                    InputMediaPhoto(media=photo, caption=caption_text, parse_mode='HTML')
+                    for code, photo, caption_text in items
+                ])
+                sent = list(zip([code for code, photo, caption_text in items], messages))
+                items = []
+            except BadRequest as e:
+                # Одно битое фото валит весь альбом — отправим камеры по одной
+                logger.error(f"Ошибка при отправке альбома камер: {e}")
+            except TelegramError as e:
+                # Сеть, таймаут (альбом мог и дойти) или флуд-контроль не отпустил —
+                # отправка по одной дала бы дубли или ещё больше запросов
+                logger.error(f"Не удалось отправить альбом камер: {e}")
+                failed.extend(code for code, photo, caption_text in items)
+                continue
+        for code, photo, caption_text in items:
+            try:
+                message = await send_with_flood_wait(update.message.reply_photo, photo=photo,
+                                                     caption=caption_text, parse_mode='HTML')
+            except TelegramError as e:
+                logger.error(f"Ошибка при отправке камеры {code}: {e}")
+                failed.append(code)
+                continue
+            sent.append((code, message))
+        
+        for code, message in sent:
+            asset_stats.record('camera', code)
+        # Запоминаем file_id для камер, которые отправлялись с диска
+        for code, message in sent:
+            if not cameras[code][3] and message.photo:
+                database.set_camera_file_id(code, message.photo[-1].file_id)
+    
+    summary = f"📦 Найдено камер: {len(found) - len(failed)} из {len(codes)}"
+    if missing:
+        summary += "\n❌ Коды не найдены: " + ", ".join(missing)
+    if failed:
+        summary += "\n⚠️ Не удалось отправить: " + ", ".join(failed)
+    if skipped:
+        summary += (f"\n⚠️ За раз обрабатывается не больше {MAX_CODES_PER_MESSAGE} кодов, "
+                    f"пропущено: {len(skipped)} (начиная с {skipped[0]}) — отправьте их отдельным сообщением")
+    await update.message.reply_text(summary)
+
+def render_search_results(query, results, total, offset, show_admin=False):
+    if not results:
+        return f"🔎 По запросу «{query}» ничего не найдено."
+    
+    message = f"🔎 Результаты по запросу «{query}» ({offset + 1}–{offset + len(results)} из {total}):\n\n"
+    for code, category, custom_name, caption, admin in results:
+        message += f"🔑 {code}\n📂 Категория: {category}\n"
+        if custom_name:
+            message += f"🏷️ Название: {custom_name}\n"
+        message += f"ℹ️ {caption}\n"
+        if show_admin:
+            message += f"👤 Админ: {admin or 'удалён'}\n"
+        message += "\n"
+    return message[:4000]
+
+async def send_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE, scope, query):
+    context.user_data[f'search_query_{scope}'] = query
+    results, total = database.search_cameras(query, SEARCH_PAGE_SIZE, 0)
+    await update.message.reply_text(
+        render_search_results(query, results, total, 0, show_admin=(scope == 'a')),
+        reply_markup=keyboards.search_pagination_keyboard(scope, 0, total, SEARCH_PAGE_SIZE)
+    )
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск камер по подписи, названию и категории"""
+    user_id = update.effective_user.id
     
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return PARTICIPANT_CODE
+    
+    # Проверка подписки
+    if not await is_subscribed(user_id, context):
+        await update.message.reply_text(
+            "❌ Для использования бота необходимо подписаться на наш канал!\n"
+            f"Ссылка: {config.CHANNEL_LINK}\n\n"
+            "После подписки нажмите кнопку 👇",
+            reply_markup=ReplyKeyboardMarkup([["✅ Я подписался"]], resize_keyboard=True),
+            disable_web_page_preview=True
+        )
+        return SUBSCRIPTION_CHECK
+    
+    if database.is_banned(user_id):
+        await update.message.reply_text("🚫 Вы заблокированы и не можете использовать бота.")
+        return ConversationHandler.END
+    
+    query = " ".join(context.args).strip()
+    if not query:
+        await update.message.reply_text("🔎 Использование: /search <запрос>\nНапример: /search парковка")
+        return PARTICIPANT_CODE
+    
+    await send_search_results(update, context, 'u', query)
     return PARTICIPANT_CODE
 
+async def search_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листает страницы результатов поиска"""
+    query_obj = update.callback_query
+    _, scope, offset = query_obj.data.split(':')
+    offset = int(offset)
+    
+    if not check_rate_limit(update.effective_user.id):
+        await query_obj.answer("⏳ Слишком часто. Подождите 10 секунд.")
+        return
+    
+    if scope == 'a' and update.effective_chat.id not in sessions:
+        await query_obj.answer("🔐 Требуется вход админа.")
+        return
+    
+    query = context.user_data.get(f'search_query_{scope}')
+    if not query:
+        await query_obj.answer("⌛ Поиск устарел, повторите запрос.")
+        return
+    
+    results, total = database.search_cameras(query, SEARCH_PAGE_SIZE, offset)
+    await query_obj.answer()
+    await query_obj.edit_message_text(
+        render_search_results(query, results, total, offset, show_admin=(scope == 'a')),
+        reply_markup=keyboards.search_pagination_keyboard(scope, offset, total, SEARCH_PAGE_SIZE)
+    )
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-поиск камер по коду или словам из индекса в памяти"""
+    user_id = update.effective_user.id
+    query = update.inline_query.query.strip()
+    if not query:
+        await update.inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=False)
+        return
+    
+    # Отказ касается только этого пользователя — Telegram не должен кэшировать его для всех
+    if (not check_rate_limit(user_id) or database.is_banned(user_id)
+            or not await is_subscribed_cached(user_id, context)):
+        await update.inline_query.answer([], cache_time=0, is_personal=True)
+        return
+    
+    camera = camera_index.get(query.upper())
+    cameras = [camera] if camera else camera_index.search(query, limit=INLINE_RESULTS_LIMIT * 2)
+    
+    results = []
+    for camera in cameras:
+        # Отдаём только камеры, уже загруженные в Telegram
+        if not camera['file_id']:
+            continue
+        formatted_caption = utils.format_caption(camera['caption'], camera['custom_name'])
+        results.append(InlineQueryResultCachedPhoto(
+            id=camera['code'],
+            photo_file_id=camera['file_id'],
+            title=camera['custom_name'] or camera['code'],
+            description=camera['category'],
+            caption=f"📸 Камера: {camera['code']}\n\n{formatted_caption}",
+            parse_mode='HTML'
+        ))
+        if len(results) >= INLINE_RESULTS_LIMIT:
+            break
+    
+    # Общий кэш Telegram отдал бы эти результаты и забаненным, не спрашивая бота
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
 async def admin_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -399,22 +752,42 @@ async def upload_photo_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     if update.message.text == "🔙 Назад":
         return await back_to_admin_menu_from_upload(update, context)
     
-    photo = await update.message.photo[-1].get_file()
-    category = context.user_data['category']
-    
-    category_dir = f"cameras/{category}"
-    os.makedirs(category_dir, exist_ok=True)
+    photo_size = update.message.photo[-1]
+    try:
+        async with ingest.slot(sessions[update.effective_chat.id], photo_size.file_size):
+            photo = await photo_size.get_file()
+            ingest.check_download(photo)
+            
+            # Повторная загрузка той же картинки не создаёт второй файл
+            await files.run('discard', storage.abandon, context.user_data.pop('blob', None))
+            blob, phash = await storage.ingest_image(await storage.store_telegram_file(photo, 'jpg'))
+    except ingest.IngestRejected as e:
+        await update.message.reply_text(str(e))
+        return UPLOAD_PHOTO
+    context.user_data['blob'] = blob
+    context.user_data['image_path'] = blob.path
+    context.user_data['file_id'] = update.message.photo[-1].file_id
     
-    file_id = utils.safe_filename(update.message.photo[-1].file_id)
-    filename = f"{category_dir}/{file_id}.jpg"
+    # Похожий скриншот уже мог быть загружен — предупреждаем, но не запрещаем
+    context.user_data['phash'] = phash
+    similar = dedup.find(phash)
+    if similar:
+        await send_duplicate_warning(update, similar)
     
-    await photo.download_to_drive(filename)
-    context.user_data['image_path'] = filename
     await update.message.reply_text(
         "✏️ Введите подпись для скриншота:",
         reply_markup=ReplyKeyboardMarkup([["🔙 Назад"]], resize_keyboard=True))
     return UPLOAD_CAPTION
 
+async def send_duplicate_warning(update: Update, similar):
+    text = "⚠️ Похоже на уже загруженные камеры: " + ", ".join(similar[:10])
+    camera = database.get_camera(similar[0])
+    thumb = await files.run('exists', storage.thumbnail_for, camera[0]) if camera else None
+    if thumb:
+        await update.message.reply_photo(photo=await files.read_bytes(thumb), caption=text)
+    else:
+        await update.message.reply_text(text)
+
 async def upload_caption(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     # Проверка ограничения скорости
@@ -450,7 +823,12 @@ async def upload_custom_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     image_path = context.user_data['image_path']
     category = context.user_data['category']
     
-    code = database.add_camera(username, category, image_path, caption, custom_name)
+    blob = context.user_data.pop('blob', None)
+    code = database.add_camera(username, category, image_path, caption, custom_name,
+                               file_id=context.user_data.get('file_id'),
+                               blob_sha256=blob.sha256 if blob else None)
+    await files.run('release', storage.release, blob)
+    database.set_camera_phashes([(code, context.user_data.pop('phash', None))])
     is_master = database.is_master_admin(username)
     
     response = f"✅ Скриншот загружен!\n🔢 Код для доступа: {code}\n📂 Категория: {category}"
@@ -462,6 +840,292 @@ async def upload_custom_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
         reply_markup=keyboards.admin_menu(is_master))
     return ADMIN_MENU
 
+# ====== МАССОВАЯ ЗАГРУЗКА АЛЬБОМАМИ ======
+
+async def bulk_upload_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return ADMIN_MENU
+    
+    await update.message.reply_text(
+        "📂 Выберите категорию для массовой загрузки:",
+        reply_markup=keyboards.category_keyboard())
+    return BULK_CATEGORY
+
+async def bulk_upload_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return BULK_CATEGORY
+    
+    text = update.message.text
+    if text not in database.get_all_categories():
+        await update.message.reply_text("❌ Выберите категорию из списка.")
+        return BULK_CATEGORY
+    
+    context.user_data['bulk_category'] = text
+    await update.message.reply_text(
+        "✏️ Введите общую подпись для камер.\n"
+        "{n} в подписи заменится на порядковый номер фото.",
+        reply_markup=keyboards.back_only_keyboard())
+    return BULK_CAPTION
+
+async def bulk_upload_caption(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return BULK_CAPTION
+    
+    context.user_data['bulk_caption'] = update.message.text
+    context.user_data['bulk_counter'] = 0
+    await update.message.reply_text(
+        "📤 Отправляйте альбомы до 10 скриншотов. Коды придут одним сообщением на альбом.\n"
+        "Когда закончите, нажмите «✅ Готово».",
+        reply_markup=keyboards.bulk_upload_keyboard())
+    return BULK_PHOTOS
+
+async def bulk_upload_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Собирает фото альбома по media_group_id и откладывает сохранение до прихода всех фото"""
+    message = update.message
+    key = (message.chat_id, message.media_group_id or f"single_{message.message_id}")
+    
+    album = album_buffers.get(key)
+    if album is None:
+        # Лимит считаем один раз на альбом, а не на каждое фото
+        if not check_rate_limit(update.effective_user.id):
+            await message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+            return BULK_PHOTOS
+        album = album_buffers[key] = {
+            'photos': [],
+            'task': None,
+            'username': sessions[message.chat_id],
+            'user_id': update.effective_user.id,
+            'category': context.user_data['bulk_category'],
+            'caption': context.user_data['bulk_caption'],
+        }
+    
+    album['photos'].append((message.message_id, message.photo[-1]))
+    if album['task']:
+        album['task'].cancel()
+    album['task'] = context.application.create_task(flush_album(context, key))
+    return BULK_PHOTOS
+
+def duplicate_codes(phashes):
+    """Для каждого хэша — коды уже загруженных похожих камер"""
+    return [dedup.find(phash) for phash in phashes]
+
+async def flush_album(context: ContextTypes.DEFAULT_TYPE, key):
+    await asyncio.sleep(ALBUM_COLLECT_DELAY)
+    album = album_buffers.pop(key, None)
+    if not album:
+        return
+    chat_id = key[0]
+    category = album['category']
+    user_data = context.application.user_data[album['user_id']]
+    
+    blobs = []
+    try:
+        photos = sorted(album['photos'], key=lambda item: item[0])
+        # Лимит Bot API — на каждое фото, а свободное место — под весь альбом
+        for _, photo_size in photos:
+            ingest.check_size(photo_size.file_size)
+        # Альбом занимает одно место в очереди загрузок
+        async with ingest.slot(album['username'], space=sum(size.file_size or 0 for _, size in photos)):
+            for message_id, photo_size in photos:
+                photo = await photo_size.get_file()
+                ingest.check_download(photo)
+                blobs.append(await storage.store_telegram_file(photo, 'jpg'))
+            
+            # Фото альбома перекодируются параллельно в пуле процессов; при
+            # ошибке ingest_images сам отпускает и исходные, и готовые блобы
+            stored, blobs = blobs, []
+            ingested = await storage.ingest_images(stored)
+        blobs = [blob for blob, phash in ingested]
+        phashes = [phash for blob, phash in ingested]
+        
+        rows = []
+        for (message_id, photo_size), blob in zip(photos, blobs):
+            # Номер фото сквозной для всей сессии загрузки
+            user_data['bulk_counter'] = user_data.get('bulk_counter', 0) + 1
+            caption = album['caption'].replace('{n}', str(user_data['bulk_counter']))
+            rows.append((category, blob.path, caption, None, photo_size.file_id, blob.sha256))
+        
+        duplicates = duplicate_codes(phashes)
+        codes = database.add_cameras_bulk(album['username'], rows)
+        await files.run('release', storage.release_many, blobs)
+        blobs = []
+        database.set_camera_phashes(zip(codes, phashes))
+    except ingest.IngestRejected as e:
+        await context.bot.send_message(chat_id=chat_id, text=str(e))
+        return
+    except Exception as e:
+        logger.error(f"Ошибка массовой загрузки: {e}", exc_info=True)
+        await context.bot.send_message(chat_id=chat_id, text="❌ Не удалось сохранить альбом. Попробуйте ещё раз.")
+        return
+    finally:
+        # Уже скачанные фото без записей в базе (отказ или ошибка на полпути) отпускаем
+        for blob in blobs:
+            await files.run('discard', storage.abandon, blob)
+    
+    lines = []
+    for code, row, similar in zip(codes, rows, duplicates):
+        line = f"🔑 {code} — {row[2]}"
+        if similar:
+            line += f" ⚠️ похоже на {', '.join(similar[:3])}"
+        lines.append(line)
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"✅ Загружено камер: {len(codes)}\n📂 Категория: {category}\n\n" + "\n".join(lines)
+    )
+
+# ====== ИМПОРТ КАМЕР ИЗ ZIP ======
+
+async def zip_import_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return ADMIN_MENU
+    
+    await update.message.reply_text(
+        "📂 Выберите категорию по умолчанию (для файлов без категории в манифесте):",
+        reply_markup=keyboards.category_keyboard())
+    return ZIP_CATEGORY
+
+async def zip_import_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return ZIP_CATEGORY
+    
+    text = update.message.text
+    if text not in database.get_all_categories():
+        await update.message.reply_text("❌ Выберите категорию из списка.")
+        return ZIP_CATEGORY
+    
+    context.user_data['zip_category'] = text
+    await update.message.reply_text(
+        "🗜 Отправьте ZIP-архив со скриншотами документом.\n"
+        "Необязательный manifest.csv или manifest.json: filename, category, caption, custom_name.",
+        reply_markup=keyboards.back_only_keyboard())
+    return ZIP_FILE
+
+async def zip_import_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return ZIP_FILE
+    
+    document = update.message.document
+    if not document or not (document.file_name or '').lower().endswith('.zip'):
+        await update.message.reply_text("❌ Пожалуйста, отправьте ZIP-архив как документ.")
+        return ZIP_FILE
+    try:
+        ingest.check_size(document.file_size)
+    except ingest.IngestRejected as e:
+        await update.message.reply_text(str(e))
+        return ZIP_FILE
+    
+    status = await update.message.reply_text("⏳ Архив получен, начинаю импорт...")
+    context.application.create_task(run_zip_import(
+        context,
+        status,
+        document,
+        sessions[update.effective_chat.id],
+        context.user_data.pop('zip_category')
+    ))
+    return await back_to_admin_menu(update, context)
+
+async def run_zip_import(context: ContextTypes.DEFAULT_TYPE, status, document, username, default_category):
+    """Фоновый импорт: записи читаются из архива по одной, строки вставляются одной транзакцией"""
+    archive_path = None
+    blobs = []
+    try:
+        async with ingest.slot(username, document.file_size):
+            file = await document.get_file()
+            ingest.check_download(file)
+            # Локальный сервер Bot API уже сохранил архив — читаем его на месте
+            source_path = storage.local_file_path(file)
+            if not source_path:
+                # Не больше 20 МБ (check_download): качаем в память, на диск пишет пул
+                archive_path = source_path = await files.temp_path('.zip')
+                await files.write_bytes(archive_path, await file.download_as_bytearray())
+            
+            zf = await files.run('zip_open', importer.open_archive, source_path)
+            with zf:
+                manifest = await files.run('zip_read', importer.read_manifest, zf)
+                entries = await files.run('zip_read', importer.list_images, zf)
+                # Распакованные файлы займут не больше суммы размеров записей
+                await ingest.ensure_free_space(sum(info.file_size for info in entries))
+                categories = set(database.get_all_categories())
+                
+                names = []
+                fields = []
+                skipped = 0
+                last_report = time.monotonic()
+                for number, info in enumerate(entries, 1):
+                    category, caption, custom_name = importer.camera_fields(info, manifest, default_category, categories)
+                    blob = await files.run('zip_extract', importer.extract_image, zf, info)
+                    if blob:
+                        blobs.append(blob)
+                        fields.append((category, caption, custom_name))
+                        names.append(info.filename)
+                    else:
+                        skipped += 1
+                    
+                    if time.monotonic() - last_report > IMPORT_PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        await status.edit_text(f"⏳ Импорт: обработано {number} из {len(entries)}, пропущено {skipped}")
+            
+            await status.edit_text(f"⏳ Обработка изображений: {len(blobs)}")
+            # При ошибке ingest_images сам отпускает и исходные, и готовые блобы
+            stored, blobs = blobs, []
+            ingested = await storage.ingest_images(stored)
+        blobs = [blob for blob, phash in ingested]
+        phashes = [phash for blob, phash in ingested]
+        rows = [
+            (category, blob.path, caption, custom_name, None, blob.sha256)
+            for (category, caption, custom_name), blob in zip(fields, blobs)
+        ]
+        duplicates = duplicate_codes(phashes)
+        codes = database.add_cameras_bulk(username, rows)
+        await files.run('release', storage.release_many, blobs)
+        blobs = []
+        database.set_camera_phashes(zip(codes, phashes))
+        
+        text = f"✅ Импорт завершён!\n📥 Добавлено камер: {len(codes)}\n⏭️ Пропущено файлов: {skipped}"
+        flagged = sum(1 for similar in duplicates if similar)
+        if flagged:
+            text += f"\n⚠️ Похожи на уже загруженные: {flagged}"
+        await status.edit_text(text)
+        if codes:
+            report = "filename,code,similar_to\n" + "".join(
+                f"{name},{code},{' '.join(similar)}\n"
+                for name, code, similar in zip(names, codes, duplicates)
+            )
+            await context.bot.send_document(
+                chat_id=status.chat_id,
+                document=report.encode('utf-8'),
+                filename="import_codes.csv",
+                caption="🔑 Коды импортированных камер"
+            )
+    except (importer.ArchiveError, ingest.IngestRejected) as e:
+        await status.edit_text(f"❌ Импорт прерван: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка импорта архива: {e}", exc_info=True)
+        await status.edit_text("❌ Импорт не удался, ни одна камера не добавлена.")
+    finally:
+        # Файлы без записей в базе (ошибка до вставки) удаляем
+        for blob in blobs:
+            await files.run('discard', storage.abandon, blob)
+        await files.remove(archive_path)
+
 async def change_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     # Проверка ограничения скорости
@@ -482,11 +1146,7 @@ async def new_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_password = update.message.text
     username = sessions[update.effective_chat.id]
     
-    conn = sqlite3.connect('camera_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('UPDATE admins SET password = ? WHERE username = ?', (new_password, username))
-    conn.commit()
-    conn.close()
+    database.set_admin_password(username, new_password)
     
     is_master = database.is_master_admin(username)
     await update.message.reply_text(
@@ -612,13 +1272,16 @@ async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ADMIN_MANAGEMENT
     
     master_admins = config.MASTER_ADMINS
+    totals = database.get_admin_totals()
     admins_list = []
     for admin in admins:
         username, display_name = admin
+        cameras_count, packs_count = totals.get(username, (0, 0))
+        counts = f"📸 {cameras_count}, 📦 {packs_count}"
         if username in master_admins:
-            admins_list.append(f"👑 {display_name} (@{username}) - главный")
+            admins_list.append(f"👑 {display_name} (@{username}) - главный, {counts}")
         else:
-            admins_list.append(f"👤 {display_name} (@{username})")
+            admins_list.append(f"👤 {display_name} (@{username}) - {counts}")
     
     message = "👥 Список администраторов:\n\n" + "\n".join(admins_list)
     await update.message.reply_text(message)
@@ -832,6 +1495,7 @@ async def camera_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats_text = "📊 Статистика по категориям:\n\n"
     for category, count in stats:
         stats_text += f"📂 {category}: {count} камер\n"
+    stats_text += f"\n📸 Всего: {sum(count for category, count in stats)} камер"
     
     await update.message.reply_text(stats_text)
     return CAMERA_CODES_MENU
@@ -843,26 +1507,10 @@ async def all_codes_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
         return CAMERA_CODES_MENU
     
-    cameras = database.get_cameras_with_admin()
-    if not cameras:
+    if not await send_first_page(update, context, 'cams'):
         await update.message.reply_text("📭 Пока нет ни одной камеры.")
         return await camera_codes(update, context)
     
-    message = "📝 Список всех камер:\n\n"
-    for code, category, custom_name, admin in cameras:
-        cam_info = f"🔑 {code}\n📂 Категория: {category}\n👤 Админ: {admin}\n"
-        if custom_name:
-            cam_info += f"🏷️ Название: {custom_name}\n"
-        cam_info += "\n"
-        
-        if len(message) + len(cam_info) > 4000:
-            await update.message.reply_text(message)
-            message = ""
-        message += cam_info
-    
-    if message:
-        await update.message.reply_text(message)
-    
     return CAMERA_CODES_MENU
 
 async def my_codes(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -873,28 +1521,170 @@ async def my_codes(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ADMIN_MENU
     
     username = sessions[update.effective_chat.id]
-    cameras = database.get_cameras_by_admin(username)
-    
-    if not cameras:
+    if not await send_first_page(update, context, 'my', owner=username):
         await update.message.reply_text("📭 У вас пока нет ни одной камеры.")
         return await back_to_admin_menu(update, context)
     
-    message = "📝 Ваши камеры:\n\n"
-    for code, category, custom_name in cameras:
-        cam_info = f"🔑 {code}\n📂 Категория: {category}\n"
-        if custom_name:
-            cam_info += f"🏷️ Название: {custom_name}\n"
-        cam_info += "\n"
-        
-        if len(message) + len(cam_info) > 4000:
-            await update.message.reply_text(message)
-            message = ""
-        message += cam_info
+    return ADMIN_MENU
+
+async def admin_search_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return CAMERA_CODES_MENU
     
-    if message:
-        await update.message.reply_text(message)
+    await update.message.reply_text(
+        "🔎 Введите запрос (подпись, название или категория):",
+        reply_markup=keyboards.back_only_keyboard())
+    return SEARCH_CAMERAS
+
+async def admin_search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return SEARCH_CAMERAS
     
-    return ADMIN_MENU
+    await send_search_results(update, context, 'a', update.message.text.strip())
+    return SEARCH_CAMERAS
+
+def is_master_session(update: Update):
+    username = sessions.get(update.effective_chat.id)
+    return bool(username) and database.is_master_admin(username)
+
+async def db_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/dbstats: самые затратные запросы и последние медленные с планами (только главный админ)"""
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return None
+    
+    # Состояние диалога не меняется: команда доступна из любого меню
+    if not is_master_session(update):
+        await update.message.reply_text("🔐 Команда доступна только главному админу.")
+        return None
+    
+    stats = database.get_query_stats()
+    if not stats:
+        await update.message.reply_text("📭 Запросов к базе ещё не было.")
+        return None
+    
+    text = f"🗄 Запросы по суммарному времени (порог медленных: {config.SLOW_QUERY_MS} мс):\n\n"
+    for statement, caller, count, total, peak in stats:
+        text += (
+            f"• {caller}: {count} раз, всего {total * 1000:.0f} мс, "
+            f"среднее {total / count * 1000:.1f} мс, макс {peak * 1000:.1f} мс\n"
+            f"  {statement[:120]}\n"
+        )
+    
+    slow = database.get_slow_queries()
+    if slow:
+        text += "\n🐢 Последние медленные запросы:\n"
+        for moment, caller, elapsed, statement, plan in slow[:5]:
+            text += f"\n{moment:%H:%M:%S} {caller} — {elapsed * 1000:.0f} мс\n{statement[:200]}\n"
+            if plan:
+                text += f"{plan[:300]}\n"
+    
+    if len(text) > REPORT_TEXT_LIMIT:
+        # Длинный отчёт отправляем файлом, чтобы не упереться в лимит сообщения
+        await update.message.reply_document(document=text.encode('utf-8'), filename="db_stats.txt")
+    else:
+        await update.message.reply_text(text)
+    return None
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [секунды] [cpu|mem]: профиль работающего бота (только главный админ)"""
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return None
+    
+    if not is_master_session(update):
+        await update.message.reply_text("🔐 Команда доступна только главному админу.")
+        return None
+    
+    seconds, mode = 10, 'cpu'
+    for arg in context.args or []:
+        if arg.isdigit():
+            seconds = max(1, min(int(arg), profiler.MAX_SECONDS))
+        elif arg.lower() in ('cpu', 'mem'):
+            mode = arg.lower()
+        else:
+            await update.message.reply_text(
+                f"Использование: /profile [секунды, до {profiler.MAX_SECONDS}] [cpu|mem]")
+            return None
+    
+    if profiling_lock.locked():
+        await update.message.reply_text("⏳ Профилирование уже идёт, дождитесь отчёта.")
+        return None
+    
+    await update.message.reply_text(f"⏱ Профилирую {seconds} с ({mode}), отчёт придёт файлом.")
+    context.application.create_task(send_profile(context, update.effective_chat.id, mode, seconds))
+    return None
+
+async def send_profile(context: ContextTypes.DEFAULT_TYPE, chat_id, mode, seconds):
+    async with profiling_lock:
+        try:
+            # Профилировщик работает в своём потоке и не держит цикл событий
+            if mode == 'mem':
+                statistics = await asyncio.to_thread(profiler.trace_memory, seconds)
+                # Словари меняются обработчиками — в поток отдаём их копии
+                objects = {
+                    'context.user_data (все пользователи)': profiler.snapshot(context.application.user_data),
+                    'context.chat_data (все чаты)': profiler.snapshot(context.application.chat_data),
+                    'message_counters': profiler.snapshot(message_counters),
+                    'sessions': dict(sessions),
+                    'album_buffers': profiler.snapshot(album_buffers),
+                }
+                report = await asyncio.to_thread(profiler.format_memory_report, statistics, seconds, objects)
+                await context.bot.send_document(
+                    chat_id=chat_id, document=report.encode('utf-8'), filename="profile_memory.txt")
+                return
+            
+            stacks, samples = await asyncio.to_thread(profiler.sample_stacks, seconds)
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=profiler.format_cpu_report(stacks, samples, seconds).encode('utf-8'),
+                filename="profile_top.txt")
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=profiler.collapsed(stacks).encode('utf-8'),
+                filename="profile.collapsed",
+                caption="Свёрнутые стеки для flamegraph.pl или speedscope.app")
+        except Exception as e:
+            logger.error(f"Ошибка профилирования: {e}", exc_info=True)
+            await context.bot.send_message(chat_id=chat_id, text="❌ Не удалось снять профиль.")
+
+async def duplicates_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return CAMERA_CODES_MENU
+    
+    if not imaging.available():
+        await update.message.reply_text("❌ Поиск дубликатов недоступен: не установлен Pillow.")
+        return CAMERA_CODES_MENU
+    
+    # Обход всего индекса долгий — выполняем вне цикла событий
+    groups = await asyncio.to_thread(dedup.clusters)
+    if not groups:
+        await update.message.reply_text("✅ Похожих камер не найдено.")
+        return CAMERA_CODES_MENU
+    
+    text = f"🧬 Группы похожих камер: {len(groups)}\n\n"
+    for number, codes in enumerate(groups, 1):
+        line = f"{number}. {', '.join(codes)}\n"
+        if len(text) + len(line) > REPORT_TEXT_LIMIT:
+            text += "…"
+            break
+        text += line
+    
+    await update.message.reply_text(text)
+    return CAMERA_CODES_MENU
 
 async def delete_camera_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -919,12 +1709,13 @@ async def delete_camera_handler(update: Update, context: ContextTypes.DEFAULT_TY
         return await back_to_admin_menu(update, context)
     
     code = update.message.text.strip().upper()
-    image_path = database.delete_camera(code)
+    image_path, unreferenced = database.delete_camera(code)
     
     if image_path:
         try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
+            # Файл удаляется, только если на него не ссылаются другие камеры
+            if unreferenced:
+                await files.run('discard', storage.discard, image_path)
         except Exception as e:
             logger.error(f"Ошибка при удалении файла: {e}")
         
@@ -941,33 +1732,114 @@ async def user_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
         return ADMIN_MENU
     
-    users = database.get_all_users()
-    
-    if not users:
+    if not await send_first_page(update, context, 'users'):
         await update.message.reply_text("📭 Нет зарегистрированных пользователей.")
         return await back_to_admin_menu(update, context)
     
-    message = "👥 Список пользователей:\n\n"
-    for user_id, username, first_name, last_name, is_banned in users:
-        user_info = (
-            f"🆔 ID: {user_id}\n"
-            f"👤 Имя: {first_name or ''} {last_name or ''}\n"
-            f"📛 Username: @{username or 'нет'}\n"
-            f"🚫 Статус: {'Забанен' if is_banned else 'Активен'}\n"
-            "────────────────────\n"
+    return ADMIN_MENU
+
+async def send_first_page(update: Update, context: ContextTypes.DEFAULT_TYPE, view, owner=None):
+    """Отправляет первую страницу списка; дальше сообщение листается кнопками"""
+    page = paginator.render_page(view, owner=owner, bot_username=context.bot.username)
+    if not page:
+        return False
+    text, markup = page
+    await update.message.reply_text(text, reply_markup=markup, parse_mode='HTML', disable_web_page_preview=True)
+    return True
+
+async def page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листает страницу списка, редактируя то же сообщение"""
+    query = update.callback_query
+    _, view, direction, cursor = query.data.split(':')
+    
+    if not check_rate_limit(update.effective_user.id):
+        await query.answer("⏳ Слишком часто. Подождите 10 секунд.")
+        return
+    
+    username = sessions.get(update.effective_chat.id)
+    if not username or (view != 'my' and not database.is_master_admin(username)):
+        await query.answer("🔐 Требуется вход главного админа.")
+        return
+    
+    page = paginator.render_page(
+        view,
+        owner=username if view == 'my' else None,
+        direction=direction,
+        cursor=int(cursor),
+        bot_username=context.bot.username
+    )
+    await query.answer()
+    if page:
+        text, markup = page
+        await query.edit_message_text(text, reply_markup=markup, parse_mode='HTML', disable_web_page_preview=True)
+
+async def export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запускает выгрузку в фоне, чтобы диалог админа не блокировался"""
+    query = update.callback_query
+    _, kind, fmt = query.data.split(':')
+    
+    username = sessions.get(update.effective_chat.id)
+    if not username or not database.is_master_admin(username):
+        await query.answer("🔐 Требуется вход главного админа.")
+        return
+    
+    await query.answer("⏳ Готовлю файл, он придёт отдельным сообщением.")
+    context.application.create_task(send_export(context, update.effective_chat.id, kind, fmt))
+
+async def send_export(context: ContextTypes.DEFAULT_TYPE, chat_id, kind, fmt):
+    path = None
+    try:
+        path, count = await files.run('export', exports.write_export, kind, fmt)
+        filename = f"{kind}_{datetime.datetime.now():%Y%m%d_%H%M}.{fmt}.gz"
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=await files.read_bytes(path),
+            filename=filename,
+            caption=f"📄 Выгрузка: {count} записей"
         )
-        
-        if len(message) + len(user_info) > 4000:
-            await update.message.reply_text(message)
-            message = ""
-        message += user_info
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки {kind}: {e}", exc_info=True)
+        await context.bot.send_message(chat_id=chat_id, text="❌ Не удалось подготовить выгрузку.")
+    finally:
+        await files.remove(path)
+
+async def storage_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return CAMERA_CODES_MENU
     
-    if message:
-        await update.message.reply_text(
-            message,
-            reply_markup=keyboards.admin_menu(True))
+    await update.message.reply_text("⏳ Проверяю хранилище, отчёт придёт отдельным сообщением.")
+    context.application.create_task(send_storage_report(context, update.effective_chat.id))
+    return CAMERA_CODES_MENU
+
+async def send_storage_report(context: ContextTypes.DEFAULT_TYPE, chat_id):
+    try:
+        report = await collect_storage_garbage()
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=janitor.format_report(report) + "\n\n" + files.format_stats()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка сборки мусора: {e}", exc_info=True)
+        await context.bot.send_message(chat_id=chat_id, text="❌ Не удалось проверить хранилище.")
+
+async def usage_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    # Проверка ограничения скорости
+    if not check_rate_limit(user_id):
+        await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
+        return CAMERA_CODES_MENU
     
-    return ADMIN_MENU
+    # Сначала дописываем накопленное, чтобы отчёт включал последние выдачи
+    await asyncio.to_thread(asset_stats.flush)
+    text = await asyncio.to_thread(asset_stats.report)
+    if len(text) > REPORT_TEXT_LIMIT:
+        await update.message.reply_document(document=text.encode('utf-8'), filename="usage_report.txt")
+    else:
+        await update.message.reply_text(text)
+    return CAMERA_CODES_MENU
 
 async def back_to_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = sessions[update.effective_chat.id]
@@ -979,7 +1851,9 @@ async def back_to_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def back_to_admin_menu_from_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Очищаем временные данные загрузки
-    keys_to_remove = ['category', 'image_path', 'caption']
+    await files.run('discard', storage.abandon, context.user_data.pop('blob', None))
+    keys_to_remove = ['category', 'image_path', 'caption', 'file_id', 'phash',
+                      'bulk_category', 'bulk_caption', 'bulk_counter', 'zip_category']
     for key in keys_to_remove:
         if key in context.user_data:
             del context.user_data[key]
@@ -1001,11 +1875,17 @@ async def logout(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if update.effective_chat.id in sessions:
         del sessions[update.effective_chat.id]
+    await abandon_pending_uploads(context)
     await update.message.reply_text(
         "👋 Вы вышли из системы админа.",
         reply_markup=keyboards.main_menu())
     return PARTICIPANT_CODE
 
+async def abandon_pending_uploads(context: ContextTypes.DEFAULT_TYPE):
+    """Отпускает файлы незавершённых загрузок, иначе их не соберёт сборщик мусора"""
+    for key in ('blob', 'project_blob', 'pack_blob'):
+        await files.run('discard', storage.abandon, context.user_data.pop(key, None))
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     # Проверка ограничения скорости
@@ -1013,6 +1893,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("⏳ Вы превысили лимит сообщений в секунду. Пожалуйста, подождите 10 секунд.")
         return PARTICIPANT_CODE
     
+    await abandon_pending_uploads(context)
     await update.message.reply_text(
         "Действие отменено.",
         reply_markup=keyboards.main_menu())
@@ -1073,24 +1954,9 @@ async def send_project(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Получаем проект по отформатированному имени
     if text in projects:
         project_id, display_name, caption, file_path = projects[text]
-        try:
-            # Убедимся, что файл существует
-            if not os.path.exists(file_path):
-                logger.error(f"Файл проекта не найден: {file_path}")
-                await update.message.reply_text("❌ Файл проекта не найден. Обратитесь к администратору.")
-                return PROJECTS_MENU
-            
-            # Отправляем файл (ИСПРАВЛЕННЫЙ КОД)
-            with open(file_path, 'rb') as file:
-                await update.message.reply_document(
-                    document=file,
-                    caption=caption,
-                    filename=os.path.basename(file_path)
-                )
+        if await send_file_document(update, file_path, caption, "проекта", display_name):
+            asset_stats.record('project', project_id)
             logger.info(f"Проект '{display_name}' отправлен пользователю {user_id}")
-        except Exception as e:
-            logger.error(f"Ошибка отправки проекта: {e}", exc_info=True)
-            await update.message.reply_text("❌ Не удалось отправить проект. Обратитесь к администратору.")
     else:
         logger.warning(f"Проект не найден: '{text}'")
         await update.message.reply_text("❌ Проект не найден. Пожалуйста, выберите проект из списка.")
@@ -1136,22 +2002,24 @@ async def upload_project_file(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("❌ Пожалуйста, отправьте файл как документ.")
         return UPLOAD_PROJECT_FILE
     
-    # Получаем файл
-    file = await update.message.document.get_file()
-    
-    # Создаем папку для проектов
-    os.makedirs("projects", exist_ok=True)
-    
-    # Генерируем безопасное имя файла
-    original_name = update.message.document.file_name
-    safe_name = utils.safe_project_filename(original_name)
-    file_path = f"projects/{safe_name}"
-    
-    # Скачиваем файл
-    await file.download_to_drive(file_path)
+    document = update.message.document
+    try:
+        async with ingest.slot(sessions[update.effective_chat.id], document.file_size):
+            # Получаем файл
+            file = await document.get_file()
+            ingest.check_download(file)
+            
+            # Файл хранится под хэшем содержимого, расширение берём из исходного имени
+            original_name = document.file_name or ''
+            await files.run('discard', storage.abandon, context.user_data.pop('project_blob', None))
+            blob = await storage.store_telegram_file(file, os.path.splitext(original_name)[1])
+    except ingest.IngestRejected as e:
+        await update.message.reply_text(str(e))
+        return UPLOAD_PROJECT_FILE
     
     # Сохраняем путь к файлу
-    context.user_data['project_file_path'] = file_path
+    context.user_data['project_blob'] = blob
+    context.user_data['project_file_path'] = blob.path
     await update.message.reply_text("✏️ Введите подпись для проекта:")
     return UPLOAD_PROJECT_CAPTION
 
@@ -1178,7 +2046,9 @@ async def upload_project_name(update: Update, context: ContextTypes.DEFAULT_TYPE
     caption = context.user_data['project_caption']
     
     # Сохраняем проект в базу
-    database.add_project(file_path, caption, display_name)
+    blob = context.user_data.pop('project_blob', None)
+    database.add_project(file_path, caption, display_name, blob_sha256=blob.sha256 if blob else None)
+    await files.run('release', storage.release, blob)
     
     username = sessions[update.effective_chat.id]
     is_master = database.is_master_admin(username)
@@ -1206,9 +2076,10 @@ async def list_projects_admin(update: Update, context: ContextTypes.DEFAULT_TYPE
         message += f"📌 {display_name}\n"
         message += f"ℹ️ {caption}\n"
         message += f"📂 Файл: {os.path.basename(file_path)}\n"
+        message += f"🔗 {utils.deep_link(context.bot.username, utils.PROJECT_LINK_PREFIX + str(project_id))}\n"
         message += "────────────────────\n"
     
-    await update.message.reply_text(message)
+    await update.message.reply_text(message, disable_web_page_preview=True)
     return PROJECT_MANAGEMENT
 
 async def delete_project_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1235,15 +2106,12 @@ async def delete_project_handler(update: Update, context: ContextTypes.DEFAULT_T
     
     try:
         project_id = int(update.message.text)
-        project = database.get_project(project_id)
+        file_path, unreferenced = database.delete_project(project_id)
         
-        if project:
-            file_path = project[3]  # file_path находится на 4-й позиции
-            database.delete_project(project_id)
-            
+        if file_path:
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                if unreferenced:
+                    await files.run('discard', storage.discard, file_path)
             except Exception as e:
                 logger.error(f"Ошибка при удалении файла проекта: {e}")
             
@@ -1264,6 +2132,7 @@ async def back_to_projects_menu(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def back_to_project_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Возврат в меню управления проектами"""
+    await files.run('discard', storage.abandon, context.user_data.pop('project_blob', None))
     await update.message.reply_text(
         "🔙 Возвращаемся в управление проектами",
         reply_markup=keyboards.project_management_keyboard())
@@ -1320,21 +2189,8 @@ async def send_pack(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if text in packs:
         pack_id, display_name, caption, file_path, admin_username = packs[text]
-        try:
-            # Проверяем существование файла
-            if not os.path.exists(file_path):
-                await update.message.reply_text("❌ Файл пака не найден. Обратитесь к администратору.")
-                return PACKS_MENU
-            
-            # Отправляем файл пака
-            with open(file_path, 'rb') as file:
-                await update.message.reply_document(
-                    document=file,
-                    caption=caption,
-                    filename=os.path.basename(file_path))
-        except Exception as e:
-            logger.error(f"Ошибка отправки пака: {e}", exc_info=True)
-            await update.message.reply_text("❌ Не удалось отправить пак. Обратитесь к администратору.")
+        if await send_file_document(update, file_path, caption, "пака", display_name):
+            asset_stats.record('pack', pack_id)
     else:
         await update.message.reply_text("❌ Пак не найден. Пожалуйста, выберите пак из списка.")
     
@@ -1362,15 +2218,20 @@ async def upload_pack_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Пожалуйста, отправьте файл как документ.")
         return UPLOAD_PACK_FILE
     
-    file = await update.message.document.get_file()
-    os.makedirs("packs", exist_ok=True)
-    
-    original_name = update.message.document.file_name
-    safe_name = utils.safe_pack_filename(original_name)
-    file_path = f"packs/{safe_name}"
-    
-    await file.download_to_drive(file_path)
-    context.user_data['pack_file_path'] = file_path
+    document = update.message.document
+    try:
+        async with ingest.slot(sessions[update.effective_chat.id], document.file_size):
+            file = await document.get_file()
+            ingest.check_download(file)
+            
+            original_name = document.file_name or ''
+            await files.run('discard', storage.abandon, context.user_data.pop('pack_blob', None))
+            blob = await storage.store_telegram_file(file, os.path.splitext(original_name)[1])
+    except ingest.IngestRejected as e:
+        await update.message.reply_text(str(e))
+        return UPLOAD_PACK_FILE
+    context.user_data['pack_blob'] = blob
+    context.user_data['pack_file_path'] = blob.path
     await update.message.reply_text("✏️ Введите описание для пака:")
     return UPLOAD_PACK_CAPTION
 
@@ -1387,7 +2248,9 @@ async def upload_pack_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     caption = context.user_data['pack_caption']
     username = sessions[update.effective_chat.id]
     
-    database.add_pack(file_path, caption, display_name, username)
+    blob = context.user_data.pop('pack_blob', None)
+    database.add_pack(file_path, caption, display_name, username, blob_sha256=blob.sha256 if blob else None)
+    await files.run('release', storage.release, blob)
     
     is_master = database.is_master_admin(username)
     await update.message.reply_text(
@@ -1411,9 +2274,10 @@ async def list_my_packs(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message += f"📌 {display_name}\n"
         message += f"ℹ️ {caption}\n"
         message += f"📂 Файл: {os.path.basename(file_path)}\n"
+        message += f"🔗 {utils.deep_link(context.bot.username, utils.PACK_LINK_PREFIX + str(pack_id))}\n"
         message += "────────────────────\n"
     
-    await update.message.reply_text(message)
+    await update.message.reply_text(message, disable_web_page_preview=True)
     return PACK_MANAGEMENT
 
 async def list_all_packs_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1431,9 +2295,10 @@ async def list_all_packs_admin(update: Update, context: ContextTypes.DEFAULT_TYP
         message += f"👤 Автор: {admin_username}\n"
         message += f"ℹ️ {caption}\n"
         message += f"📂 Файл: {os.path.basename(file_path)}\n"
+        message += f"🔗 {utils.deep_link(context.bot.username, utils.PACK_LINK_PREFIX + str(pack_id))}\n"
         message += "────────────────────\n"
     
-    await update.message.reply_text(message)
+    await update.message.reply_text(message, disable_web_page_preview=True)
     return PACK_MANAGEMENT
 
 async def delete_pack_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1450,12 +2315,12 @@ async def delete_pack_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     try:
         pack_id = int(update.message.text)
-        file_path = database.delete_pack(pack_id)
+        file_path, unreferenced = database.delete_pack(pack_id)
         
         if file_path:
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                if unreferenced:
+                    await files.run('discard', storage.discard, file_path)
             except Exception as e:
                 logger.error(f"Ошибка при удалении файла пака: {e}")
             
@@ -1476,6 +2341,7 @@ async def back_to_packs_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def back_to_pack_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Возврат в меню управления паками"""
+    await files.run('discard', storage.abandon, context.user_data.pop('pack_blob', None))
     username = sessions[update.effective_chat.id]
     is_master = database.is_master_admin(username)
     await update.message.reply_text(
@@ -1499,10 +2365,10 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     message_text = update.message.text
     
+    await update.message.reply_text(
+        f"⏳ Начинаю рассылку для {database.count_active_users()} пользователей...")
     users = database.get_active_users()
     
-    await update.message.reply_text(f"⏳ Начинаю рассылку для {len(users)} пользователей...")
-    
     success = 0
     errors = 0
     for user_id in users:
@@ -1533,44 +2399,150 @@ async def broadcast_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not database.is_master_admin(username):
         return await back_to_admin_menu(update, context)
 
-    history = database.get_broadcast_history()
-    if not history:
+    if not await send_first_page(update, context, 'bc'):
         await update.message.reply_text("📭 История рассылок пуста.")
         return await back_to_admin_menu(update, context)
 
-    message = "📊 История рассылок:\n\n"
-    for record in history:
-        record_id, admin_username, message_text, timestamp = record
-        # Форматируем дату
-        formatted_time = timestamp.split('.')[0] if isinstance(timestamp, str) else timestamp
-        message += (
-            f"⏱️ <b>Время:</b> {formatted_time}\n"
-            f"👤 <b>Админ:</b> @{admin_username}\n"
-            f"✉️ <b>Сообщение:</b>\n{message_text}\n"
-            f"────────────────────\n"
-        )
+    return ADMIN_MENU
 
-    # Разбиваем сообщение, если слишком длинное
-    if len(message) > 4000:
-        for x in range(0, len(message), 4000):
-            await update.message.reply_text(message[x:x+4000], parse_mode='HTML')
-    else:
-        await update.message.reply_text(message, parse_mode='HTML')
+# ====== ОСНОВНАЯ ФУНКЦИЯ ======
 
-    return await back_to_admin_menu(update, context)
+async def backfill_phashes():
+    """Досчитывает хэши камер, загруженных до появления поиска дубликатов"""
+    after_id = 0
+    total = 0
+    while True:
+        rows = database.get_cameras_without_phash(after_id, PHASH_BACKFILL_BATCH)
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        phashes = await asyncio.gather(*(imaging.dhash(image_path) for _, _, image_path in rows))
+        pairs = [(code, phash) for (_, code, _), phash in zip(rows, phashes) if phash is not None]
+        database.set_camera_phashes(pairs)
+        total += len(pairs)
+    if total:
+        logger.info(f"Посчитаны хэши для {total} камер")
+
+async def migrate_storage():
+    """Фоновая миграция файлов в раскладку по подпапкам, пачками вне цикла событий"""
+    try:
+        while await asyncio.to_thread(storage.migrate_batch):
+            await asyncio.sleep(0)
+    except Exception as e:
+        logger.error(f"Ошибка миграции хранилища: {e}", exc_info=True)
 
-# ====== ОСНОВНАЯ ФУНКЦИЯ ======
+async def flush_asset_stats():
+    """Периодически записывает счётчики выдачи в базу"""
+    while True:
+        await asyncio.sleep(asset_stats.FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(asset_stats.flush)
+        except Exception as e:
+            logger.error(f"Ошибка записи статистики выдачи: {e}", exc_info=True)
 
-def main():
-    application = (
+async def collect_storage_garbage():
+    async with storage_maintenance_lock:
+        return await asyncio.to_thread(janitor.run)
+
+async def maintain_storage():
+    """Сначала миграция раскладки, затем периодическая сборка мусора"""
+    async with storage_maintenance_lock:
+        await migrate_storage()
+    while True:
+        try:
+            await collect_storage_garbage()
+        except Exception as e:
+            logger.error(f"Ошибка сборки мусора: {e}", exc_info=True)
+        await asyncio.sleep(STORAGE_GC_INTERVAL)
+
+def timed_handler(callback):
+    """Оборачивает обработчик замером времени и подсчётом исключений"""
+    name = callback.__name__
+    
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+    return wrapper
+
+def instrument_handlers(application):
+    """Подключает метрики ко всем зарегистрированным обработчикам, включая состояния диалога"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                inner = itertools.chain(
+                    handler.entry_points, handler.fallbacks, *handler.states.values())
+            else:
+                inner = [handler]
+            for item in inner:
+                loop_watchdog.register_handler(item.callback)
+                item.callback = timed_handler(item.callback)
+    
+    # Фоновые задачи тоже могут блокировать цикл — регистрируем их для сторожа
+    for task in (flush_album, run_zip_import, send_export, send_storage_report, backfill_phashes,
+                 flush_asset_stats):
+        loop_watchdog.register_handler(task)
+
+async def post_shutdown(application):
+    global metrics_server
+    if metrics_server:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+        metrics_server = None
+    # Счётчики, накопленные после последней записи, не должны пропасть
+    await asyncio.to_thread(asset_stats.flush)
+
+async def post_init(application):
+    global metrics_server
+    UPDATE_QUEUE_DEPTH.set_function(application.update_queue.qsize)
+    loop_watchdog.start(config.LOOP_STALL_THRESHOLD_MS / 1000)
+    if config.METRICS_PORT:
+        metrics_server = await metrics.serve(config.METRICS_HOST, config.METRICS_PORT)
+    
+    hashes_count = database.load_dedup_index()
+    logger.info(f"Индекс дубликатов загружен: {hashes_count}")
+    application.create_task(maintain_storage())
+    application.create_task(flush_asset_stats())
+    if imaging.available():
+        application.create_task(backfill_phashes())
+    else:
+        logger.warning("Pillow не установлен: поиск дубликатов отключён")
+
+def build_application(request=None, token=None):
+    """Собирает Application со всеми обработчиками.
+
+    request и token подменяются в бенчмарках (benchmarks/), по умолчанию —
+    настоящий Bot API с метриками и токен из config.
+    """
+    if request is None:
+        request = bot_api.InstrumentedRequest(
+            connection_pool_size=256,
+            read_timeout=30,
+            write_timeout=30,
+            connect_timeout=30,
+            pool_timeout=30
+        )
+    builder = (
         Application.builder()
-        .token(config.BOT_TOKEN)
-        .read_timeout(30)
-        .write_timeout(30)
-        .connect_timeout(30)
-        .pool_timeout(30)
-        .build()
+        .token(token or config.BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .request(request)
     )
+    # Локальный сервер Bot API снимает лимиты 20/50 МБ и отдаёт файлы прямо с диска
+    if config.BOT_API_BASE_URL:
+        builder = builder.base_url(config.BOT_API_BASE_URL)
+    if config.BOT_API_BASE_FILE_URL:
+        builder = builder.base_file_url(config.BOT_API_BASE_FILE_URL)
+    if config.BOT_API_LOCAL_MODE:
+        builder = builder.local_mode(True)
+    application = builder.build()
     
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
@@ -1584,12 +2556,15 @@ def main():
                 MessageHandler(filters.Regex(r'^📢 Наш канал$'), show_channel),
                 MessageHandler(filters.Regex(r'^📁 Проекты$'), projects_menu),
                 MessageHandler(filters.Regex(r'^📦 Паки камер$'), packs_menu),
+                CommandHandler('search', search_command),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, participant_code)
             ],
             LOGIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, login)],
             PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, password)],
             ADMIN_MENU: [
                 MessageHandler(filters.Regex(r'^📤 Загрузить скриншот$'), upload_photo),
+                MessageHandler(filters.Regex(r'^🗂 Массовая загрузка$'), bulk_upload_start),
+                MessageHandler(filters.Regex(r'^🗜 Импорт ZIP$'), zip_import_start),
                 MessageHandler(filters.Regex(r'^📷 Мои камеры$'), my_codes),  # Исправлено
                 MessageHandler(filters.Regex(r'^📦 Управление паками$'), pack_management),
                 MessageHandler(filters.Regex(r'^🔐 Сменить пароль$'), change_password),
@@ -1629,6 +2604,26 @@ def main():
                 MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu_from_upload),  # Добавлено
                 MessageHandler(filters.TEXT & ~filters.COMMAND, upload_custom_name)
             ],
+            BULK_CATEGORY: [
+                MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu_from_upload),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_upload_category)
+            ],
+            BULK_CAPTION: [
+                MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu_from_upload),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_upload_caption)
+            ],
+            BULK_PHOTOS: [
+                MessageHandler(filters.Regex(r'^(✅ Готово|🔙 Назад)$'), back_to_admin_menu_from_upload),
+                MessageHandler(filters.PHOTO, bulk_upload_photo)
+            ],
+            ZIP_CATEGORY: [
+                MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu_from_upload),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, zip_import_category)
+            ],
+            ZIP_FILE: [
+                MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu_from_upload),
+                MessageHandler(filters.Document.ALL, zip_import_file)
+            ],
             NEW_PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, new_password)],
             DEL_ADMIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, del_admin_handler)],
             ADD_CATEGORY: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_category_handler)],
@@ -1644,8 +2639,16 @@ def main():
             CAMERA_CODES_MENU: [
                 MessageHandler(filters.Regex(r'^📊 Статистика по категориям$'), camera_stats),
                 MessageHandler(filters.Regex(r'^📝 Список всех кодов$'), all_codes_list),
+                MessageHandler(filters.Regex(r'^🔎 Поиск камер$'), admin_search_start),
+                MessageHandler(filters.Regex(r'^🧬 Дубликаты$'), duplicates_report),
+                MessageHandler(filters.Regex(r'^🧹 Проверка хранилища$'), storage_check),
+                MessageHandler(filters.Regex(r'^📈 Популярность$'), usage_report),
                 MessageHandler(filters.Regex(r'^🔙 Назад$'), back_to_admin_menu),
             ],
+            SEARCH_CAMERAS: [
+                MessageHandler(filters.Regex(r'^🔙 Назад$'), camera_codes),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, admin_search_handler)
+            ],
             DELETE_CAMERA: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, delete_camera_handler)
             ],
@@ -1717,12 +2720,26 @@ def main():
         },
         fallbacks=[
             CommandHandler('start', start),  # Обработка в любом состоянии
-            CommandHandler('cancel', cancel)
+            CommandHandler('cancel', cancel),
+            CommandHandler('dbstats', db_stats),
+            CommandHandler('profile', profile_command)
         ]
     )
     
     application.add_handler(conv_handler)
+    application.add_handler(InlineQueryHandler(inline_query))
+    application.add_handler(CallbackQueryHandler(search_page, pattern=r'^search:[ua]:\d+$'))
+    application.add_handler(CallbackQueryHandler(page_callback, pattern=r'^page:(cams|my|users|bc):[np]:-?\d+$'))
+    application.add_handler(CallbackQueryHandler(export_callback, pattern=r'^export:(users|cameras|broadcasts):(csv|jsonl)$'))
     application.add_error_handler(error_handler)
+    instrument_handlers(application)
+    return application
+
+def main():
+    cameras_count = database.load_camera_index()
+    logger.info(f"Индекс камер загружен: {cameras_count}")
+    
+    application = build_application()
     application.run_polling()
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,36 @@
+import time
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+import metrics
+
+# Запросы к Bot API с замером задержки и подсчётом ошибок по методам
+
+API_SECONDS = metrics.Histogram(
+    'bot_api_request_seconds', 'Задержка запросов к Bot API по методам', ('method',))
+API_ERRORS = metrics.Counter(
+    'bot_api_errors_total', 'Ошибки запросов к Bot API по методам и типам', ('method', 'error'))
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который пишет метрики для каждого вызова метода Bot API"""
+
+    async def post(self, url, *args, **kwargs):
+        method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            return await super().post(url, *args, **kwargs)
+        except TelegramError as e:
+            API_ERRORS.inc(method, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, method)
+
+    async def retrieve(self, url, *args, **kwargs):
+        # Скачивание файлов: в URL токен и путь к файлу, поэтому метка общая
+        started = time.perf_counter()
+        try:
+            return await super().retrieve(url, *args, **kwargs)
+        except TelegramError as e:
+            API_ERRORS.inc('downloadFile', type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, 'downloadFile')
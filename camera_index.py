@@ -0,0 +1,100 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+# Индекс камер в памяти процесса: inline-запросы обслуживаются без обращения к диску
+_lock = threading.Lock()
+_cameras = {}
+_tokens = defaultdict(set)
+_sorted_tokens = []
+_dirty = False
+
+def _tokenize(*parts):
+    text = " ".join(part for part in parts if part)
+    return set(re.findall(r'\w+', text.lower()))
+
+def _add_locked(code, category, caption, custom_name, file_id):
+    global _dirty
+    _cameras[code] = {
+        'code': code,
+        'category': category,
+        'caption': caption,
+        'custom_name': custom_name,
+        'file_id': file_id,
+    }
+    for token in _tokenize(caption, custom_name, category):
+        _tokens[token].add(code)
+    _dirty = True
+
+def _remove_locked(code):
+    global _dirty
+    camera = _cameras.pop(code, None)
+    if not camera:
+        return
+    for token in _tokenize(camera['caption'], camera['custom_name'], camera['category']):
+        codes = _tokens.get(token)
+        if codes is not None:
+            codes.discard(code)
+            if not codes:
+                del _tokens[token]
+    _dirty = True
+
+def load(rows):
+    """Полностью перестраивает индекс из строк (code, category, caption, custom_name, file_id)"""
+    global _dirty
+    with _lock:
+        _cameras.clear()
+        _tokens.clear()
+        for row in rows:
+            _add_locked(*row)
+        _dirty = True
+
+def put(code, category, caption, custom_name=None, file_id=None):
+    with _lock:
+        _remove_locked(code)
+        _add_locked(code, category, caption, custom_name, file_id)
+
+def remove(code):
+    with _lock:
+        _remove_locked(code)
+
+def set_file_id(code, file_id):
+    with _lock:
+        camera = _cameras.get(code)
+        if camera:
+            camera['file_id'] = file_id
+
+def get(code):
+    return _cameras.get(code)
+
+def _prefix_matches(prefix):
+    global _sorted_tokens, _dirty
+    if _dirty:
+        _sorted_tokens = sorted(_tokens)
+        _dirty = False
+    codes = set()
+    start = bisect.bisect_left(_sorted_tokens, prefix)
+    for token in _sorted_tokens[start:]:
+        if not token.startswith(prefix):
+            break
+        codes |= _tokens[token]
+    return codes
+
+def search(query, limit=20):
+    """Ищет камеры, у которых каждое слово запроса совпадает с началом какого-либо слова"""
+    words = sorted(_tokenize(query), key=len, reverse=True)
+    if not words:
+        return []
+
+    with _lock:
+        matched = None
+        for word in words:
+            codes = _prefix_matches(word)
+            matched = codes if matched is None else matched & codes
+            if not matched:
+                return []
+        return [_cameras[code] for code in sorted(matched)[:limit]]
+
+def size():
+    return len(_cameras)
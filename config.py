@@ -5,3 +5,19 @@ PROJECT_EMOJIS = ["📦", "📁", "🗂️", "📎", "🧾", "📑", "📋", "
 PACK_EMOJIS = ["📦", "🎁", "🧳", "📤", "📥", "🗃️", "📦", "📬"]  # Новые эмодзи для паков
 CHANNEL_ID = "-1002677297204"
 CHANNEL_LINK = "https://t.me/+fXB6UB2LlBowNmNl"
+
+# Локальный сервер Bot API (telegram-bot-api --local). None — облачный api.telegram.org
+BOT_API_BASE_URL = None  # например "http://127.0.0.1:8081/bot"
+BOT_API_BASE_FILE_URL = None  # например "http://127.0.0.1:8081/file/bot"
+# True, если сервер запущен с --local и его каталог файлов доступен боту
+BOT_API_LOCAL_MODE = False
+
+# HTTP-эндпоинт /metrics для Prometheus. None — не запускать
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None  # например 9100
+
+# Запросы к базе дольше порога пишутся в лог вместе с планом выполнения
+SLOW_QUERY_MS = 100
+
+# Блокировка цикла событий дольше порога пишется в лог со стеком и считается в метриках
+LOOP_STALL_THRESHOLD_MS = 250
@@ -3,13 +3,196 @@ import os
 import config
 import random
 import string
+import re
 from datetime import datetime
 import logging
+import threading
+from collections import deque
+import sys
+import time
+import contextlib
+import camera_index
+import dedup
+import metrics
 
 logger = logging.getLogger(__name__)
 
+DB_PATH = 'camera_bot.db'
+
+QUERY_SECONDS = metrics.Histogram(
+    'bot_db_query_seconds', 'Время выполнения SQL-запросов по функциям database.py', ('query',))
+SLOW_QUERIES = metrics.Counter('bot_db_slow_queries_total', 'Медленные SQL-запросы по функциям', ('query',))
+
+SLOW_QUERY_SECONDS = config.SLOW_QUERY_MS / 1000
+SLOW_QUERY_HISTORY = 20
+
+# Статистика по запросам: нормализованный SQL -> [функция, количество, сумма, максимум]
+_query_stats = {}
+_normalized_sql = {}
+_query_plans = {}
+_slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+_stats_lock = threading.Lock()
+
+def _normalize_sql(sql):
+    # Запросы с разным числом плейсхолдеров (IN (...), многострочный VALUES) — один оператор
+    normalized = _normalized_sql.get(sql)
+    if normalized is None:
+        normalized = ' '.join(sql.split())
+        normalized = re.sub(r'(\(\?(?:, ?\?)*\))(?:, ?\(\?(?:, ?\?)*\))+', r'\1, …', normalized)
+        normalized = re.sub(r'\?(?:, ?\?)+', '?, …', normalized)
+        if len(_normalized_sql) > 1000:
+            _normalized_sql.clear()
+        _normalized_sql[sql] = normalized
+    return normalized
+
+def _explain(connection, sql, parameters):
+    # Обычный курсор, чтобы EXPLAIN не попадал в статистику
+    try:
+        rows = sqlite3.Cursor(connection).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return f"(план недоступен: {e})"
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append('  ' * (depth[node_id] - 1) + detail)
+    return '\n'.join(lines)
+
+def _record_query(connection, sql, parameters, elapsed, caller):
+    QUERY_SECONDS.observe(elapsed, caller)
+    statement = _normalize_sql(sql)
+    with _stats_lock:
+        entry = _query_stats.get(statement)
+        if entry is None:
+            entry = _query_stats[statement] = [caller, 0, 0.0, 0.0]
+        entry[1] += 1
+        entry[2] += elapsed
+        entry[3] = max(entry[3], elapsed)
+    
+    if elapsed < SLOW_QUERY_SECONDS:
+        return
+    SLOW_QUERIES.inc(caller)
+    # План одного оператора не меняется от вызова к вызову — считаем его один раз
+    plan = _query_plans.get(statement)
+    if plan is None and parameters is not None:
+        plan = _query_plans[statement] = _explain(connection, sql, parameters)
+    logger.warning(
+        f"Медленный запрос {elapsed * 1000:.1f} мс в {caller}: {statement}\n"
+        f"План:\n{plan or '(не построен для executemany)'}"
+    )
+    _slow_queries.append((datetime.now(), caller, elapsed, statement, plan))
+
+def _query_label():
+    # Метка — первая публичная функция database.py вверх по стеку, а не
+    # вспомогательная вроде _fetch_keyset_page или _iter_rows
+    frame = sys._getframe(2)
+    caller = frame.f_code.co_name
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == __file__ and not code.co_name.startswith(('_', '<')):
+            return code.co_name
+        frame = frame.f_back
+    return caller
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который замеряет execute/executemany; метка — публичная функция database.py"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(self.connection, sql, parameters, time.perf_counter() - started, _query_label())
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(self.connection, sql, None, time.perf_counter() - started, _query_label())
+
+def get_query_stats(limit=15):
+    """[(SQL, функция, количество, сумма сек, максимум сек)] по убыванию суммарного времени"""
+    with _stats_lock:
+        rows = [(statement, *entry) for statement, entry in _query_stats.items()]
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows[:limit]
+
+def get_slow_queries():
+    """Последние медленные запросы: (время, функция, длительность, SQL, план), новые первыми"""
+    return list(reversed(_slow_queries))
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+def _connect():
+    return sqlite3.connect(DB_PATH, factory=TimedConnection)
+
+# Версии данных: увеличиваются при каждом изменении, по ним сбрасываются кэши страниц
+_data_versions = {}
+
+def data_version(name):
+    return _data_versions.get(name, 0)
+
+def _bump_version(*names):
+    for name in names:
+        _data_versions[name] = _data_versions.get(name, 0) + 1
+
+def _add_column_if_missing(cursor, table, column, definition):
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# Таблица и колонка пути к файлу для записей, хранящих файлы
+FILE_COLUMNS = {'cameras': 'image_path', 'projects': 'file_path', 'packs': 'file_path'}
+
+# (имя, событие, условие WHEN, строки VALUES) триггеров таблицы counters
+COUNTER_TRIGGERS = [
+    ('cameras_counters_ai', 'AFTER INSERT ON cameras', '',
+     "('total', 'cameras', 1), ('camera_category', new.category, 1), ('camera_admin', new.admin_id, 1)"),
+    ('cameras_counters_ad', 'AFTER DELETE ON cameras', '',
+     "('total', 'cameras', -1), ('camera_category', old.category, -1), ('camera_admin', old.admin_id, -1)"),
+    ('cameras_counters_au', 'AFTER UPDATE OF category, admin_id ON cameras',
+     'WHEN old.category IS NOT new.category OR old.admin_id IS NOT new.admin_id',
+     "('camera_category', old.category, -1), ('camera_category', new.category, 1), "
+     "('camera_admin', old.admin_id, -1), ('camera_admin', new.admin_id, 1)"),
+    ('packs_counters_ai', 'AFTER INSERT ON packs', '',
+     "('total', 'packs', 1), ('pack_admin', new.admin_username, 1)"),
+    ('packs_counters_ad', 'AFTER DELETE ON packs', '',
+     "('total', 'packs', -1), ('pack_admin', old.admin_username, -1)"),
+    ('packs_counters_au', 'AFTER UPDATE OF admin_username ON packs',
+     'WHEN old.admin_username IS NOT new.admin_username',
+     "('pack_admin', old.admin_username, -1), ('pack_admin', new.admin_username, 1)"),
+    ('users_counters_ai', 'AFTER INSERT ON users', '', "('total', 'users', 1)"),
+    ('users_counters_ad', 'AFTER DELETE ON users', '', "('total', 'users', -1)"),
+    # banned_users считает только забаненных, которые есть в users, — для числа активных
+    ('users_banned_counters_ai', 'AFTER INSERT ON users',
+     'WHEN EXISTS (SELECT 1 FROM banned_users WHERE user_id = new.user_id)', "('total', 'banned_users', 1)"),
+    ('users_banned_counters_ad', 'AFTER DELETE ON users',
+     'WHEN EXISTS (SELECT 1 FROM banned_users WHERE user_id = old.user_id)', "('total', 'banned_users', -1)"),
+    ('banned_counters_ai', 'AFTER INSERT ON banned_users',
+     'WHEN EXISTS (SELECT 1 FROM users WHERE user_id = new.user_id)', "('total', 'banned_users', 1)"),
+    ('banned_counters_ad', 'AFTER DELETE ON banned_users',
+     'WHEN EXISTS (SELECT 1 FROM users WHERE user_id = old.user_id)', "('total', 'banned_users', -1)"),
+]
+
+def _rebuild_counters(cursor):
+    cursor.execute('DELETE FROM counters')
+    cursor.execute('''
+        INSERT INTO counters (scope, key, value)
+        SELECT 'total', 'cameras', COUNT(*) FROM cameras
+        UNION ALL SELECT 'total', 'packs', COUNT(*) FROM packs
+        UNION ALL SELECT 'total', 'users', COUNT(*) FROM users
+        UNION ALL SELECT 'total', 'banned_users', COUNT(*) FROM banned_users
+            WHERE user_id IN (SELECT user_id FROM users)
+        UNION ALL SELECT 'camera_category', category, COUNT(*) FROM cameras GROUP BY category
+        UNION ALL SELECT 'camera_admin', admin_id, COUNT(*) FROM cameras GROUP BY admin_id
+        UNION ALL SELECT 'pack_admin', admin_username, COUNT(*) FROM packs GROUP BY admin_username
+    ''')
+
 def init_db():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -35,6 +218,48 @@ def init_db():
         FOREIGN KEY (admin_id) REFERENCES admins(id)
     )
     ''')
+    # file_id фото в Telegram — позволяет отправлять камеру без чтения файла с диска
+    _add_column_if_missing(cursor, 'cameras', 'file_id', 'TEXT')
+    # Перцептивный хэш скриншота для поиска повторных загрузок
+    _add_column_if_missing(cursor, 'cameras', 'phash', 'INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cameras_phash ON cameras (phash)')
+    
+    # Полнотекстовый индекс по камерам (синхронизируется триггерами)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cameras_fts'")
+    fts_exists = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS cameras_fts USING fts5(
+        caption, custom_name, category,
+        content='cameras', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS cameras_fts_ai AFTER INSERT ON cameras BEGIN
+        INSERT INTO cameras_fts (rowid, caption, custom_name, category)
+        VALUES (new.id, new.caption, new.custom_name, new.category);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS cameras_fts_ad AFTER DELETE ON cameras BEGIN
+        INSERT INTO cameras_fts (cameras_fts, rowid, caption, custom_name, category)
+        VALUES ('delete', old.id, old.caption, old.custom_name, old.category);
+    END
+    ''')
+    # Индекс переписываем только при изменении индексируемых полей, а не при
+    # каждом обновлении file_id или blob; старый вариант триггера заменяем
+    cursor.execute('DROP TRIGGER IF EXISTS cameras_fts_au')
+    cursor.execute('''
+    CREATE TRIGGER cameras_fts_au AFTER UPDATE OF caption, custom_name, category ON cameras BEGIN
+        INSERT INTO cameras_fts (cameras_fts, rowid, caption, custom_name, category)
+        VALUES ('delete', old.id, old.caption, old.custom_name, old.category);
+        INSERT INTO cameras_fts (rowid, caption, custom_name, category)
+        VALUES (new.id, new.caption, new.custom_name, new.category);
+    END
+    ''')
+    if not fts_exists:
+        # Индекс создан впервые — заполняем его существующими камерами
+        cursor.execute("INSERT INTO cameras_fts (cameras_fts) VALUES ('rebuild')")
     
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS banned_users (
@@ -79,6 +304,83 @@ def init_db():
     )
     ''')
     
+    # Хранилище файлов по SHA-256 и счётчики ссылок на них
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    for table in ('cameras', 'projects', 'packs'):
+        _add_column_if_missing(cursor, table, 'blob_sha256', 'TEXT')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_blob ON {table} (blob_sha256)')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_blob_ai AFTER INSERT ON {table}
+        WHEN new.blob_sha256 IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = new.blob_sha256;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_blob_ad AFTER DELETE ON {table}
+        WHEN old.blob_sha256 IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = old.blob_sha256;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_blob_au AFTER UPDATE OF blob_sha256 ON {table}
+        WHEN old.blob_sha256 IS NOT new.blob_sha256 BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = old.blob_sha256;
+            UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = new.blob_sha256;
+        END
+        ''')
+    
+    # Счётчики для статистики без полного прохода по таблицам, ведутся триггерами:
+    # total (cameras, packs, users, banned_users), camera_category, camera_admin, pack_admin
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counters'")
+    counters_exist = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS counters (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID
+    ''')
+    for name, event, condition, values in COUNTER_TRIGGERS:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} {event}
+        {condition} BEGIN
+            INSERT INTO counters (scope, key, value) VALUES {values}
+            ON CONFLICT (scope, key) DO UPDATE SET value = value + excluded.value;
+        END
+        ''')
+    if not counters_exist:
+        # Таблица создана впервые — считаем по уже существующим данным
+        _rebuild_counters(cursor)
+    
+    # Прогресс фоновых миграций: можно прервать и продолжить с last_id
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS migrations (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    # Выдача камер (по коду), проектов и паков (по id) по дням; пишется пачками из asset_stats.py
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS asset_stats (
+        kind TEXT NOT NULL,
+        asset TEXT NOT NULL,
+        day TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (kind, asset, day)
+    ) WITHOUT ROWID
+    ''')
+    
     # Удаляем старую таблицу broadcasts, если она есть, и создаем новую
     cursor.execute('DROP TABLE IF EXISTS broadcasts')
     cursor.execute('''
@@ -96,15 +398,9 @@ def init_db():
     
     conn.commit()
     conn.close()
-    
-    for category in default_categories:
-        os.makedirs(f"cameras/{category}", exist_ok=True)
-    
-    os.makedirs("projects", exist_ok=True)
-    os.makedirs("packs", exist_ok=True)
 
 def add_admin(username, password, is_master=False, display_name=None):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -119,7 +415,7 @@ def add_admin(username, password, is_master=False, display_name=None):
         conn.close()
 
 def verify_admin(username, password):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM admins WHERE username = ? AND password = ?', (username, password))
     admin = cursor.fetchone()
@@ -127,7 +423,7 @@ def verify_admin(username, password):
     return bool(admin)
 
 def is_master_admin(username):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT is_master FROM admins WHERE username = ?', (username,))
     result = cursor.fetchone()
@@ -135,36 +431,89 @@ def is_master_admin(username):
     return bool(result[0]) if result else False
 
 def admin_exists(username):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT 1 FROM admins WHERE username = ?', (username,))
     result = cursor.fetchone()
     conn.close()
     return bool(result)
 
-def add_camera(admin_username, category, image_path, caption, custom_name=None):
-    conn = sqlite3.connect('camera_bot.db')
+def add_camera(admin_username, category, image_path, caption, custom_name=None, file_id=None, blob_sha256=None):
+    conn = _connect()
     cursor = conn.cursor()
     
-    code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    code = _generate_codes(cursor, 1)[0]
     
     cursor.execute('SELECT id FROM admins WHERE username = ?', (admin_username,))
     admin_id = cursor.fetchone()[0]
     
     cursor.execute('''
-    INSERT INTO cameras (code, category, image_path, caption, custom_name, admin_id)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', (code, category, image_path, caption, custom_name, admin_id))
+    INSERT INTO cameras (code, category, image_path, caption, custom_name, admin_id, file_id, blob_sha256)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (code, category, image_path, caption, custom_name, admin_id, file_id, blob_sha256))
     
     conn.commit()
     conn.close()
+    camera_index.put(code, category, caption, custom_name, file_id)
+    _bump_version('cameras')
     return code
 
+def _generate_codes(cursor, count):
+    # Уникальные коды: повторяем генерацию для совпавших с существующими
+    codes = set()
+    while len(codes) < count:
+        candidates = {
+            ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            for _ in range(count - len(codes))
+        } - codes
+        placeholders = ','.join('?' * len(candidates))
+        cursor.execute(f'SELECT code FROM cameras WHERE code IN ({placeholders})', list(candidates))
+        codes |= candidates - {row[0] for row in cursor.fetchall()}
+    return list(codes)
+
+def add_cameras_bulk(admin_username, rows, chunk_size=100):
+    """Добавляет камеры одной транзакцией многострочными INSERT.
+
+    rows — список (category, image_path, caption, custom_name, file_id, blob_sha256);
+    возвращает коды в том же порядке.
+    """
+    if not rows:
+        return []
+    
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT id FROM admins WHERE username = ?', (admin_username,))
+        admin_id = cursor.fetchone()[0]
+        codes = _generate_codes(cursor, len(rows))
+        
+        for i in range(0, len(rows), chunk_size):
+            chunk = list(zip(codes[i:i + chunk_size], rows[i:i + chunk_size]))
+            values = ','.join(['(?, ?, ?, ?, ?, ?, ?, ?)'] * len(chunk))
+            params = []
+            for code, (category, image_path, caption, custom_name, file_id, blob_sha256) in chunk:
+                params.extend((code, category, image_path, caption, custom_name, admin_id, file_id, blob_sha256))
+            cursor.execute(f'''
+            INSERT INTO cameras (code, category, image_path, caption, custom_name, admin_id, file_id, blob_sha256)
+            VALUES {values}
+            ''', params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    for code, (category, image_path, caption, custom_name, file_id, blob_sha256) in zip(codes, rows):
+        camera_index.put(code, category, caption, custom_name, file_id)
+    _bump_version('cameras')
+    return codes
+
 def get_camera(code):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
-    SELECT image_path, caption, custom_name 
+    SELECT image_path, caption, custom_name, file_id 
     FROM cameras 
     WHERE code = ?
     ''', (code,))
@@ -172,8 +521,102 @@ def get_camera(code):
     conn.close()
     return result
 
+def get_cameras(codes):
+    if not codes:
+        return []
+    conn = _connect()
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(codes))
+    cursor.execute(f'''
+    SELECT code, image_path, caption, custom_name, file_id 
+    FROM cameras 
+    WHERE code IN ({placeholders})
+    ''', list(codes))
+    result = cursor.fetchall()
+    conn.close()
+    return result
+
+def set_camera_file_id(code, file_id):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE cameras SET file_id = ? WHERE code = ?', (file_id, code))
+    conn.commit()
+    conn.close()
+    camera_index.set_file_id(code, file_id)
+
+def set_camera_phashes(pairs):
+    """Сохраняет перцептивные хэши: pairs — список (code, phash)"""
+    pairs = [(code, phash) for code, phash in pairs if phash is not None]
+    if not pairs:
+        return
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE cameras SET phash = ? WHERE code = ?',
+                       [(dedup.to_signed(phash), code) for code, phash in pairs])
+    conn.commit()
+    conn.close()
+    for code, phash in pairs:
+        dedup.add(code, phash)
+
+def get_cameras_without_phash(after_id=0, limit=200):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, code, image_path FROM cameras
+        WHERE phash IS NULL AND id > ?
+        ORDER BY id LIMIT ?
+    ''', (after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def load_dedup_index():
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT code, phash FROM cameras WHERE phash IS NOT NULL')
+    dedup.load((code, dedup.to_unsigned(phash)) for code, phash in cursor)
+    conn.close()
+    return dedup.size()
+
+def load_camera_index():
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT code, category, caption, custom_name, file_id FROM cameras')
+    camera_index.load(cursor)
+    conn.close()
+    return camera_index.size()
+
+def _fts_query(text):
+    # Каждое слово ищем как префикс, спецсимволы FTS5 отбрасываем
+    tokens = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def search_cameras(query, limit=10, offset=0):
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return [], 0
+    
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM cameras_fts WHERE cameras_fts MATCH ?', (fts_query,))
+    total = cursor.fetchone()[0]
+    
+    # bm25: название важнее подписи, категория — меньше всего
+    cursor.execute('''
+        SELECT cameras.code, cameras.category, cameras.custom_name, cameras.caption, admins.username
+        FROM cameras_fts
+        JOIN cameras ON cameras.id = cameras_fts.rowid
+        LEFT JOIN admins ON cameras.admin_id = admins.id
+        WHERE cameras_fts MATCH ?
+        ORDER BY bm25(cameras_fts, 1.0, 2.0, 0.5)
+        LIMIT ? OFFSET ?
+    ''', (fts_query, limit, offset))
+    results = cursor.fetchall()
+    conn.close()
+    return results, total
+
 def get_all_admins():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT username, display_name FROM admins')
     result = cursor.fetchall()
@@ -181,26 +624,50 @@ def get_all_admins():
     return result
 
 def delete_admin(username):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM admins WHERE username = ?', (username,))
     conn.commit()
     conn.close()
+    _bump_version('cameras')
+
+def set_admin_password(username, password):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE admins SET password = ? WHERE username = ?', (password, username))
+    conn.commit()
+    conn.close()
 
 def get_camera_stats():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT category, COUNT(*) as count 
-        FROM cameras 
-        GROUP BY category
+        SELECT key, value FROM counters
+        WHERE scope = 'camera_category' AND value > 0
+        ORDER BY key
     ''')
     stats = cursor.fetchall()
     conn.close()
     return stats
 
+def get_admin_totals():
+    """{логин: (камер, паков)} по счётчикам"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT admins.username, COALESCE(cameras.value, 0), COALESCE(packs.value, 0)
+        FROM admins
+        LEFT JOIN counters cameras
+            ON cameras.scope = 'camera_admin' AND cameras.key = CAST(admins.id AS TEXT)
+        LEFT JOIN counters packs
+            ON packs.scope = 'pack_admin' AND packs.key = admins.username
+    ''')
+    totals = {username: (cameras, packs) for username, cameras, packs in cursor.fetchall()}
+    conn.close()
+    return totals
+
 def get_cameras_with_admin():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT cameras.code, cameras.category, cameras.custom_name, admins.username 
@@ -212,7 +679,7 @@ def get_cameras_with_admin():
     return cameras
 
 def get_cameras_by_admin(username):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT cameras.code, cameras.category, cameras.custom_name 
@@ -224,44 +691,118 @@ def get_cameras_by_admin(username):
     conn.close()
     return cameras
 
+def _fetch_keyset_page(cursor, select_sql, key, params, after=None, before=None, limit=20, descending=False):
+    # Keyset-пагинация: WHERE key > ? LIMIT n вместо OFFSET и fetchall по всей таблице.
+    # Возвращает строки страницы и признак, что в направлении листания есть ещё записи.
+    conditions = []
+    query_params = list(params)
+    backward = before is not None
+    if after is not None:
+        conditions.append(f"{key} {'<' if descending else '>'} ?")
+        query_params.append(after)
+    if backward:
+        conditions.append(f"{key} {'>' if descending else '<'} ?")
+        query_params.append(before)
+    
+    order = 'DESC' if descending != backward else 'ASC'
+    sql = select_sql
+    if conditions:
+        sql += (' AND ' if ' WHERE ' in select_sql else ' WHERE ') + ' AND '.join(conditions)
+    sql += f' ORDER BY {key} {order} LIMIT ?'
+    query_params.append(limit + 1)
+    
+    cursor.execute(sql, query_params)
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+def get_cameras_page(after=None, before=None, limit=20, admin_username=None):
+    conn = _connect()
+    cursor = conn.cursor()
+    select_sql = '''
+        SELECT cameras.id, cameras.code, cameras.category, cameras.custom_name, admins.username 
+        FROM cameras 
+        LEFT JOIN admins ON cameras.admin_id = admins.id'''
+    params = []
+    if admin_username is not None:
+        select_sql += ' WHERE admins.username = ?'
+        params.append(admin_username)
+    result = _fetch_keyset_page(cursor, select_sql, 'cameras.id', params, after, before, limit)
+    conn.close()
+    return result
+
+def _release_blob(cursor, sha256):
+    # Счётчик уже уменьшен триггером; True — ссылок больше нет и файл можно удалить
+    if not sha256:
+        return True
+    cursor.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,))
+    result = cursor.fetchone()
+    return not result or result[0] <= 0
+
 def delete_camera(code):
-    conn = sqlite3.connect('camera_bot.db')
+    """Удаляет камеру; возвращает (путь к файлу или None, можно ли удалить файл)"""
+    conn = _connect()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT image_path FROM cameras WHERE code = ?', (code,))
+    cursor.execute('SELECT image_path, blob_sha256 FROM cameras WHERE code = ?', (code,))
     result = cursor.fetchone()
-    image_path = result[0] if result else None
+    if not result:
+        conn.close()
+        return None, False
+    image_path, blob_sha256 = result
     
     cursor.execute('DELETE FROM cameras WHERE code = ?', (code,))
+    unreferenced = _release_blob(cursor, blob_sha256)
     conn.commit()
     conn.close()
+    camera_index.remove(code)
+    dedup.remove(code)
+    _bump_version('cameras')
     
-    return image_path
+    return image_path, unreferenced
+
+# Забаненные в памяти: загружаются при первой проверке, дальше их меняют
+# только ban_user/unban_user, поэтому is_banned не ходит в базу
+_banned_ids = None
+_banned_lock = threading.Lock()
+
+def _banned_set():
+    global _banned_ids
+    with _banned_lock:
+        if _banned_ids is None:
+            conn = _connect()
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM banned_users')
+            _banned_ids = {row[0] for row in cursor.fetchall()}
+            conn.close()
+        return _banned_ids
 
 def ban_user(user_id):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('INSERT OR IGNORE INTO banned_users (user_id) VALUES (?)', (user_id,))
     conn.commit()
     conn.close()
+    _banned_set().add(user_id)
+    _bump_version('users')
 
 def unban_user(user_id):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM banned_users WHERE user_id = ?', (user_id,))
     conn.commit()
     conn.close()
+    _banned_set().discard(user_id)
+    _bump_version('users')
 
 def is_banned(user_id):
-    conn = sqlite3.connect('camera_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT 1 FROM banned_users WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return bool(result)
+    return user_id in _banned_set()
 
 def get_banned_users():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id FROM banned_users')
     result = [row[0] for row in cursor.fetchall()]
@@ -269,17 +810,20 @@ def get_banned_users():
     return result
 
 def add_user(user_id, username, first_name, last_name):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         INSERT OR IGNORE INTO users (user_id, username, first_name, last_name)
         VALUES (?, ?, ?, ?)
     ''', (user_id, username, first_name, last_name))
+    inserted = cursor.rowcount > 0
     conn.commit()
     conn.close()
+    if inserted:
+        _bump_version('users')
 
 def get_all_users():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT u.user_id, u.username, u.first_name, u.last_name, 
@@ -291,13 +835,23 @@ def get_all_users():
     conn.close()
     return users
 
+def get_users_page(after=None, before=None, limit=20):
+    conn = _connect()
+    cursor = conn.cursor()
+    result = _fetch_keyset_page(cursor, '''
+        SELECT u.user_id, u.username, u.first_name, u.last_name, 
+               CASE WHEN b.user_id IS NOT NULL THEN 1 ELSE 0 END AS is_banned
+        FROM users u
+        LEFT JOIN banned_users b ON u.user_id = b.user_id''', 'u.user_id', [], after, before, limit)
+    conn.close()
+    return result
+
 def add_category(category_name):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute('INSERT INTO categories (name) VALUES (?)', (category_name,))
         conn.commit()
-        os.makedirs(f"cameras/{category_name}", exist_ok=True)
         return True
     except sqlite3.IntegrityError:
         return False
@@ -305,33 +859,36 @@ def add_category(category_name):
         conn.close()
 
 def delete_category(category_name):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM categories WHERE name = ?', (category_name,))
     conn.commit()
     conn.close()
+    # Папка категории из старой раскладки файлов, если она уже пуста
+    with contextlib.suppress(OSError):
+        os.rmdir(f"cameras/{category_name}")
     return True
 
 def get_all_categories():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT name FROM categories')
     categories = [row[0] for row in cursor.fetchall()]
     conn.close()
     return categories
 
-def add_project(file_path, caption, display_name):
-    conn = sqlite3.connect('camera_bot.db')
+def add_project(file_path, caption, display_name, blob_sha256=None):
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO projects (file_path, caption, display_name)
-        VALUES (?, ?, ?)
-    ''', (file_path, caption, display_name))
+        INSERT INTO projects (file_path, caption, display_name, blob_sha256)
+        VALUES (?, ?, ?, ?)
+    ''', (file_path, caption, display_name, blob_sha256))
     conn.commit()
     conn.close()
 
 def get_all_projects():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT id, display_name, caption, file_path FROM projects')
     projects = cursor.fetchall()
@@ -339,39 +896,44 @@ def get_all_projects():
     return projects
 
 def get_project(project_id):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM projects WHERE id = ?', (project_id,))
+    cursor.execute('SELECT id, file_path, caption, display_name, timestamp FROM projects WHERE id = ?', (project_id,))
     project = cursor.fetchone()
     conn.close()
     return project
 
 def delete_project(project_id):
-    conn = sqlite3.connect('camera_bot.db')
+    """Удаляет проект; возвращает (путь к файлу или None, можно ли удалить файл)"""
+    conn = _connect()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT file_path FROM projects WHERE id = ?', (project_id,))
+    cursor.execute('SELECT file_path, blob_sha256 FROM projects WHERE id = ?', (project_id,))
     result = cursor.fetchone()
-    file_path = result[0] if result else None
+    if not result:
+        conn.close()
+        return None, False
+    file_path, blob_sha256 = result
     
     cursor.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+    unreferenced = _release_blob(cursor, blob_sha256)
     conn.commit()
     conn.close()
     
-    return file_path
+    return file_path, unreferenced
 
-def add_pack(file_path, caption, display_name, admin_username):
-    conn = sqlite3.connect('camera_bot.db')
+def add_pack(file_path, caption, display_name, admin_username, blob_sha256=None):
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO packs (file_path, caption, display_name, admin_username)
-        VALUES (?, ?, ?, ?)
-    ''', (file_path, caption, display_name, admin_username))
+        INSERT INTO packs (file_path, caption, display_name, admin_username, blob_sha256)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (file_path, caption, display_name, admin_username, blob_sha256))
     conn.commit()
     conn.close()
 
 def get_packs_by_admin(admin_username):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT id, display_name, caption, file_path FROM packs WHERE admin_username = ?', (admin_username,))
     packs = cursor.fetchall()
@@ -379,29 +941,54 @@ def get_packs_by_admin(admin_username):
     return packs
 
 def get_all_packs():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT id, display_name, caption, file_path, admin_username FROM packs')
     packs = cursor.fetchall()
     conn.close()
     return packs
 
+def get_pack(pack_id):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, display_name, caption, file_path, admin_username FROM packs WHERE id = ?', (pack_id,))
+    pack = cursor.fetchone()
+    conn.close()
+    return pack
+
 def delete_pack(pack_id):
-    conn = sqlite3.connect('camera_bot.db')
+    """Удаляет пак; возвращает (путь к файлу или None, можно ли удалить файл)"""
+    conn = _connect()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT file_path FROM packs WHERE id = ?', (pack_id,))
+    cursor.execute('SELECT file_path, blob_sha256 FROM packs WHERE id = ?', (pack_id,))
     result = cursor.fetchone()
-    file_path = result[0] if result else None
+    if not result:
+        conn.close()
+        return None, False
+    file_path, blob_sha256 = result
     
     cursor.execute('DELETE FROM packs WHERE id = ?', (pack_id,))
+    unreferenced = _release_blob(cursor, blob_sha256)
     conn.commit()
     conn.close()
     
-    return file_path
+    return file_path, unreferenced
+
+def count_active_users():
+    """Число незабаненных пользователей по счётчикам"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COALESCE(SUM(CASE key WHEN 'users' THEN value ELSE -value END), 0)
+        FROM counters WHERE scope = 'total' AND key IN ('users', 'banned_users')
+    ''')
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
 
 def get_active_users():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT user_id FROM users 
@@ -412,7 +999,7 @@ def get_active_users():
     return users
 
 def add_broadcast_record(admin_username, message_text):
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -420,17 +1007,285 @@ def add_broadcast_record(admin_username, message_text):
             VALUES (?, ?)
         ''', (admin_username, message_text))
         conn.commit()
+        _bump_version('broadcasts')
     except sqlite3.Error as e:
         logger.error(f"Ошибка при добавлении записи рассылки: {e}")
     finally:
         conn.close()
 
 def get_broadcast_history():
-    conn = sqlite3.connect('camera_bot.db')
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM broadcasts ORDER BY timestamp DESC')
     history = cursor.fetchall()
     conn.close()
     return history
 
+def get_broadcasts_page(after=None, before=None, limit=5):
+    conn = _connect()
+    cursor = conn.cursor()
+    # Новые рассылки первыми
+    result = _fetch_keyset_page(cursor, 'SELECT id, admin_username, message_text, timestamp FROM broadcasts',
+                                'id', [], after, before, limit, descending=True)
+    conn.close()
+    return result
+
+def register_blob(sha256, path, size):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('INSERT OR IGNORE INTO blobs (sha256, path, size) VALUES (?, ?, ?)', (sha256, path, size))
+    conn.commit()
+    conn.close()
+
+def get_blob_path(sha256):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT path FROM blobs WHERE sha256 = ?', (sha256,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else None
+
+def get_blob_refcount(sha256):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0] if result else 0
+
+def move_blob(sha256, path):
+    """Переносит блоб на новый путь: обновляет blobs и все ссылающиеся записи"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE blobs SET path = ? WHERE sha256 = ?', (path, sha256))
+    for table, column in FILE_COLUMNS.items():
+        cursor.execute(f'UPDATE {table} SET {column} = ? WHERE blob_sha256 = ?', (path, sha256))
+    conn.commit()
+    conn.close()
+
+def relink_path(old_path, path, sha256):
+    """Привязывает к блобу все записи со старым путём к файлу — во всех таблицах сразу"""
+    conn = _connect()
+    cursor = conn.cursor()
+    for table, column in FILE_COLUMNS.items():
+        cursor.execute(f'UPDATE {table} SET {column} = ?, blob_sha256 = ? WHERE {column} = ?',
+                       (path, sha256, old_path))
+    conn.commit()
+    conn.close()
+
+def get_rows_outside(table, prefix, after_id=0, limit=100):
+    """Записи, чей файл лежит не под prefix (LIKE-шаблон): (id, путь, blob_sha256)"""
+    column = FILE_COLUMNS[table]
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, {column}, blob_sha256 FROM {table}
+        WHERE id > ? AND {column} NOT LIKE ?
+        ORDER BY id LIMIT ?
+    ''', (after_id, prefix, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_migration_state(name):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT last_id, done FROM migrations WHERE name = ?', (name,))
+    result = cursor.fetchone()
+    conn.close()
+    return (result[0], bool(result[1])) if result else (0, False)
+
+def set_migration_state(name, last_id, done=False):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO migrations (name, last_id, done) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id, done = excluded.done
+    ''', (name, last_id, int(done)))
+    conn.commit()
+    conn.close()
+
+def reconcile_blob_refcounts():
+    """Пересчитывает счётчики ссылок по фактическим записям; возвращает число исправленных"""
+    conn = _connect()
+    cursor = conn.cursor()
+    # rowcount для запросов с WITH не заполняется, считаем по total_changes
+    changes_before = conn.total_changes
+    cursor.execute('''
+        WITH refs AS (
+            SELECT blob_sha256 AS sha256, COUNT(*) AS n FROM (
+                SELECT blob_sha256 FROM cameras
+                UNION ALL SELECT blob_sha256 FROM projects
+                UNION ALL SELECT blob_sha256 FROM packs
+            ) WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256
+        )
+        UPDATE blobs
+        SET refcount = COALESCE((SELECT n FROM refs WHERE refs.sha256 = blobs.sha256), 0)
+        WHERE refcount != COALESCE((SELECT n FROM refs WHERE refs.sha256 = blobs.sha256), 0)
+    ''')
+    fixed = conn.total_changes - changes_before
+    conn.commit()
+    conn.close()
+    return fixed
+
+def get_blob_refcounts(hashes):
+    """{sha256: refcount} для известных хранилищу хэшей из списка"""
+    if not hashes:
+        return {}
+    conn = _connect()
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(hashes))
+    cursor.execute(f'SELECT sha256, refcount FROM blobs WHERE sha256 IN ({placeholders})', list(hashes))
+    result = dict(cursor.fetchall())
+    conn.close()
+    return result
+
+def get_dead_blobs():
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT sha256, path FROM blobs WHERE refcount <= 0')
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def delete_dead_blob(sha256):
+    """Удаляет запись о блобе, если на него так и не появилось ссылок"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM blobs WHERE sha256 = ? AND refcount <= 0', (sha256,))
+    deleted = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return deleted
+
+def reassign_orphan_cameras():
+    """Передаёт камеры удалённых админов первому главному админу.
+
+    Возвращает (передано, осталось без владельца).
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM admins WHERE is_master = 1 ORDER BY id LIMIT 1')
+    master = cursor.fetchone()
+    reassigned = 0
+    if master:
+        cursor.execute('''
+            UPDATE cameras SET admin_id = ?
+            WHERE admin_id NOT IN (SELECT id FROM admins)
+        ''', (master[0],))
+        reassigned = cursor.rowcount
+        conn.commit()
+    cursor.execute('SELECT COUNT(*) FROM cameras WHERE admin_id NOT IN (SELECT id FROM admins)')
+    remaining = cursor.fetchone()[0]
+    conn.close()
+    if reassigned:
+        _bump_version('cameras')
+    return reassigned, remaining
+
+def count_cameras_without_category():
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM cameras WHERE category NOT IN (SELECT name FROM categories)')
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def iter_file_rows(table):
+    """Потоково выдаёт (id, путь к файлу) записей таблицы"""
+    yield from _iter_rows(f'SELECT id, {FILE_COLUMNS[table]} FROM {table} ORDER BY id')
+
+def _iter_rows(sql, batch_size=1000):
+    # Потоковое чтение: строки выдаются пачками, вся таблица в память не загружается
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def iter_users():
+    yield from _iter_rows('''
+        SELECT u.user_id, u.username, u.first_name, u.last_name, 
+               CASE WHEN b.user_id IS NOT NULL THEN 1 ELSE 0 END AS is_banned, u.timestamp
+        FROM users u
+        LEFT JOIN banned_users b ON u.user_id = b.user_id
+        ORDER BY u.user_id
+    ''')
+
+def iter_cameras():
+    yield from _iter_rows('''
+        SELECT cameras.code, cameras.category, cameras.custom_name, cameras.caption, 
+               admins.username, cameras.timestamp
+        FROM cameras 
+        LEFT JOIN admins ON cameras.admin_id = admins.id
+        ORDER BY cameras.id
+    ''')
+
+def iter_broadcasts():
+    yield from _iter_rows('SELECT id, admin_username, message_text, timestamp FROM broadcasts ORDER BY id')
+
+# Название ассета для отчётов: SQL-выражение, таблица и условие связи с asset_stats
+ASSET_TABLES = {
+    'camera': ("COALESCE(a.custom_name, a.category)", 'cameras', 'a.code'),
+    'project': ('a.display_name', 'projects', 'CAST(a.id AS TEXT)'),
+    'pack': ('a.display_name', 'packs', 'CAST(a.id AS TEXT)'),
+}
+
+def add_asset_stats(rows):
+    """Прибавляет счётчики выдачи одной транзакцией: rows — список (kind, asset, day, count)"""
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany('''
+            INSERT INTO asset_stats (kind, asset, day, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kind, asset, day) DO UPDATE SET count = count + excluded.count
+        ''', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_asset_stats_start():
+    """Первый день учёта выдачи или None"""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(day) FROM asset_stats')
+    day = cursor.fetchone()[0]
+    conn.close()
+    return day
+
+def get_top_assets(kind, since_day, limit=10):
+    """[(asset, название, выдач)] существующих ассетов вида kind начиная с since_day"""
+    name, table, key = ASSET_TABLES[kind]
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT s.asset, {name}, s.total
+        FROM (SELECT asset, SUM(count) AS total FROM asset_stats
+              WHERE kind = ? AND day >= ? GROUP BY asset) s
+        JOIN {table} a ON {key} = s.asset
+        ORDER BY s.total DESC
+        LIMIT ?
+    ''', (kind, since_day, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_unused_assets(kind, limit=20):
+    """(количество, [(asset, название)]) ассетов вида kind, которые ни разу не выдавались"""
+    name, table, key = ASSET_TABLES[kind]
+    condition = f'''NOT EXISTS (SELECT 1 FROM asset_stats s WHERE s.kind = ? AND s.asset = {key})'''
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT COUNT(*) FROM {table} a WHERE {condition}', (kind,))
+    count = cursor.fetchone()[0]
+    cursor.execute(f'SELECT {key}, {name} FROM {table} a WHERE {condition} ORDER BY a.id LIMIT ?', (kind, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return count, rows
+
 init_db()
@@ -0,0 +1,149 @@
+import threading
+
+# Поиск похожих скриншотов по расстоянию Хэмминга между 64-битными
+# перцептивными хэшами. Используется multi-index hashing: хэш делится на
+# DUPLICATE_DISTANCE + 1 частей, и у двух хэшей на расстоянии не больше
+# DUPLICATE_DISTANCE хотя бы одна часть совпадает точно (принцип Дирихле).
+# Поэтому кандидатов ищем по точному совпадению частей в словарях, а
+# расстояние считаем только для них.
+
+DUPLICATE_DISTANCE = 4
+HASH_BITS = 64
+
+_lock = threading.Lock()
+_codes_by_hash = {}
+_hash_by_code = {}
+
+def _chunk_bounds(parts):
+    size, extra = divmod(HASH_BITS, parts)
+    bounds = []
+    start = 0
+    for i in range(parts):
+        width = size + (1 if i < extra else 0)
+        bounds.append((start, (1 << width) - 1))
+        start += width
+    return bounds
+
+_CHUNKS = _chunk_bounds(DUPLICATE_DISTANCE + 1)
+_tables = [{} for _ in _CHUNKS]
+
+def to_signed(value):
+    # SQLite хранит INTEGER со знаком, а хэш — беззнаковые 64 бита
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+def _keys(phash):
+    return [(phash >> shift) & mask for shift, mask in _CHUNKS]
+
+def _add_locked(code, phash):
+    codes = _codes_by_hash.setdefault(phash, set())
+    if not codes:
+        for table, key in zip(_tables, _keys(phash)):
+            table.setdefault(key, set()).add(phash)
+    codes.add(code)
+    _hash_by_code[code] = phash
+
+def _remove_locked(code):
+    phash = _hash_by_code.pop(code, None)
+    if phash is None:
+        return
+    codes = _codes_by_hash.get(phash)
+    codes.discard(code)
+    if not codes:
+        del _codes_by_hash[phash]
+        for table, key in zip(_tables, _keys(phash)):
+            bucket = table[key]
+            bucket.discard(phash)
+            if not bucket:
+                del table[key]
+
+def load(rows):
+    """Перестраивает индекс из строк (code, phash)"""
+    with _lock:
+        _codes_by_hash.clear()
+        _hash_by_code.clear()
+        for table in _tables:
+            table.clear()
+        for code, phash in rows:
+            _add_locked(code, phash)
+
+def add(code, phash):
+    if phash is None:
+        return
+    with _lock:
+        _remove_locked(code)
+        _add_locked(code, phash)
+
+def remove(code):
+    with _lock:
+        _remove_locked(code)
+
+def _candidates(tables, phash):
+    candidates = set()
+    for table, key in zip(tables, _keys(phash)):
+        candidates |= table.get(key, set())
+    return candidates
+
+def find(phash, max_distance=DUPLICATE_DISTANCE):
+    """Коды камер, чей хэш отличается не более чем на max_distance бит, ближайшие первыми"""
+    if phash is None:
+        return []
+    max_distance = min(max_distance, DUPLICATE_DISTANCE)
+    with _lock:
+        similar = []
+        for other in _candidates(_tables, phash):
+            d = distance(phash, other)
+            if d <= max_distance:
+                similar.append((d, other))
+        found = []
+        for d, other in sorted(similar):
+            found.extend(sorted(_codes_by_hash[other]))
+    return found
+
+def clusters(max_distance=DUPLICATE_DISTANCE):
+    """Группы похожих камер по всему каталогу (связные компоненты пар ближе max_distance).
+
+    Долгая операция: работает по снимку индекса, не удерживая блокировку.
+    """
+    max_distance = min(max_distance, DUPLICATE_DISTANCE)
+    with _lock:
+        snapshot = {phash: sorted(codes) for phash, codes in _codes_by_hash.items()}
+
+    tables = [{} for _ in _CHUNKS]
+    for phash in snapshot:
+        for table, key in zip(tables, _keys(phash)):
+            table.setdefault(key, []).append(phash)
+
+    parent = {}
+
+    def root_of(item):
+        while parent.get(item, item) != item:
+            parent[item] = parent.get(parent[item], parent[item])
+            item = parent[item]
+        return item
+
+    def union(a, b):
+        a, b = root_of(a), root_of(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    for phash, codes in snapshot.items():
+        for code in codes[1:]:
+            union(codes[0], code)
+        for table, key in zip(tables, _keys(phash)):
+            for other in table[key]:
+                if other > phash and distance(phash, other) <= max_distance:
+                    union(codes[0], snapshot[other][0])
+
+    groups = {}
+    for code in list(parent):
+        groups.setdefault(root_of(code), set()).update((code, root_of(code)))
+    return sorted((sorted(members) for members in groups.values()), key=len, reverse=True)
+
+def size():
+    return len(_hash_by_code)
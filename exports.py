@@ -0,0 +1,54 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import database
+
+# Выгрузки: колонки и потоковый источник строк
+EXPORTS = {
+    'users': (
+        ['user_id', 'username', 'first_name', 'last_name', 'is_banned', 'timestamp'],
+        database.iter_users
+    ),
+    'cameras': (
+        ['code', 'category', 'custom_name', 'caption', 'admin', 'timestamp'],
+        database.iter_cameras
+    ),
+    'broadcasts': (
+        ['id', 'admin_username', 'message_text', 'timestamp'],
+        database.iter_broadcasts
+    ),
+}
+
+FORMATS = ('csv', 'jsonl')
+
+def write_export(kind, fmt):
+    """Пишет выгрузку в сжатый временный файл и возвращает (путь, число строк).
+
+    Строки читаются из SQLite генератором и сразу сжимаются, поэтому
+    расход памяти не зависит от размера таблицы. Функция блокирующая —
+    вызывать из потока.
+    """
+    columns, source = EXPORTS[kind]
+    fd, path = tempfile.mkstemp(prefix=f"{kind}_", suffix=f".{fmt}.gz")
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as gz, \
+                io.TextIOWrapper(gz, encoding='utf-8', newline='') as out:
+            if fmt == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(columns)
+                for row in source():
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in source():
+                    out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                    out.write('\n')
+                    count += 1
+    except Exception:
+        os.remove(path)
+        raise
+    return path, count
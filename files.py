@@ -0,0 +1,106 @@
+import asyncio
+import os
+import pathlib
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import metrics
+
+# Файловые операции обработчиков выполняются в отдельном ограниченном пуле потоков:
+# медленный или сетевой диск задерживает только сами операции, а не цикл событий.
+# Для каждой операции копится статистика задержек (вместе с ожиданием в очереди пула).
+
+FILE_IO_WORKERS = 8
+
+_executor = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix='file-io')
+# операция -> [количество, суммарное время, максимум, ошибки]
+_stats = {}
+FILE_IO_SECONDS = metrics.Histogram('bot_file_io_seconds', 'Задержка файловых операций обработчиков', ('op',))
+
+def _record(op, elapsed, failed):
+    entry = _stats.setdefault(op, [0, 0.0, 0.0, 0])
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] = max(entry[2], elapsed)
+    entry[3] += failed
+    FILE_IO_SECONDS.observe(elapsed, op)
+
+async def run(op, func, *args):
+    """Выполняет блокирующую функцию в файловом пуле и учитывает её задержку под именем op"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = await loop.run_in_executor(_executor, func, *args)
+        failed = False
+        return result
+    finally:
+        _record(op, time.perf_counter() - started, failed)
+
+def _read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+        return True
+    return False
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+async def exists(path):
+    return await run('exists', os.path.exists, path)
+
+async def read_bytes(path):
+    return await run('read', _read_bytes, path)
+
+async def write_bytes(path, data):
+    return await run('write', _write_bytes, path, data)
+
+async def remove(path):
+    """Удаляет файл, если он есть; возвращает True, если файл удалён"""
+    return await run('remove', _remove, path)
+
+async def temp_path(suffix=''):
+    """Создаёт пустой временный файл и возвращает его путь"""
+    return await run('mkstemp', _temp_path, suffix)
+
+async def telegram_input(path):
+    """Файл для отправки в Telegram.
+
+    С локальным сервером Bot API передаётся путь — сервер читает файл сам,
+    без пересылки содержимого по HTTP. Иначе содержимое читается в пуле.
+    """
+    if config.BOT_API_LOCAL_MODE:
+        if not await exists(path):
+            raise FileNotFoundError(path)
+        return pathlib.Path(path).resolve()
+    return await read_bytes(path)
+
+def stats():
+    """[(операция, количество, средняя задержка мс, максимальная мс, ошибки)] по убыванию суммарного времени"""
+    rows = [
+        (op, count, total / count * 1000, peak * 1000, errors)
+        for op, (count, total, peak, errors) in _stats.items()
+    ]
+    return sorted(rows, key=lambda row: row[1] * row[2], reverse=True)
+
+def format_stats():
+    if not _stats:
+        return "📈 Файловых операций ещё не было."
+    lines = ["📈 Файловые операции (кол-во, среднее, максимум):"]
+    for op, count, avg_ms, max_ms, errors in stats():
+        line = f"• {op}: {count}, {avg_ms:.1f} мс, {max_ms:.1f} мс"
+        if errors:
+            line += f", ошибок: {errors}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — обработка изображений отключается
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Декодирование изображений нагружает CPU, поэтому выполняется в пуле процессов,
+# а не в цикле событий бота
+POOL_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+HASH_SIZE = 8
+# Параметры хранения: длинная сторона, качество JPEG и размер миниатюры
+MAX_DIMENSION = 1920
+JPEG_QUALITY = 85
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 75
+
+_executor = None
+
+def available():
+    return Image is not None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+    return _executor
+
+def _dhash_image(image, hash_size=HASH_SIZE):
+    image = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def dhash_file(path, hash_size=HASH_SIZE):
+    """dHash: сравнение яркости соседних пикселей уменьшенного ч/б изображения"""
+    with Image.open(path) as image:
+        return _dhash_image(image, hash_size)
+
+def _to_rgb(image):
+    # Прозрачные области кладём на белый фон: в JPEG альфа-канала нет
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def _encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    # exif не передаётся — метаданные в результат не попадают
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def normalize_file(path):
+    """Перекодирует изображение для хранения (выполняется в процессе пула).
+
+    Возвращает (jpeg, миниатюра, dHash); jpeg равен None, если исходный файл
+    уже не больше перекодированного и не содержит метаданных.
+    """
+    original_size = os.path.getsize(path)
+    with Image.open(path) as source:
+        is_clean_jpeg = source.format == 'JPEG' and not source.info.get('exif')
+        # Поворот по EXIF применяем до того, как метаданные будут отброшены
+        image = _to_rgb(ImageOps.exif_transpose(source))
+    
+    fits = max(image.size) <= MAX_DIMENSION
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+    encoded = _encode_jpeg(image, JPEG_QUALITY)
+    if fits and is_clean_jpeg and len(encoded) >= original_size:
+        encoded = None
+    
+    thumbnail = image.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    return encoded, _encode_jpeg(thumbnail, THUMBNAIL_QUALITY), _dhash_image(image)
+
+async def run_in_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+async def dhash(path):
+    """Перцептивный хэш файла или None, если Pillow недоступен или файл не читается"""
+    if not available():
+        return None
+    try:
+        return await run_in_pool(dhash_file, path)
+    except Exception as e:
+        logger.warning(f"Не удалось посчитать хэш изображения {path}: {e}")
+        return None
+
+async def normalize(path):
+    """Результат normalize_file или None, если Pillow недоступен или файл не читается"""
+    if not available():
+        return None
+    try:
+        return await run_in_pool(normalize_file, path)
+    except Exception as e:
+        logger.warning(f"Не удалось обработать изображение {path}: {e}")
+        return None
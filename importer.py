@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import os
+import zipfile
+import zlib
+import storage
+import utils
+
+# Импорт камер из ZIP-архива. Функции блокирующие — вызываются из потока.
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+MAX_IMAGE_SIZE = 20 * 1024 * 1024
+MAX_ENTRIES = 5000
+MAX_MANIFEST_SIZE = 5 * 1024 * 1024
+
+class ArchiveError(Exception):
+    pass
+
+class LimitedReader(io.RawIOBase):
+    """Обёртка над записью архива: считает реально распакованные байты.
+
+    Заголовок ZIP может занижать размер (zip-бомба), поэтому лимит проверяется
+    по прочитанному, а не по info.file_size.
+    """
+
+    def __init__(self, source, limit, name):
+        self.source = source
+        self.limit = limit
+        self.name = name
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Читаем не больше лимита + 1 байт — этого хватает, чтобы заметить превышение
+        data = self.source.read(min(len(buffer), self.limit + 1 - self.size))
+        self.size += len(data)
+        if self.size > self.limit:
+            raise ArchiveError(f"Запись {self.name} больше заявленного размера или лимита")
+        buffer[:len(data)] = data
+        return len(data)
+
+def _manifest_key(name):
+    return os.path.basename(name).lower()
+
+def read_manifest(zf):
+    """Возвращает {имя файла: {'category', 'caption', 'custom_name'}} из manifest.csv/json"""
+    for info in zf.infolist():
+        base = _manifest_key(info.filename)
+        if base not in MANIFEST_NAMES:
+            continue
+        with zf.open(info) as raw:
+            limited = LimitedReader(raw, MAX_MANIFEST_SIZE, info.filename)
+            text = io.TextIOWrapper(io.BufferedReader(limited), encoding='utf-8-sig')
+            if base.endswith('.csv'):
+                entries = list(csv.DictReader(text))
+            else:
+                data = json.load(text)
+                if isinstance(data, dict):
+                    entries = [dict(value, filename=key) for key, value in data.items()]
+                else:
+                    entries = data
+        manifest = {}
+        for entry in entries:
+            filename = (entry.get('filename') or '').strip()
+            if filename:
+                manifest[_manifest_key(filename)] = {
+                    'category': (entry.get('category') or '').strip() or None,
+                    'caption': (entry.get('caption') or '').strip() or None,
+                    'custom_name': (entry.get('custom_name') or '').strip() or None,
+                }
+        return manifest
+    return {}
+
+def list_images(zf):
+    entries = [
+        info for info in zf.infolist()
+        if not info.is_dir()
+        and _manifest_key(info.filename) not in MANIFEST_NAMES
+        and not os.path.basename(info.filename).startswith('.')
+        and '__MACOSX' not in info.filename
+    ]
+    if len(entries) > MAX_ENTRIES:
+        raise ArchiveError(f"В архиве больше {MAX_ENTRIES} файлов")
+    return entries
+
+def extract_image(zf, info):
+    """Проверяет одну запись архива и потоково копирует её в хранилище.
+
+    Возвращает Blob или None, если запись — не изображение.
+    """
+    if info.file_size > MAX_IMAGE_SIZE:
+        return None
+    try:
+        with zf.open(info) as raw:
+            # Больше заявленного размера не читаем: на заявленные размеры опирается
+            # и проверка свободного места перед импортом
+            source = LimitedReader(raw, info.file_size, info.filename)
+            header = source.read(16)
+            ext = utils.detect_image_type(header)
+            if not ext:
+                return None
+            return storage.store_stream(source, ext, header)
+    except (zipfile.BadZipFile, zlib.error):
+        # zipfile сам обрывает запись на заявленном размере — и не сходится CRC
+        raise ArchiveError(f"Запись {info.filename} повреждена")
+
+def camera_fields(info, manifest, default_category, categories):
+    """Категория, подпись и название камеры для записи архива"""
+    meta = manifest.get(_manifest_key(info.filename), {})
+    category = meta.get('category') or default_category
+    if category not in categories:
+        category = default_category
+    caption = meta.get('caption') or os.path.splitext(os.path.basename(info.filename))[0]
+    return category, caption, meta.get('custom_name')
+
+def open_archive(path):
+    try:
+        return zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise ArchiveError("Файл не является ZIP-архивом")
@@ -0,0 +1,85 @@
+import asyncio
+import contextlib
+import os
+import shutil
+from collections import Counter
+import config
+import files
+import storage
+
+# Планировщик загрузок: общий лимит одновременных скачиваний, лимит на одного
+# админа и проверка свободного места до начала загрузки.
+
+MAX_CONCURRENT_INGESTS = 3
+MAX_INGESTS_PER_ADMIN = 2
+# Облачный Bot API отдаёт ботам файлы не больше 20 МБ, локальный сервер — до 2000 МБ
+MAX_DOWNLOAD_SIZE = (2000 if config.BOT_API_LOCAL_MODE else 20) * 1024 * 1024
+# Скачивание по HTTP PTB целиком держит в памяти — больше этого не качаем
+MAX_HTTP_DOWNLOAD_SIZE = 20 * 1024 * 1024
+# Запас свободного места, который загрузки не трогают
+MIN_FREE_SPACE = 512 * 1024 * 1024
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENT_INGESTS)
+_active = Counter()
+_waiting = 0
+
+class IngestRejected(Exception):
+    """Загрузка не начата; текст исключения можно показать админу"""
+
+def _free_space():
+    path = storage.BLOB_DIR if os.path.isdir(storage.BLOB_DIR) else '.'
+    return shutil.disk_usage(path).free
+
+async def ensure_free_space(size):
+    free = await files.run('disk_usage', _free_space)
+    if free - (size or 0) < MIN_FREE_SPACE:
+        raise IngestRejected("💾 На сервере заканчивается место, загрузка отклонена. Сообщите главному админу.")
+
+def check_size(size):
+    if size and size > MAX_DOWNLOAD_SIZE:
+        raise IngestRejected(f"❌ Файл больше {MAX_DOWNLOAD_SIZE // 1024 // 1024} МБ — бот не может его скачать.")
+
+def check_download(tg_file):
+    """Большие файлы принимаются, только если локальный сервер Bot API отдал путь на диске"""
+    if not storage.local_file_path(tg_file) and (tg_file.file_size or 0) > MAX_HTTP_DOWNLOAD_SIZE:
+        raise IngestRejected(
+            f"❌ Файл больше {MAX_HTTP_DOWNLOAD_SIZE // 1024 // 1024} МБ можно загрузить только "
+            "через локальный сервер Bot API с доступом к его файлам.")
+
+@contextlib.asynccontextmanager
+async def slot(admin, size=0, space=None):
+    """Место для одной загрузки: проверки выполняются до скачивания, ожидание — в общей очереди.
+
+    size — размер скачиваемого файла (лимит Bot API), space — сколько места на
+    диске займёт загрузка целиком, если она из нескольких файлов (по умолчанию size).
+    """
+    global _waiting
+    check_size(size)
+    if _active[admin] >= MAX_INGESTS_PER_ADMIN:
+        raise IngestRejected("⏳ У вас уже идут загрузки. Дождитесь их завершения и попробуйте снова.")
+
+    # Место админа занимаем до первого await, иначе параллельные запросы обойдут лимит
+    _active[admin] += 1
+    try:
+        await ensure_free_space(size if space is None else space)
+        _waiting += 1
+        try:
+            await _semaphore.acquire()
+        finally:
+            _waiting -= 1
+        try:
+            yield
+        finally:
+            _semaphore.release()
+    finally:
+        _active[admin] -= 1
+        if _active[admin] <= 0:
+            del _active[admin]
+
+def waiting():
+    """Сколько загрузок ждёт свободного места в очереди"""
+    return _waiting
+
+def active():
+    """Сколько загрузок идёт или ждёт очереди"""
+    return sum(_active.values())
@@ -0,0 +1,105 @@
+import logging
+import os
+import time
+import database
+import storage
+
+# Сборщик мусора хранилища: сверяет файлы на диске с базой и чинит расхождения.
+# Работает блокирующе — запускается из потока, не из цикла событий.
+
+logger = logging.getLogger(__name__)
+
+SCAN_BATCH = 500
+# Свежие файлы могут ещё не быть записаны в базу — их не трогаем
+MIN_FILE_AGE = 3600
+MISSING_EXAMPLES = 10
+
+def _blob_hash(name):
+    # <хэш>.<расширение>, <хэш>.thumb.jpg или временный tmpXXXX.part
+    return name.split('.')[0]
+
+def _collect_orphans(report):
+    now = time.time()
+    batch = []
+    
+    def flush():
+        refcounts = database.get_blob_refcounts({_blob_hash(name) for _, name in batch})
+        for path, name in batch:
+            sha256 = _blob_hash(name)
+            if refcounts.get(sha256, 0) > 0:
+                continue
+            removed = storage.collect(sha256, [path])
+            if removed is not None:
+                report['orphan_files'] += 1
+                report['freed_bytes'] += removed
+        batch.clear()
+    
+    for path, name, mtime in storage.iter_files():
+        if now - mtime < MIN_FILE_AGE:
+            continue
+        if name.endswith('.part'):
+            # Недокачанный файл, оставшийся после падения
+            os.remove(path)
+            report['stale_temp'] += 1
+            continue
+        batch.append((path, name))
+        if len(batch) >= SCAN_BATCH:
+            flush()
+    if batch:
+        flush()
+
+def _forget_dead_blobs(report):
+    for sha256, path in database.get_dead_blobs():
+        removed = storage.collect(sha256, [path, storage.thumbnail_path(sha256)], forget=True)
+        if removed is not None:
+            report['dead_blobs'] += 1
+            report['freed_bytes'] += removed
+
+def _find_missing_files(report):
+    for table in database.FILE_COLUMNS:
+        for row_id, path in database.iter_file_rows(table):
+            if not os.path.exists(path):
+                report['missing_files'] += 1
+                if len(report['missing_examples']) < MISSING_EXAMPLES:
+                    report['missing_examples'].append(f"{table}#{row_id}: {path}")
+
+def run():
+    """Один проход сборки мусора; возвращает отчёт в виде словаря"""
+    started = time.monotonic()
+    report = {
+        'refcounts_fixed': database.reconcile_blob_refcounts(),
+        'orphan_files': 0,
+        'stale_temp': 0,
+        'dead_blobs': 0,
+        'freed_bytes': 0,
+        'missing_files': 0,
+        'missing_examples': [],
+    }
+    _collect_orphans(report)
+    _forget_dead_blobs(report)
+    _find_missing_files(report)
+    report['reassigned'], report['orphan_cameras'] = database.reassign_orphan_cameras()
+    report['no_category'] = database.count_cameras_without_category()
+    report['seconds'] = round(time.monotonic() - started, 1)
+    logger.info(f"Сборка мусора: {report}")
+    return report
+
+def format_report(report):
+    text = (
+        "🧹 Проверка хранилища завершена\n\n"
+        f"🗑️ Удалено файлов без записей: {report['orphan_files']}\n"
+        f"🧾 Удалено неиспользуемых блобов: {report['dead_blobs']}\n"
+        f"⏳ Удалено недокачанных файлов: {report['stale_temp']}\n"
+        f"💾 Освобождено: {report['freed_bytes'] / 1024 / 1024:.1f} МБ\n"
+        f"🔢 Исправлено счётчиков ссылок: {report['refcounts_fixed']}\n"
+        f"👤 Камер передано главному админу: {report['reassigned']}\n"
+    )
+    if report['orphan_cameras']:
+        text += f"⚠️ Камер без владельца: {report['orphan_cameras']}\n"
+    if report['no_category']:
+        text += f"⚠️ Камер в удалённых категориях: {report['no_category']}\n"
+    if report['missing_files']:
+        text += f"❌ Записей без файла: {report['missing_files']}\n"
+        text += "\n".join(report['missing_examples']) + "\n"
+    text += f"\n⏱️ {report['seconds']} с"
+    return text
@@ -1,4 +1,4 @@
-from telegram import ReplyKeyboardMarkup
+from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 import database
 
 def main_menu():
@@ -13,6 +13,8 @@ def main_menu():
 def admin_menu(is_master=False):
     buttons = [
         ["📤 Загрузить скриншот"],
+        ["🗂 Массовая загрузка"],
+        ["🗜 Импорт ZIP"],
         ["📦 Управление паками"],
         ["🔐 Сменить пароль"],
         ["✉️ Рассылка"],
@@ -64,9 +66,16 @@ def camera_codes_menu():
     return ReplyKeyboardMarkup([
         ["📊 Статистика по категориям"],
         ["📝 Список всех кодов"],
+        ["🔎 Поиск камер"],
+        ["🧬 Дубликаты"],
+        ["🧹 Проверка хранилища"],
+        ["📈 Популярность"],
         ["🔙 Назад"]
     ], resize_keyboard=True)
 
+def bulk_upload_keyboard():
+    return ReplyKeyboardMarkup([["✅ Готово"], ["🔙 Назад"]], resize_keyboard=True)
+
 def back_only_keyboard():
     return ReplyKeyboardMarkup([["🔙 Назад"]], resize_keyboard=True)
 
@@ -94,3 +103,25 @@ def pack_management_keyboard(is_master=False):
         buttons.append(["📦 Мои паки"])
     buttons.append(["🔙 Назад"])
     return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+
+def search_pagination_keyboard(scope, offset, total, page_size):
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"search:{scope}:{max(offset - page_size, 0)}"))
+    if offset + page_size < total:
+        buttons.append(InlineKeyboardButton("Вперёд ▶️", callback_data=f"search:{scope}:{offset + page_size}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+def page_navigation_keyboard(view, prev_cursor, next_cursor, export_kind=None):
+    buttons = []
+    if prev_cursor is not None:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"page:{view}:p:{prev_cursor}"))
+    if next_cursor is not None:
+        buttons.append(InlineKeyboardButton("Вперёд ▶️", callback_data=f"page:{view}:n:{next_cursor}"))
+    rows = [buttons] if buttons else []
+    if export_kind:
+        rows.append([
+            InlineKeyboardButton("⬇️ CSV", callback_data=f"export:{export_kind}:csv"),
+            InlineKeyboardButton("⬇️ JSONL", callback_data=f"export:{export_kind}:jsonl"),
+        ])
+    return InlineKeyboardMarkup(rows) if rows else None
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+import metrics
+
+# Сторож цикла событий. Корутина-пульс раз в HEARTBEAT_INTERVAL отмечает время;
+# отдельный поток замечает, что отметка устарела (цикл чем-то заблокирован),
+# снимает стек потока цикла и определяет обработчик, в котором случилась блокировка.
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 0.1
+CHECK_INTERVAL = 0.05
+STACK_LIMIT = 30
+
+LOOP_LAG = metrics.Histogram(
+    'bot_event_loop_lag_seconds', 'Задержка планирования цикла событий',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+STALLS = metrics.Counter('bot_event_loop_stalls_total', 'Блокировки цикла событий по обработчикам', ('handler',))
+
+# Код обработчиков -> имя: по нему блокировка привязывается к обработчику
+_handler_codes = {}
+_last_beat = None
+_loop_thread_id = None
+# Последние блокировки: (время, обработчик, длительность, стек)
+_stalls = []
+MAX_STALL_HISTORY = 20
+
+def register_handler(callback):
+    _handler_codes[callback.__code__] = callback.__name__
+
+def _find_handler(frame):
+    # Идём от самого глубокого кадра наружу: первый найденный обработчик — виновник
+    while frame is not None:
+        name = _handler_codes.get(frame.f_code)
+        if name:
+            return name
+        frame = frame.f_back
+    return 'unknown'
+
+async def _heartbeat():
+    global _last_beat
+    while True:
+        started = time.monotonic()
+        _last_beat = started
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        LOOP_LAG.observe(max(0.0, time.monotonic() - started - HEARTBEAT_INTERVAL))
+
+def _watch(threshold):
+    stalled_since = None
+    while True:
+        time.sleep(CHECK_INTERVAL)
+        beat = _last_beat
+        if beat is None:
+            continue
+        age = time.monotonic() - beat - HEARTBEAT_INTERVAL
+        if age < threshold:
+            if stalled_since is not None:
+                logger.warning(f"Цикл событий снова работает после блокировки ~{time.monotonic() - stalled_since:.2f} с")
+                stalled_since = None
+            continue
+        if stalled_since is not None:
+            continue
+        # Стек снимаем один раз за блокировку, пока цикл ещё стоит
+        stalled_since = beat + HEARTBEAT_INTERVAL
+        frame = sys._current_frames().get(_loop_thread_id)
+        handler = _find_handler(frame)
+        stack = ''.join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame else ''
+        STALLS.inc(handler)
+        _stalls.append((time.time(), handler, age, stack))
+        del _stalls[:-MAX_STALL_HISTORY]
+        logger.warning(f"Цикл событий заблокирован дольше {age * 1000:.0f} мс в обработчике {handler}:\n{stack}")
+
+def start(threshold):
+    """Запускает пульс в текущем цикле событий и поток-сторож; порог в секундах"""
+    global _loop_thread_id
+    _loop_thread_id = threading.get_ident()
+    asyncio.get_running_loop().create_task(_heartbeat())
+    threading.Thread(target=_watch, args=(threshold,), name='loop-watchdog', daemon=True).start()
+
+def recent_stalls():
+    """Последние блокировки, новые первыми"""
+    return list(reversed(_stalls))
@@ -0,0 +1,153 @@
+import asyncio
+import bisect
+import logging
+import threading
+
+# Реестр метрик в формате Prometheus и необязательный HTTP-эндпоинт /metrics.
+# Запись метрики — поиск в словаре и пара сложений под общей блокировкой,
+# поэтому её можно оставлять включённой в продакшене.
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _series_name(name, label_names, label_values, extra=''):
+    pairs = [f'{label}="{_escape(value)}"' for label, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return f"{name}{{{','.join(pairs)}}}" if pairs else name
+
+class Counter:
+    """Монотонно растущий счётчик с метками"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = list(self.values.items())
+        for label_values, value in items:
+            lines.append(f"{_series_name(self.name, self.labels, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """Мгновенное значение, которое считывается функцией в момент выгрузки"""
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        _registry.append(self)
+
+    def set_function(self, func):
+        self.func = func
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.func is not None:
+            try:
+                lines.append(f"{self.name} {self.func()}")
+            except Exception as e:
+                logger.warning(f"Не удалось получить значение {self.name}: {e}")
+        return lines
+
+class Histogram:
+    """Распределение значений по корзинам с суммой и количеством"""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам (+ последняя для +Inf), сумма, количество]
+        self.series = {}
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """{метки: (сумма, количество)} — для отчётов внутри бота"""
+        with _lock:
+            return {labels: (series[1], series[2]) for labels, series in self.series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self.series.items()]
+        for label_values, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                series = _series_name(f"{self.name}_bucket", self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{series} {cumulative}")
+            series = _series_name(f"{self.name}_bucket", self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{series} {count}")
+            lines.append(f"{_series_name(f'{self.name}_sum', self.labels, label_values)} {total}")
+            lines.append(f"{_series_name(f'{self.name}_count', self.labels, label_values)} {count}")
+        return lines
+
+# Общий счётчик обращений к кэшам; доля попаданий = hit / (hit + miss)
+CACHE_REQUESTS = Counter('bot_cache_requests_total', 'Обращения к кэшам бота', ('cache', 'result'))
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+async def _handle(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, но их надо дочитать
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, body = "200 OK", render().encode('utf-8')
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host, port):
+    """Запускает HTTP-сервер /metrics в текущем цикле событий"""
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return server
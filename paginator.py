@@ -0,0 +1,123 @@
+import html
+from collections import OrderedDict
+import database
+import keyboards
+import metrics
+import utils
+
+# Кэш отрисованных страниц: ключ включает версию данных, поэтому после изменений
+# устаревшие страницы просто перестают находиться и вытесняются
+CACHE_SIZE = 512
+_cache = OrderedDict()
+
+def _short(text, limit):
+    text = text or ''
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+def _render_camera(row, bot_username, show_admin):
+    camera_id, code, category, custom_name, admin = row
+    item = f"🔑 <code>{code}</code>\n📂 Категория: {html.escape(category)}\n"
+    if show_admin:
+        item += f"👤 Админ: {html.escape(admin or 'удалён')}\n"
+    if custom_name:
+        item += f"🏷️ Название: {html.escape(_short(custom_name, 100))}\n"
+    item += f"🔗 {utils.deep_link(bot_username, code)}\n"
+    return item
+
+def _render_user(row, bot_username):
+    user_id, username, first_name, last_name, is_banned = row
+    full_name = f"{first_name or ''} {last_name or ''}"
+    return (
+        f"🆔 ID: <code>{user_id}</code>\n"
+        f"👤 Имя: {html.escape(_short(full_name, 100))}\n"
+        f"📛 Username: @{html.escape(username or 'нет')}\n"
+        f"🚫 Статус: {'Забанен' if is_banned else 'Активен'}\n"
+        "────────────────────\n"
+    )
+
+def _render_broadcast(row, bot_username):
+    record_id, admin_username, message_text, timestamp = row
+    formatted_time = timestamp.split('.')[0] if isinstance(timestamp, str) else timestamp
+    return (
+        f"⏱️ <b>Время:</b> {formatted_time}\n"
+        f"👤 <b>Админ:</b> @{html.escape(admin_username)}\n"
+        f"✉️ <b>Сообщение:</b>\n{html.escape(_short(message_text, 500))}\n"
+        "────────────────────\n"
+    )
+
+# Представления: заголовок, версия данных, выборка страницы и отрисовка одной записи
+VIEWS = {
+    'cams': {
+        'title': "📝 Список всех камер",
+        'version': 'cameras',
+        'page_size': 15,
+        'export': 'cameras',
+        'fetch': lambda owner, after, before, limit: database.get_cameras_page(after, before, limit),
+        'render': lambda row, bot_username: _render_camera(row, bot_username, True),
+        'key': lambda row: row[0],
+    },
+    'my': {
+        'title': "📝 Ваши камеры",
+        'version': 'cameras',
+        'page_size': 15,
+        'fetch': lambda owner, after, before, limit: database.get_cameras_page(after, before, limit, admin_username=owner),
+        'render': lambda row, bot_username: _render_camera(row, bot_username, False),
+        'key': lambda row: row[0],
+    },
+    'users': {
+        'title': "👥 Список пользователей",
+        'version': 'users',
+        'page_size': 20,
+        'export': 'users',
+        'fetch': lambda owner, after, before, limit: database.get_users_page(after, before, limit),
+        'render': _render_user,
+        'key': lambda row: row[0],
+    },
+    'bc': {
+        'title': "📊 История рассылок",
+        'version': 'broadcasts',
+        'page_size': 5,
+        'export': 'broadcasts',
+        'fetch': lambda owner, after, before, limit: database.get_broadcasts_page(after, before, limit),
+        'render': _render_broadcast,
+        'key': lambda row: row[0],
+    },
+}
+
+def render_page(view_name, owner=None, direction='n', cursor=None, bot_username=''):
+    """Возвращает (текст, клавиатура) страницы или None, если записей нет.
+
+    direction 'n' — записи после cursor, 'p' — записи перед cursor.
+    """
+    view = VIEWS[view_name]
+    cache_key = (view_name, owner, direction, cursor, database.data_version(view['version']))
+    if cache_key in _cache:
+        metrics.CACHE_REQUESTS.inc('pages', 'hit')
+        _cache.move_to_end(cache_key)
+        return _cache[cache_key]
+    metrics.CACHE_REQUESTS.inc('pages', 'miss')
+
+    if direction == 'p':
+        rows, has_more = view['fetch'](owner, None, cursor, view['page_size'])
+        has_prev, has_next = has_more, True
+    else:
+        rows, has_more = view['fetch'](owner, cursor, None, view['page_size'])
+        has_prev, has_next = cursor is not None, has_more
+
+    if not rows:
+        page = None
+    else:
+        # Запись никогда не разрезается между сообщениями — HTML-теги остаются целыми
+        text = f"{view['title']}:\n\n" + "\n".join(view['render'](row, bot_username) for row in rows)
+        markup = keyboards.page_navigation_keyboard(
+            view_name,
+            view['key'](rows[0]) if has_prev else None,
+            view['key'](rows[-1]) if has_next else None,
+            export_kind=view.get('export')
+        )
+        page = (text, markup)
+
+    _cache[cache_key] = page
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return page
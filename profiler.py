@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Mapping
+
+# Профилирование по запросу главного админа. Сэмплирующий профилировщик раз в
+# SAMPLE_INTERVAL снимает стеки всех потоков через sys._current_frames и не
+# трогает код обработчиков, поэтому его можно запускать под нагрузкой.
+# Функции блокирующие — выполняются в отдельном потоке.
+
+SAMPLE_INTERVAL = 0.01
+MAX_SECONDS = 60
+TOP_LIMIT = 40
+TRACEMALLOC_FRAMES = 10
+SIZEOF_LIMIT = 200000
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds, interval=SAMPLE_INTERVAL):
+    """Снимает стеки всех потоков; возвращает (Counter свёрнутых стеков, число снимков)"""
+    own_id = threading.get_ident()
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(labels))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+def collapsed(stacks):
+    """Формат flamegraph.pl / speedscope: «поток;внешняя;...;внутренняя количество»"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+def top_functions(stacks, limit=TOP_LIMIT):
+    """[(функция, накопительно, собственно)] в снимках, по убыванию накопительного"""
+    cumulative = Counter()
+    own = Counter()
+    for stack, count in stacks.items():
+        # Первый элемент — имя потока, рекурсивные вызовы считаем один раз
+        frames = stack.split(';')[1:]
+        for label in set(frames):
+            cumulative[label] += count
+        if frames:
+            own[frames[-1]] += count
+    return [(label, count, own[label]) for label, count in cumulative.most_common(limit)]
+
+def format_cpu_report(stacks, samples, seconds):
+    lines = [
+        f"Сэмплирующий профиль: {seconds} с, {samples} снимков, шаг {SAMPLE_INTERVAL * 1000:.0f} мс",
+        "Доля снимков, в которых функция была в стеке (накопительно) и на вершине стека (собственно)",
+        "Стеки снимаются во всех потоках: цикл событий — MainThread, ожидание событий — select",
+        "",
+        f"{'накоп.':>8} {'собств.':>8}  функция",
+    ]
+    for label, count, own in top_functions(stacks):
+        lines.append(f"{count / samples:>8.1%} {own / samples:>8.1%}  {label}")
+    return "\n".join(lines) + "\n"
+
+def trace_memory(seconds, limit=TOP_LIMIT):
+    """Снимок tracemalloc после seconds секунд записи: крупнейшие места выделения памяти"""
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        time.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    return snapshot.statistics('lineno')[:limit]
+
+def snapshot(mapping):
+    """Копия словаря и словарей в нём — снимается в цикле событий, который их меняет"""
+    return {key: dict(value) if isinstance(value, Mapping) else value for key, value in mapping.items()}
+
+def deep_sizeof(obj, limit=SIZEOF_LIMIT):
+    """Примерный размер объекта вместе с вложенными; (байты, обойдено объектов)"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        # list() копирует встроенные контейнеры за один шаг под GIL: глубже
+        # снимка их может менять цикл событий, пока этот поток считает
+        if isinstance(item, Mapping):
+            for key, value in list(item.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(list(item))
+        elif hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+    return total, len(seen)
+
+def format_memory_report(statistics, seconds, objects):
+    lines = [f"tracemalloc: выделения за {seconds} с, крупнейшие места", ""]
+    for stat in statistics:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:>10.1f} КБ {stat.count:>8} блоков  {frame.filename}:{frame.lineno}")
+    lines += ["", "Размер структур в памяти (с вложенными объектами):", ""]
+    for name, obj in objects.items():
+        size, count = deep_sizeof(obj)
+        lines.append(f"{size / 1024:>10.1f} КБ {count:>8} объектов  {name}")
+    return "\n".join(lines) + "\n"
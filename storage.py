@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import Counter, namedtuple
+import config
+import database
+import files
+import imaging
+
+# Контентно-адресуемое хранилище: файл называется SHA-256 своего содержимого,
+# одинаковые загрузки хранятся один раз, а ссылки считаются в таблице blobs.
+# Файлы раскладываются по подпапкам из первых символов хэша (ab/cd/<хэш>),
+# чтобы ни в одном каталоге не копились сотни тысяч записей.
+
+BLOB_DIR = "blobs"
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+# Шаблон LIKE для путей, уже разложенных по подпапкам
+SHARDED_PATTERN = f"{BLOB_DIR}/" + ("_" * SHARD_WIDTH + "/") * SHARD_LEVELS + "%"
+SHARD_MIGRATION = "sharded_layout"
+MIGRATION_BATCH = 100
+# Каталоги старой раскладки, которые удаляются, когда в них ничего не осталось
+LEGACY_DIRS = ("cameras", "projects", "packs")
+CHUNK_SIZE = 64 * 1024
+# Сколько изображений нормализуется одновременно (ограничивает память)
+INGEST_BATCH = 8
+
+Blob = namedtuple('Blob', ['sha256', 'path', 'size'])
+
+# Блобы, которые уже записаны, но ещё не привязаны к строке в базе.
+# Такие файлы нельзя удалять, даже если счётчик ссылок упал до нуля.
+_pinned = Counter()
+# Запись блоба и его удаление сборщиком мусора не должны пересекаться
+_commit_lock = threading.Lock()
+
+class HashingWriter:
+    """Файлоподобный объект: считает SHA-256 и размер по мере записи"""
+
+    def __init__(self, target):
+        self.target = target
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.target.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+def blob_path(sha256, ext):
+    ext = ext.lstrip('.').lower()
+    shards = [sha256[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    name = f"{sha256}.{ext}" if ext else sha256
+    return "/".join([BLOB_DIR, *shards, name])
+
+def thumbnail_path(sha256):
+    return blob_path(sha256, 'thumb.jpg')
+
+def thumbnail_for(path):
+    """Путь к миниатюре файла хранилища, если она есть"""
+    if not path:
+        return None
+    thumb = thumbnail_path(os.path.basename(path).split('.')[0])
+    return thumb if os.path.exists(thumb) else None
+
+def _temp_file():
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=BLOB_DIR, suffix='.part')
+    return os.fdopen(fd, 'wb'), path
+
+def _commit(temp_path, sha256, size, ext):
+    with _commit_lock:
+        _pinned[sha256] += 1
+        # Тот же хэш — тот же файл: дубликат просто выбрасываем
+        path = database.get_blob_path(sha256) or blob_path(sha256, ext)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        database.register_blob(sha256, path, size)
+    return Blob(sha256, path, size)
+
+def local_file_path(tg_file):
+    """Путь к файлу на диске локального сервера Bot API или None"""
+    if config.BOT_API_LOCAL_MODE and tg_file.file_path and os.path.isabs(tg_file.file_path):
+        return tg_file.file_path
+    return None
+
+def _store_local(path, ext):
+    with open(path, 'rb') as source:
+        return store_stream(source, ext)
+
+async def store_telegram_file(tg_file, ext):
+    """Скачивает файл Telegram и кладёт его в хранилище.
+
+    С локальным сервером Bot API файл уже лежит на диске и потоково копируется
+    без HTTP. Иначе загрузка идёт в память (не больше 20 МБ — размер заранее
+    проверяет ingest.check_download), а запись на диск с подсчётом хэша — в
+    файловом пуле.
+    """
+    local_path = local_file_path(tg_file)
+    if local_path:
+        return await files.run('store', _store_local, local_path, ext)
+    buffer = io.BytesIO()
+    await tg_file.download_to_memory(out=buffer)
+    buffer.seek(0)
+    return await files.run('store', store_stream, buffer, ext)
+
+def store_stream(source, ext, header=b''):
+    """Потоково копирует source в хранилище (блокирующая, для потоков)"""
+    target, temp_path = _temp_file()
+    try:
+        with target:
+            writer = HashingWriter(target)
+            if header:
+                writer.write(header)
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return _commit(temp_path, writer.hexdigest(), writer.size, ext)
+
+def _write_thumbnail(sha256, data):
+    target, temp_path = _temp_file()
+    with target:
+        target.write(data)
+    os.replace(temp_path, thumbnail_path(sha256))
+
+async def ingest_image(blob):
+    """Нормализует загруженное изображение: перекодирование, миниатюра, dHash.
+
+    Тяжёлая работа идёт в пуле процессов. Возвращает (blob, phash); если
+    файл был перекодирован, исходный блоб отпускается и заменяется новым.
+    Блоб переходит во владение функции: при ошибке она сама отпускает то,
+    что держит, и вызывающему чистить нечего.
+    """
+    try:
+        result = await imaging.normalize(blob.path)
+        if result is None:
+            return blob, None
+        encoded, thumbnail, phash = result
+        if encoded is not None:
+            normalized = await files.run('store', store_stream, io.BytesIO(encoded), 'jpg')
+            original, blob = blob, normalized
+            if normalized.sha256 != original.sha256:
+                # abandon ходит в базу и удаляет файл — не в цикле событий
+                await files.run('discard', abandon, original)
+            else:
+                await files.run('release', release, original)
+        if not await files.exists(thumbnail_path(blob.sha256)):
+            await files.run('thumbnail', _write_thumbnail, blob.sha256, thumbnail)
+        return blob, phash
+    except BaseException:
+        await files.run('discard', abandon, blob)
+        raise
+
+async def ingest_images(blobs):
+    """ingest_image для списка блобов, пачками по INGEST_BATCH.
+
+    Как и ingest_image, забирает блобы себе: если хоть один не обработался,
+    отпускает и готовые результаты, и ещё не начатые блобы, а затем
+    пробрасывает первую ошибку.
+    """
+    results = []
+    for i in range(0, len(blobs), INGEST_BATCH):
+        batch = blobs[i:i + INGEST_BATCH]
+        outcomes = await asyncio.gather(*(ingest_image(blob) for blob in batch), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        results.extend(outcome for outcome in outcomes if not isinstance(outcome, BaseException))
+        if errors:
+            for blob in [blob for blob, phash in results] + blobs[i + len(batch):]:
+                await files.run('discard', abandon, blob)
+            raise errors[0]
+    return results
+
+def is_pinned(sha256):
+    return sha256 in _pinned
+
+def collect(sha256, paths, forget=False):
+    """Удаляет файлы блоба без ссылок (и запись о нём при forget).
+
+    Проверка и удаление идут под той же блокировкой, что и запись нового
+    блоба, поэтому повторная загрузка того же файла не теряется.
+    Возвращает число удалённых байт или None, если блоб снова используется.
+    """
+    with _commit_lock:
+        if sha256 in _pinned or database.get_blob_refcount(sha256) > 0:
+            return None
+        if forget:
+            database.delete_dead_blob(sha256)
+        removed = 0
+        for path in paths:
+            if path and os.path.exists(path):
+                removed += os.path.getsize(path)
+                os.remove(path)
+        return removed
+
+def iter_files(root=BLOB_DIR):
+    """Потоковый обход хранилища: (путь, имя, время изменения) без списка всех файлов"""
+    if not os.path.isdir(root):
+        return
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.name, entry.stat().st_mtime
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _migrate_row(table, row_id, path, sha256):
+    if not path or not os.path.exists(path):
+        # Файла нет — такие записи разбирает сборщик мусора
+        return
+    ext = os.path.splitext(path)[1]
+    if sha256:
+        # Блоб из плоской раскладки: переносим файл и миниатюру в подпапки
+        target = blob_path(sha256, ext)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        flat_thumb = f"{BLOB_DIR}/{sha256}.thumb.jpg"
+        if os.path.exists(flat_thumb):
+            os.replace(flat_thumb, thumbnail_path(sha256))
+        database.move_blob(sha256, target)
+    else:
+        # Файл из времён до хранилища: хэшируем и забираем в хранилище. Файл
+        # переезжает, поэтому сразу переписываем все записи с этим путём, а не
+        # только текущую — иначе остальные остались бы со ссылкой в никуда
+        blob = _commit(path, _hash_file(path), os.path.getsize(path), ext)
+        try:
+            database.relink_path(path, blob.path, blob.sha256)
+        finally:
+            release(blob)
+
+def _remove_empty_dirs(root):
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        if not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+def migrate_batch(batch_size=MIGRATION_BATCH):
+    """Переносит очередную пачку файлов в раскладку по подпапкам (блокирующая).
+
+    Прогресс хранится в таблице migrations, поэтому после перезапуска миграция
+    продолжается с места остановки. Возвращает False, когда всё перенесено.
+    """
+    for table in database.FILE_COLUMNS:
+        name = f"{SHARD_MIGRATION}:{table}"
+        last_id, done = database.get_migration_state(name)
+        if done:
+            continue
+        rows = database.get_rows_outside(table, SHARDED_PATTERN, last_id, batch_size)
+        for row_id, path, sha256 in rows:
+            _migrate_row(table, row_id, path, sha256)
+        database.set_migration_state(name, rows[-1][0] if rows else last_id, done=len(rows) < batch_size)
+        return True
+    
+    for root in LEGACY_DIRS:
+        if os.path.isdir(root):
+            _remove_empty_dirs(root)
+    return False
+
+def release(blob):
+    """Снимает временную защиту, когда блоб привязан к записи или загрузка отменена"""
+    if not blob:
+        return
+    # Под той же блокировкой, что _commit и collect: иначе сборщик мог бы
+    # увидеть счётчик на полпути. Блокировку держат потоки пула во время
+    # записи на диск, поэтому из цикла событий — только через files.run
+    with _commit_lock:
+        _pinned[blob.sha256] -= 1
+        if _pinned[blob.sha256] <= 0:
+            del _pinned[blob.sha256]
+
+def release_many(blobs):
+    """release для списка блобов одним заходом в файловый пул"""
+    for blob in blobs:
+        release(blob)
+
+def abandon(blob):
+    """Отменяет незавершённую загрузку: файл удаляется, если на него нет ссылок"""
+    if not blob:
+        return
+    release(blob)
+    discard(blob.path)
+
+def discard(path):
+    """Удаляет файл, на который больше нет ссылок; возвращает True, если файл удалён.
+
+    Ссылки проверяются под той же блокировкой, что и запись нового блоба (как
+    в collect): параллельная загрузка того же файла успевает либо закрепить
+    блоб, либо привязать его к записи — и файл остаётся.
+    """
+    if not path:
+        return False
+    sha256 = os.path.splitext(os.path.basename(path))[0]
+    with _commit_lock:
+        if sha256 in _pinned or database.get_blob_refcount(sha256) > 0:
+            return False
+        thumb = thumbnail_for(path)
+        if thumb:
+            os.remove(thumb)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
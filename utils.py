@@ -1,7 +1,15 @@
 import random
+import re
 import config
 import os
 
+# Префиксы параметра /start для ссылок на проекты и паки
+PROJECT_LINK_PREFIX = "project_"
+PACK_LINK_PREFIX = "pack_"
+
+# Код камеры: 8 заглавных латинских букв и цифр (см. generate_code)
+CODE_PATTERN = re.compile(r'[A-Z0-9]{8}')
+
 def format_caption(text, custom_name=None):
     emoji = random.choice(config.EMOJIS)
     
@@ -38,3 +46,37 @@ def safe_pack_filename(filename):
     name, ext = os.path.splitext(filename)
     safe_name = safe_filename(name)
     return f"{safe_name}{ext}"
+
+def deep_link(bot_username, payload):
+    return f"https://t.me/{bot_username}?start={payload}"
+
+def parse_codes(text):
+    # Коды через пробелы, запятые или точку с запятой, без повторов
+    codes = []
+    for code in re.split(r'[\s,;]+', text.upper()):
+        if code and code not in codes:
+            codes.append(code)
+    return codes
+
+def looks_like_codes(codes):
+    # Все слова похожи на коды камер — а не обычная фраза
+    return all(CODE_PATTERN.fullmatch(code) for code in codes)
+
+def detect_image_type(header):
+    # Тип изображения по сигнатуре, а не по расширению файла
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def document_filename(file_path, display_name=None):
+    # Файлы в хранилище названы хэшем — пользователю отдаём имя по названию
+    ext = os.path.splitext(file_path)[1]
+    if display_name:
+        name = safe_filename(display_name.replace(' ', '_'))
+        if name:
+            return f"{name}{ext}"
+    return os.path.basename(file_path)